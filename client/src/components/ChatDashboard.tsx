@@ -18,6 +18,7 @@ interface ChatSession {
     clientPhone: string;
     messages: any[];
     isThinking: boolean;
+    draftPreview?: string;
     isLoading?: boolean;
     layout?: {
         x: number;
@@ -28,6 +29,7 @@ interface ChatSession {
     };
     autoAIEnabled?: boolean;
     phone?: string;
+    olderCursor?: string | null;
 }
 
 export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
@@ -90,35 +92,61 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
 
             const socket = new WebSocket(`${WS_BASE_URL}/ws/chat`);
 
+            const handleEvent = (data: any) => {
+                if (data.type === "security_alert") {
+                    const audio = new Audio('/assets/sounds/alert.mp3');
+                    audio.play().catch(() => { });
+                } else if (data.type === "new_message") {
+                    if (data.sender === "user") {
+                        const audio = new Audio('/assets/sounds/notification.mp3');
+                        audio.play().catch(() => { });
+                    }
+                    // Update relevant session state (a stored AI draft replaces its streamed preview)
+                    setSessions(prev => prev.map(s => {
+                        if (s.conversationId === data.conversation_id || s.phone === data.phone) {
+                            const draftPreview = data.sender === "agent" ? undefined : s.draftPreview;
+                            return { ...s, messages: [...s.messages, data], draftPreview };
+                        }
+                        return s;
+                    }));
+                } else if (data.type === "draft_delta") {
+                    // Partial AI draft while the model is still generating (opt-in streaming)
+                    setSessions(prev => prev.map(s => {
+                        if (s.conversationId !== data.conversation_id) return s;
+                        return { ...s, draftPreview: data.done ? undefined : (s.draftPreview || "") + data.delta };
+                    }));
+                } else if (data.type === "message_status_update") {
+                    setSessions(prev => prev.map(s => {
+                        if (s.phone === data.phone) {
+                            return {
+                                ...s,
+                                messages: s.messages.map(m => m.id === data.id ? { ...m, status: data.status } : m)
+                            };
+                        }
+                        return s;
+                    }));
+                } else if (data.type === "message_update") {
+                    // Outbound queue progress (queued -> sent / failed) of a single message
+                    setSessions(prev => prev.map(s => ({
+                        ...s,
+                        messages: s.messages.map(m => m.id === data.id ? { ...m, status: data.status } : m)
+                    })));
+                } else if (data.type === "message_status_batch") {
+                    // Receipts are applied in batches server-side: one event carries many updates
+                    const byId = new Map<number, string>(data.updates.map((u: any) => [u.id, u.status]));
+                    setSessions(prev => prev.map(s => ({
+                        ...s,
+                        messages: s.messages.map(m => byId.has(m.id) ? { ...m, status: byId.get(m.id) } : m)
+                    })));
+                }
+            };
+
             socket.onmessage = (event) => {
                 try {
                     const data = JSON.parse(event.data);
-                    if (data.type === "security_alert") {
-                        const audio = new Audio('/assets/sounds/alert.mp3');
-                        audio.play().catch(() => { });
-                    } else if (data.type === "new_message") {
-                        if (data.sender === "user") {
-                            const audio = new Audio('/assets/sounds/notification.mp3');
-                            audio.play().catch(() => { });
-                        }
-                        // Update relevant session state
-                        setSessions(prev => prev.map(s => {
-                            if (s.conversationId === data.conversation_id || s.phone === data.phone) {
-                                return { ...s, messages: [...s.messages, data] };
-                            }
-                            return s;
-                        }));
-                    } else if (data.type === "message_status_update") {
-                        setSessions(prev => prev.map(s => {
-                            if (s.phone === data.phone) {
-                                return {
-                                    ...s,
-                                    messages: s.messages.map(m => m.id === data.id ? { ...m, status: data.status } : m)
-                                };
-                            }
-                            return s;
-                        }));
-                    }
+                    // The server batches bursts into one frame per tick
+                    const events = data.type === "batch" ? data.events : [data];
+                    events.forEach(handleEvent);
                 } catch (e) { console.error("WS Parse Error", e); }
             };
 
@@ -131,6 +159,12 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
             };
 
             socket.onopen = () => {
+                // Only the events this view renders; notifications go to the NotificationCenter socket
+                socket.send(JSON.stringify({
+                    action: "subscribe",
+                    id: "chat",
+                    types: ["new_message", "message_update", "message_status_update", "message_status_batch", "message_sent", "draft_delta", "security_alert"]
+                }));
                 setRetryCount(0);
                 setIsPollingMode(false);
                 console.log("WS: Connected");
@@ -203,11 +237,12 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
             });
             if (res.ok) {
                 const msgs = await res.json();
+                const olderCursor = res.headers.get("X-Next-Cursor");
                 setSessions(prev => {
                     const idx = prev.findIndex(s => s.conversationId === convId);
                     if (idx !== -1) {
                         const copy = [...prev];
-                        copy[idx] = { ...copy[idx], messages: msgs, isLoading: false };
+                        copy[idx] = { ...copy[idx], messages: msgs, olderCursor, isLoading: false };
                         return copy;
                     }
                     return prev;
@@ -216,6 +251,26 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
         } catch (e) { console.error(e); }
     };
 
+    // Scroll-back: prepend the previous window of history
+    const loadOlderMessages = async (session: ChatSession) => {
+        if (!session.olderCursor) return;
+        try {
+            const url = `${API_ENDPOINTS.conversations.messages(session.conversationId)}?before_id=${session.olderCursor}`;
+            const res = await fetch(url, {
+                headers: { "Authorization": `Bearer ${token}` }
+            });
+            if (res.ok) {
+                const older = await res.json();
+                const olderCursor = res.headers.get("X-Next-Cursor");
+                setSessions(prev => prev.map(s => s.conversationId === session.conversationId ? {
+                    ...s,
+                    messages: [...older, ...s.messages],
+                    olderCursor
+                } : s));
+            }
+        } catch (e) { console.error(e); }
+    };
+
     const bringToFront = (id: number) => {
         setSessions(prev => prev.map(s => s.conversationId === id ? {
             ...s,
@@ -442,6 +497,17 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
         } catch (e) { console.error(e); }
     };
 
+    const approveBulkMessages = async (messageIds: number[], session: ChatSession) => {
+        try {
+            const res = await fetch(API_ENDPOINTS.conversations.bulk, {
+                method: "POST",
+                headers: { "Content-Type": "application/json", "Authorization": `Bearer ${token}` },
+                body: JSON.stringify({ message_ids: messageIds, action: "approve" })
+            });
+            if (res.ok) fetchMessages(session.conversationId);
+        } catch (e) { console.error(e); }
+    };
+
     return (
         <div className="flex h-full w-full bg-slate-50 dark:bg-[var(--brand-bg)] transition-colors duration-300 overflow-hidden font-sans">
             <Sidebar
@@ -506,6 +572,7 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
                                         onEdit={(id: number, txt: string) => editMessage(id, txt, activeSession)}
                                         onDelete={(id: number) => deleteMessage(id, activeSession)}
                                         onBulkDelete={(ids: number[]) => deleteBulkMessages(ids, activeSession)}
+                                        onBulkApprove={(ids: number[]) => approveBulkMessages(ids, activeSession)}
                                         onMaximize={() => setLayoutMode("canvas")}
                                         autoAIEnabled={activeSession.autoAIEnabled}
                                         onToggleAI={() => handleToggleAI(activeSession.conversationId)}
@@ -515,6 +582,8 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
                                         }}
                                         isMaximized={true}
                                         isLoading={activeSession.isLoading}
+                                        hasOlder={!!activeSession.olderCursor}
+                                        onLoadOlder={() => loadOlderMessages(activeSession)}
                                         timezone={config.timezone}
                                     />
                                 </div>
@@ -565,6 +634,7 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
                                         onEdit={(id: number, txt: string) => editMessage(id, txt, session)}
                                         onDelete={(id: number) => deleteMessage(id, session)}
                                         onBulkDelete={(ids: number[]) => deleteBulkMessages(ids, session)}
+                                        onBulkApprove={(ids: number[]) => approveBulkMessages(ids, session)}
                                         onMaximize={() => {
                                             setActiveConversationId(session.conversationId);
                                             setLayoutMode("focus");
@@ -577,6 +647,8 @@ export default function ChatDashboard({ onNavigate }: ChatDashboardProps) {
                                         onToggleAI={() => handleToggleAI(session.conversationId)}
                                         isMaximized={false}
                                         isLoading={session.isLoading}
+                                        hasOlder={!!session.olderCursor}
+                                        onLoadOlder={() => loadOlderMessages(session)}
                                         // Custom Props for Canvas
                                         canDrag={true}
                                         onDragStart={(e: React.MouseEvent) => startDrag(e, session.conversationId)}
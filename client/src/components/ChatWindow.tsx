@@ -35,6 +35,7 @@ interface ChatWindowProps {
     clientName: string;
     messages: Message[];
     isThinking: boolean;
+    draftPreview?: string;
     onSendMessage: (text: string) => void;
     onApprove: (id: number) => void;
     onEdit: (id: number, text: string) => void;
@@ -50,6 +51,9 @@ interface ChatWindowProps {
     onToggleAI?: () => void;
     timezone?: string;
     onBulkDelete?: (ids: number[]) => void;
+    onBulkApprove?: (ids: number[]) => void;
+    hasOlder?: boolean;
+    onLoadOlder?: () => void;
 }
 
 const MESSAGE_MENU_ID = "msg-context-menu";
@@ -59,6 +63,7 @@ const ChatWindow = memo(({
     clientName,
     messages,
     isThinking,
+    draftPreview,
     onSendMessage,
     onApprove,
     onEdit,
@@ -73,7 +78,10 @@ const ChatWindow = memo(({
     autoAIEnabled = true,
     onToggleAI,
     timezone,
-    onBulkDelete
+    onBulkDelete,
+    onBulkApprove,
+    hasOlder,
+    onLoadOlder
 }: ChatWindowProps) => {
     const { t, i18n } = useTranslation();
     const [inputValue, setInputValue] = useState("");
@@ -98,11 +106,15 @@ const ChatWindow = memo(({
         }
     };
 
+    // Only follow the bottom when a newer message arrives, not when older history is prepended
+    const lastMessageIdRef = useRef<number | undefined>(undefined);
     useEffect(() => {
-        if (scrollRef.current) {
+        const lastId = messages[messages.length - 1]?.id;
+        if (scrollRef.current && (lastId !== lastMessageIdRef.current || isThinking || draftPreview)) {
             scrollRef.current.scrollTop = scrollRef.current.scrollHeight;
         }
-    }, [messages, isThinking]);
+        lastMessageIdRef.current = lastId;
+    }, [messages, isThinking, draftPreview]);
 
     const handleContextMenu = (e: React.MouseEvent, id: number, text: string) => {
         e.preventDefault();
@@ -132,6 +144,15 @@ const ChatWindow = memo(({
         setDeletingId(null);
     };
 
+    const selectedPendingIds = messages
+        .filter(m => selectedIds.includes(m.id) && (m.status === 'pending' || m.status === 'pending_review'))
+        .map(m => m.id);
+
+    const handleBulkApprove = () => {
+        onBulkApprove?.(selectedPendingIds);
+        setSelectedIds([]);
+    };
+
     const startEditing = (id: number, text: string) => {
         setEditingId(id);
         setEditValue(text);
@@ -204,6 +225,17 @@ const ChatWindow = memo(({
                     </div>
                 )}
 
+                {hasOlder && onLoadOlder && (
+                    <div className="flex justify-center">
+                        <button
+                            onClick={onLoadOlder}
+                            className="text-[10px] font-bold uppercase tracking-widest text-slate-400 hover:text-slate-600 dark:hover:text-slate-200 transition-colors"
+                        >
+                            {t('chat.load_older')}
+                        </button>
+                    </div>
+                )}
+
                 {messages.map((m, idx) => {
                     const isPending = m.status === 'pending' || m.status === 'pending_review';
                     const isAI = m.is_ai_generated;
@@ -280,6 +312,8 @@ const ChatWindow = memo(({
                                     <div className={`text-[11px] mt-2.5 flex items-center gap-2 font-mono tabular-nums ${alignRight ? "justify-end opacity-85" : "justify-start opacity-70"}`}>
                                         {formatTime(m.timestamp)}
                                         {m.status === 'sent' && !isPending && <Check className="w-4 h-4" />}
+                                        {(m.status === 'queued' || m.status === 'sending') && <Clock className="w-3.5 h-3.5" />}
+                                        {m.status === 'failed' && <span title={t('chat.send_failed')}><X className="w-4 h-4 text-red-500" /></span>}
                                     </div>
                                     {isPending && (
                                         <div className="mt-3 flex gap-2 pt-2 border-t border-amber-200 dark:border-amber-800">
@@ -294,7 +328,17 @@ const ChatWindow = memo(({
                     );
                 })}
 
-                {isThinking && (
+                {draftPreview && (
+                    <div className="flex justify-end">
+                        <div className="max-w-[80%] p-3 bg-amber-50 dark:bg-amber-900/10 border border-dashed border-amber-300 dark:border-amber-800 rounded-2xl rounded-br-none text-sm whitespace-pre-wrap" style={{ borderRadius: 'var(--brand-radius)' }}>
+                            <div className="flex items-center gap-1 text-[9px] font-black uppercase text-amber-600 mb-1">
+                                <Sparkles className="w-3 h-3 animate-pulse" /> {t('chat.drafting')}
+                            </div>
+                            {draftPreview}
+                        </div>
+                    </div>
+                )}
+                {isThinking && !draftPreview && (
                     <div className="flex justify-start">
                         <div className="p-3 bg-gray-100 dark:bg-[var(--brand-surface)] rounded-2xl rounded-bl-none flex gap-1 animate-pulse" style={{ borderRadius: 'var(--brand-radius)' }}>
                             <span className="w-1.5 h-1.5 bg-[var(--brand-primary)] rounded-full"></span>
@@ -310,6 +354,13 @@ const ChatWindow = memo(({
                 <div className="absolute top-20 left-1/2 -translate-x-1/2 z-[70] bg-white dark:bg-[var(--brand-surface)] border dark:border-[var(--brand-border)] shadow-2xl rounded-2xl p-2 flex items-center gap-3 animate-in fade-in zoom-in slide-in-from-top-4">
                     <span className="text-xs font-black text-[var(--brand-primary)] px-3 uppercase tracking-tighter">{selectedIds.length} {t('common.selected')}</span>
 
+                    {onBulkApprove && selectedPendingIds.length > 0 && deletingId !== -1 && (
+                        <button onClick={handleBulkApprove} className="p-2 bg-green-50 text-green-700 hover:bg-green-100 rounded-xl transition-all flex items-center gap-2">
+                            <Check className="w-4 h-4" />
+                            <span className="text-[10px] font-black uppercase">{t('common.approve')} ({selectedPendingIds.length})</span>
+                        </button>
+                    )}
+
                     {deletingId === -1 ? (
                         <div className="flex items-center gap-2 px-2 py-1 bg-red-50 dark:bg-red-900/10 rounded-xl">
                             <span className="text-[10px] font-black uppercase text-red-600">{t('chat.alerts.confirm_bulk_delete', { count: selectedIds.length })}</span>
@@ -190,6 +190,24 @@ export const AdvancedTab = ({ config, setConfig }: Props) => {
                             </div>
                         </div>
 
+                        <div className="flex flex-col justify-center">
+                            <label className="flex items-center gap-3 cursor-pointer group">
+                                <div className="relative">
+                                    <input
+                                        type="checkbox"
+                                        className="sr-only peer"
+                                        checked={!!config.stream_responses}
+                                        onChange={(e) => setConfig({ ...config, stream_responses: e.target.checked })}
+                                    />
+                                    <div className="w-12 h-6 bg-gray-200 peer-focus:outline-none rounded-full peer dark:bg-gray-700 peer-checked:after:translate-x-full peer-checked:after:border-white after:content-[''] after:absolute after:top-[2px] after:left-[2px] after:bg-white after:border-gray-300 after:border after:rounded-full after:h-5 after:w-5 after:transition-all dark:border-gray-600 peer-checked:bg-indigo-500"></div>
+                                </div>
+                                <div className="flex flex-col">
+                                    <span className="text-sm font-bold dark:text-white group-hover:text-indigo-500 transition-colors leading-tight">{t('admin.fields.stream_responses')}</span>
+                                    <p className="text-[10px] text-gray-500 mt-0.5">{t('admin.fields.stream_responses_hint')}</p>
+                                </div>
+                            </label>
+                        </div>
+
                         <div className="space-y-2">
                             <div className="flex justify-between items-center">
                                 <label className="text-xs font-black text-gray-400 uppercase tracking-widest flex items-center gap-2">
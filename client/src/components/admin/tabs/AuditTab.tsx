@@ -139,6 +139,9 @@ export const AuditTab = ({ audits, auditLogs, refreshAudits }: Props) => {
                                                 <div className="text-[10px] font-bold text-gray-400 uppercase tracking-tighter">
                                                     {audit.model_name}
                                                 </div>
+                                                {audit.cache_hit && (
+                                                    <span className="mt-1 inline-block px-1.5 py-0.5 rounded bg-indigo-50 dark:bg-indigo-900/20 text-[9px] font-black uppercase text-indigo-500">{t('admin.audit.cached')}</span>
+                                                )}
                                             </td>
                                         </tr>
                                     ))}
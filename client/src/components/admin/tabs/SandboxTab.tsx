@@ -26,7 +26,7 @@ export const SandboxTab = ({ testQuery, setTestQuery, testResult, isTesting, run
 
         setSimLoading(true);
         try {
-            const res = await fetch(`${API_BASE_URL}/whatsapp/webhook`, {
+            const res = await fetch(`${API_BASE_URL}/whatsapp/webhook?wait=true`, {
                 method: "POST",
                 headers: { "Content-Type": "application/json" },
                 body: JSON.stringify({
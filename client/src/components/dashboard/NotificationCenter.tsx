@@ -75,24 +75,32 @@ export default function NotificationCenter() {
         const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
         const socket = new WebSocket(`${protocol}//${window.location.hostname}:8000/ws/chat`);
 
+        socket.onopen = () => {
+            socket.send(JSON.stringify({ action: "subscribe", id: "notifications", types: ["notification"] }));
+        };
+
         socket.onmessage = (event) => {
             try {
-                const data = JSON.parse(event.data);
-                if (data.type === 'notification') {
-                    const newNotif: Notification = {
-                        id: Math.random().toString(36).substr(2, 9),
-                        type: data.data.type || 'ai',
-                        severity: data.data.severity || 'info',
-                        title: data.data.title,
-                        description: data.data.description,
-                        timestamp: 'Just now',
-                        isRead: false
-                    };
-                    setNotifications(prev => [newNotif, ...prev]);
+                const parsed = JSON.parse(event.data);
+                // The server batches bursts into one frame per tick
+                const events = parsed.type === 'batch' ? parsed.events : [parsed];
+                for (const data of events) {
+                    if (data.type === 'notification') {
+                        const newNotif: Notification = {
+                            id: Math.random().toString(36).substr(2, 9),
+                            type: data.data.type || 'ai',
+                            severity: data.data.severity || 'info',
+                            title: data.data.title,
+                            description: data.data.description,
+                            timestamp: 'Just now',
+                            isRead: false
+                        };
+                        setNotifications(prev => [newNotif, ...prev]);
 
-                    if (newNotif.severity === 'critical') {
-                        const audio = new Audio('/assets/sounds/alert.mp3');
-                        audio.play().catch(() => { });
+                        if (newNotif.severity === 'critical') {
+                            const audio = new Audio('/assets/sounds/alert.mp3');
+                            audio.play().catch(() => { });
+                        }
                     }
                 }
             } catch (e) {
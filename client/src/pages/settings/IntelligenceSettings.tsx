@@ -95,6 +95,8 @@ export default function IntelligenceSettings() {
                 body: JSON.stringify({ name: selectedDataset.name, data_type: selectedDataset.data_type, content: selectedDataset.content })
             });
             if (res.ok) fetchDatasets();
+            // Uploaded files only keep a preview; the server refuses to re-index from it
+            else if (res.status === 409) alert((await res.json()).detail);
         } catch (err) { console.error(err); }
     };
 
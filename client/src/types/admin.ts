@@ -13,6 +13,7 @@ export interface AIConfig {
     intent_rules: { keywords: string[], intent: string, suggestions?: string[] }[];
     fallback_message: string;
     preferred_model: string;
+    stream_responses?: boolean;
     logo_url: string | null;
     primary_color: string;
     ui_density: 'compact' | 'comfortable';
@@ -59,6 +60,7 @@ export interface SecurityAudit {
     timestamp: string;
     reasoning: string;
     triggered_keywords: string;
+    cache_hit?: boolean;
 }
 
 export interface AIConfigSnapshot {
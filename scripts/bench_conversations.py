@@ -0,0 +1,122 @@
+"""
+Benchmark: GET /conversations sidebar listing latency vs. client count.
+
+Compares the legacy N+1 listing (three queries per client), the set-based
+query computed on the fly from messages, and the conversation_summaries
+projection read by the router. Uses a throwaway SQLite file unless
+--database-url points at another async database (e.g. Postgres).
+
+    python scripts/bench_conversations.py --clients 100 1000 5000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(__file__), "..", "server")
+sys.path.append(SERVER_DIR)
+
+parser = argparse.ArgumentParser(description="Sidebar listing benchmark")
+parser.add_argument("--clients", type=int, nargs="+", default=[100, 1000, 5000])
+parser.add_argument("--messages", type=int, default=5, help="Messages per conversation")
+parser.add_argument("--runs", type=int, default=5)
+parser.add_argument("--database-url", default=None, help="Async SQLAlchemy URL (default: temp SQLite)")
+args = parser.parse_args()
+
+if not args.database_url:
+    tmp_dir = tempfile.mkdtemp()
+    args.database_url = f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.db')}"
+os.environ["ASYNC_DATABASE_URL"] = args.database_url
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from database import Base
+from models import Client, Conversation, Message, ConversationSummaryRecord
+from routers.conversations import list_conversation_summaries
+from services import conversation_summary
+
+
+async def legacy_listing(db):
+    """The pre-optimization implementation: 1 + 3N queries."""
+    results = []
+    clients = (await db.execute(select(Client))).scalars().all()
+    for client in clients:
+        conv = (await db.execute(select(Conversation).filter(
+            Conversation.client_id == client.id
+        ).order_by(Conversation.started_at.desc()).limit(1))).scalars().first()
+        if conv:
+            last_msg = (await db.execute(select(Message).filter(
+                Message.conversation_id == conv.id
+            ).order_by(Message.timestamp.desc()).limit(1))).scalars().first()
+            pending = (await db.execute(select(Message).filter(
+                Message.conversation_id == conv.id, Message.status == "pending"
+            ))).scalars().first()
+            results.append((conv.id, last_msg.content if last_msg else None, pending is not None))
+    return results
+
+
+async def on_the_fly_listing(db):
+    """Set-based projection computed from the source tables on every request."""
+    client_ids = select(Client.id)
+    result = await db.execute(conversation_summary._projection_query(client_ids))
+    return [row for row in result.mappings() if row["is_latest"]]
+
+
+async def seed(session_factory, n_clients):
+    async with session_factory() as db:
+        await db.execute(delete(ConversationSummaryRecord))
+        await db.execute(delete(Message))
+        await db.execute(delete(Conversation))
+        await db.execute(delete(Client))
+        await db.commit()
+
+        clients = [Client(phone_number=f"bench{i}", name=f"Bench {i}") for i in range(n_clients)]
+        db.add_all(clients)
+        await db.flush()
+        convs = [Conversation(client_id=c.id) for c in clients]
+        db.add_all(convs)
+        await db.flush()
+        db.add_all([
+            Message(conversation_id=conv.id, sender="user" if m % 2 == 0 else "agent",
+                    content=f"message {m}", status="pending" if m == args.messages - 1 and conv.id % 3 == 0 else "sent")
+            for conv in convs for m in range(args.messages)
+        ])
+        await db.flush()
+        await conversation_summary.rebuild_all(db)
+        await db.commit()
+
+
+async def time_it(session_factory, fn):
+    samples = []
+    for _ in range(args.runs):
+        async with session_factory() as db:
+            start = time.perf_counter()
+            await fn(db)
+            samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+async def main():
+    engine = create_async_engine(args.database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    print(f"Database: {args.database_url}")
+    print(f"{'clients':>8} | {'legacy N+1 (ms)':>16} | {'on the fly (ms)':>16} | {'projection (ms)':>16} | {'page of 50 (ms)':>16} | speedup")
+    for n in args.clients:
+        await seed(session_factory, n)
+        legacy = await time_it(session_factory, legacy_listing)
+        on_the_fly = await time_it(session_factory, on_the_fly_listing)
+        projection = await time_it(session_factory, lambda db: list_conversation_summaries(db))
+        paged = await time_it(session_factory, lambda db: list_conversation_summaries(db, limit=50))
+        print(f"{n:>8} | {legacy:>16.1f} | {on_the_fly:>16.1f} | {projection:>16.1f} | {paged:>16.1f} | {legacy / max(projection, 0.001):.1f}x")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+"""
+Benchmark: GuardrailEngine.prescan_message, legacy per-keyword substring scans
+vs. the compiled Aho–Corasick matcher over normalized tokens, on a synthetic
+Spanish message corpus. Results differ where word boundaries or accents
+matter (e.g. "ley" inside "leyenda", "medico" without accent); those
+differences are counted, not treated as errors.
+
+    python scripts/bench_guardrail.py --topics 10 100 500 --messages 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(__file__), "..", "server")
+sys.path.append(SERVER_DIR)
+
+from guardrail.engine import GuardrailEngine, GuardrailResult
+
+parser = argparse.ArgumentParser(description="Guardrail prescan benchmark")
+parser.add_argument("--topics", type=int, nargs="+", default=[10, 100, 500], help="Forbidden topic list sizes")
+parser.add_argument("--messages", type=int, default=5000)
+parser.add_argument("--seed", type=int, default=7)
+args = parser.parse_args()
+
+OPENERS = ["Hola", "Buenas tardes", "Buenos días", "Pura vida", "Disculpe", "Hola, una consulta", ""]
+BODIES = [
+    "¿tienen {product} disponible para entrega hoy?",
+    "quiero pedir dos {product} y un {product}, ¿cuánto sería el total?",
+    "mi pedido #{num} todavía no ha llegado, ya pasaron tres días",
+    "¿a qué hora abren el sábado? quería pasar por {product}",
+    "¿aceptan SINPE móvil o solo tarjeta?",
+    "el {product} llegó dañado, necesito un reembolso por favor",
+    "¿hacen envíos a Heredia o solo dentro de San José?",
+    "me pueden mandar el catálogo completo con precios",
+    "¿venden {topic}? un amigo me dijo que sí",
+    "esto es una estafa, son unos idiotas",
+    "necesito un abogado porque quiero poner una demanda",
+    "¿qué opinan del gobierno y de la marcha de mañana?",
+    "me recomiendan alguna medicina para el dolor de cabeza",
+    "¿tienen el queque de la leyenda del volcán?",
+    "necesito un medico para mi mamá, ¿cierran temprano hoy?",
+]
+PRODUCTS = ["café molido", "queque de chocolate", "empanadas", "tamales", "pan casero", "gallo pinto",
+            "arroz con leche", "tres leches", "casado", "chifrijo", "batido de fresa", "pupusas"]
+TOPIC_WORDS = ["pizza", "sushi", "hamburguesa", "seguro", "préstamo", "alquiler", "vuelo", "hotel", "gimnasio",
+               "celular", "laptop", "bicicleta", "mascota", "veterinaria", "tatuaje", "peluquería", "lavandería",
+               "taxi", "mudanza", "pintura", "fontanería", "cerrajería", "joyería", "perfume", "zapatos"]
+QUALIFIERS = ["", " a domicilio", " premium", " económico", " usado", " de segunda", " nocturno", " express",
+              " para niños", " ejecutivo", " internacional", " por mayor", " al detal", " en línea"]
+
+
+def make_topics(n, rng):
+    topics = []
+    seen = set()
+    while len(topics) < n:
+        topic = rng.choice(TOPIC_WORDS) + rng.choice(QUALIFIERS)
+        if len(seen) >= len(TOPIC_WORDS) * len(QUALIFIERS):
+            topic += f" {len(topics)}"
+        if topic not in seen:
+            seen.add(topic)
+            topics.append(topic)
+    return topics
+
+
+def make_corpus(n, topics, rng):
+    corpus = []
+    for _ in range(n):
+        body = rng.choice(BODIES).format(product=rng.choice(PRODUCTS), topic=rng.choice(topics), num=rng.randint(1000, 9999))
+        corpus.append(f"{rng.choice(OPENERS)} {body}".strip())
+    return corpus
+
+
+def legacy_prescan(message, forbidden_topics):
+    """The pre-automaton implementation: one substring scan per keyword and category."""
+    text = message.lower()
+    for classification, keywords in (
+        ("security_violation", GuardrailEngine.SECURITY_VIOLATION_KEYWORDS),
+        ("legal_violation", GuardrailEngine.LEGAL_KEYWORDS),
+        ("medical_violation", GuardrailEngine.MEDICAL_KEYWORDS),
+        ("out_of_scope", forbidden_topics),
+    ):
+        triggers = [kw.rstrip("*") for kw in keywords if kw.rstrip("*").lower() in text]
+        if triggers:
+            return GuardrailResult(classification=classification, triggered_keywords=triggers,
+                                   is_safe=classification == "out_of_scope")
+    return GuardrailResult(classification="in_scope", triggered_keywords=[], is_safe=True)
+
+
+def main():
+    rng = random.Random(args.seed)
+    print(f"{'topics':>7} | {'legacy (us/msg)':>15} | {'automaton (us/msg)':>18} | {'compile (ms)':>12} | {'differ':>6} | speedup")
+    for n in args.topics:
+        topics = make_topics(n, rng)
+        corpus = make_corpus(args.messages, topics, rng)
+
+        start = time.perf_counter()
+        GuardrailEngine._matcher(topics)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        expected = [legacy_prescan(m, topics) for m in corpus]
+        legacy = (time.perf_counter() - start) * 1e6 / len(corpus)
+
+        start = time.perf_counter()
+        results = [GuardrailEngine.prescan_message(m, topics) for m in corpus]
+        automaton = (time.perf_counter() - start) * 1e6 / len(corpus)
+
+        differ = sum(1 for exp, res in zip(expected, results) if exp.classification != res.classification)
+        print(f"{n:>7} | {legacy:>15.1f} | {automaton:>18.1f} | {compile_ms:>12.1f} | {differ:>6} | {legacy / automaton:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
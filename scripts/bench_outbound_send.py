@@ -0,0 +1,99 @@
+"""
+Benchmark: outbound WhatsApp send latency and throughput, one HTTP client
+per message (legacy MetaWhatsAppDriver behaviour) vs. the pooled client
+from the driver registry. Starts scripts/stub_graph_api.py locally (HTTPS
+by default, so per-message TCP + TLS handshakes are included).
+
+    python scripts/bench_outbound_send.py --messages 500 --concurrency 1 20
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.join(SCRIPTS_DIR, "..", "server")
+sys.path.append(SERVER_DIR)
+
+parser = argparse.ArgumentParser(description="Outbound send benchmark")
+parser.add_argument("--messages", type=int, default=500)
+parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 20])
+parser.add_argument("--latency-ms", type=float, default=0, help="Simulated Graph API processing time")
+parser.add_argument("--port", type=int, default=8900)
+parser.add_argument("--no-tls", action="store_true", help="Plain HTTP stub (TCP handshakes only)")
+args = parser.parse_args()
+
+scheme = "http" if args.no_tls else "https"
+cert_dir = tempfile.mkdtemp()
+os.environ["META_GRAPH_API_BASE"] = f"{scheme}://127.0.0.1:{args.port}/v23.0"
+if not args.no_tls:
+    # httpx trusts SSL_CERT_FILE; both paths verify the stub's self-signed certificate
+    os.environ["SSL_CERT_FILE"] = os.path.join(cert_dir, "cert.pem")
+
+from services.driver_registry import DriverRegistry, http2_enabled
+from services.whatsapp_service import MetaWhatsAppDriver, WhatsAppService
+
+CONFIG = {"whatsapp_driver": "meta", "whatsapp_api_token": "bench-token", "whatsapp_phone_id": "1234567890"}
+
+
+def start_stub():
+    command = [sys.executable, os.path.join(SCRIPTS_DIR, "stub_graph_api.py"), "--port", str(args.port),
+               "--latency-ms", str(args.latency_ms), "--cert-dir", cert_dir]
+    if not args.no_tls:
+        command.append("--tls")
+    proc = subprocess.Popen(command)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", args.port), timeout=0.2):
+                return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("Stub Graph API did not start")
+
+
+async def run(driver, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def send(i):
+        async with semaphore:
+            start = time.perf_counter()
+            result = await driver.send_message(f"506{i:08d}", f"Mensaje de prueba {i}")
+            latencies.append((time.perf_counter() - start) * 1000)
+            assert isinstance(result, str), "send failed"
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(i) for i in range(args.messages)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (args.messages / elapsed, statistics.median(latencies),
+            latencies[int(len(latencies) * 0.95) - 1])
+
+
+async def main():
+    print(f"Stub: {os.environ['META_GRAPH_API_BASE']} | http2={http2_enabled()} | {args.messages} messages")
+    print(f"{'path':>10} | {'concurrency':>11} | {'msg/s':>8} | {'p50 ms':>8} | {'p95 ms':>8}")
+    for concurrency in args.concurrency:
+        legacy = MetaWhatsAppDriver(CONFIG["whatsapp_api_token"], CONFIG["whatsapp_phone_id"])
+        registry = DriverRegistry()
+        pooled = WhatsAppService.get_driver(CONFIG, registry)
+        for label, driver in (("legacy", legacy), ("pooled", pooled)):
+            rate, p50, p95 = await run(driver, concurrency)
+            print(f"{label:>10} | {concurrency:>11} | {rate:>8.1f} | {p50:>8.2f} | {p95:>8.2f}")
+        await registry.aclose()
+
+
+if __name__ == "__main__":
+    stub = start_stub()
+    try:
+        asyncio.run(main())
+    finally:
+        stub.terminate()
+        stub.wait()
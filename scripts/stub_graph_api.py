@@ -0,0 +1,87 @@
+"""
+Local stand-in for the Meta Graph API /messages endpoint, for outbound send
+benchmarks. Answers every POST /{version}/{phone_id}/messages like Graph
+does on success, optionally after --latency-ms. With --tls it serves HTTPS
+with a throwaway self-signed certificate (written to --cert-dir) so the
+handshake cost of per-message connections is part of the measurement.
+
+    python scripts/stub_graph_api.py --port 8900 --tls --latency-ms 20
+    META_GRAPH_API_BASE=https://127.0.0.1:8900/v23.0 SSL_CERT_FILE=<cert-dir>/cert.pem ...
+"""
+import argparse
+import asyncio
+import datetime
+import ipaddress
+import itertools
+import os
+import tempfile
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+parser = argparse.ArgumentParser(description="Stub Meta Graph API")
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=8900)
+parser.add_argument("--latency-ms", type=float, default=0, help="Artificial processing time per request")
+parser.add_argument("--tls", action="store_true", help="Serve HTTPS with a self-signed certificate")
+parser.add_argument("--cert-dir", default=None, help="Where cert.pem/key.pem are written (default: temp dir)")
+
+app = FastAPI(title="Stub Graph API")
+_ids = itertools.count(1)
+LATENCY_SECONDS = 0.0
+
+
+@app.post("/{version}/{phone_id}/messages")
+async def send_message(version: str, phone_id: str, request: Request):
+    payload = await request.json()
+    if LATENCY_SECONDS:
+        await asyncio.sleep(LATENCY_SECONDS)
+    return {
+        "messaging_product": "whatsapp",
+        "contacts": [{"input": payload.get("to"), "wa_id": payload.get("to")}],
+        "messages": [{"id": f"wamid.stub.{next(_ids)}"}]
+    }
+
+
+def write_self_signed_cert(cert_dir: str, host: str):
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, host)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name).issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))
+        ]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(cert_dir, "cert.pem")
+    key_path = os.path.join(cert_dir, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    LATENCY_SECONDS = args.latency_ms / 1000
+    ssl_options = {}
+    if args.tls:
+        cert_dir = args.cert_dir or tempfile.mkdtemp()
+        cert_path, key_path = write_self_signed_cert(cert_dir, args.host)
+        ssl_options = {"ssl_certfile": cert_path, "ssl_keyfile": key_path}
+        print(f"Certificate: {cert_path}", flush=True)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", **ssl_options)
@@ -32,6 +32,20 @@ AsyncSessionLocal = async_sessionmaker(
 
 Base = declarative_base()
 
+def dialect_insert(db):
+    """
+    The `insert()` construct of the session's dialect, which supports
+    ON CONFLICT clauses (Postgres and SQLite). None for other databases.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
 # Sync Dependency
 def get_db():
     db = SessionLocal()
@@ -12,6 +12,22 @@ python migrate_v17.py
 python migrate_v18.py
 # Run migration for Notifications Support
 python migrate_v19.py
+# Run migration for Knowledge Base retrieval chunks
+python migrate_v20.py
+# Run migration for the conversation sidebar projection
+python migrate_v21.py
+# Run migration for the message history index
+python migrate_v22.py
+# Run migration for the durable auto-send scheduler
+python migrate_v23.py
+# Run migration for the outbound delivery queue
+python migrate_v24.py
+# Run migration for streamed AI drafts
+python migrate_v25.py
+# Run migration for the AI response cache audit flag
+python migrate_v26.py
+# Run migration for the inbound recovery sweep
+python migrate_v27.py
 
 echo "Starting Uvicorn..."
 exec uvicorn main:app --host 0.0.0.0 --port 8000 --workers 1
@@ -1,6 +1,7 @@
 from typing import List, Optional, Tuple, Literal
 from pydantic import BaseModel
 import json
+from guardrail.matcher import get_matcher, normalize_text, display_keyword
 
 class GuardrailResult(BaseModel):
     classification: Literal["security_violation", "legal_violation", "medical_violation", "out_of_scope", "in_scope"]
@@ -9,9 +10,10 @@ class GuardrailResult(BaseModel):
 
 class GuardrailEngine:
     # Hard-coded Security Triggers (Never touch business topics)
+    # Keywords match whole words (accents/case/plurals ignored); a trailing "*" matches a word prefix.
     SECURITY_VIOLATION_KEYWORDS = [
-        "huelga", "politic", "activismo", "manifestaci", "gobierno", "voto", "elección",
-        "religi", "gas lacrim", "manifestante", "protesta", "marcha", "disturbio",
+        "huelga", "politic*", "activismo", "manifestaci*", "gobierno", "voto", "elección",
+        "religi*", "gas lacrim*", "manifestante", "protesta", "marcha", "disturbio",
         # Abuse/Hate speech
         "maldito", "idiota", "estúpido", "pendejo", "hijo de puta",
         # Medical/Emergencies (High Risk)
@@ -22,15 +24,29 @@ class GuardrailEngine:
     LEGAL_KEYWORDS = ["ley", "legal", "abogado", "derecho", "demanda", "juicio"]
     MEDICAL_KEYWORDS = ["diagnóstico", "medicina", "tratamiento médico", "prescripción"]
 
+    @classmethod
+    def _matcher(cls, forbidden_topics: List[str]):
+        return get_matcher({
+            "security": cls.SECURITY_VIOLATION_KEYWORDS,
+            "legal": cls.LEGAL_KEYWORDS,
+            "medical": cls.MEDICAL_KEYWORDS,
+        }, forbidden_topics)
+
     @classmethod
     def prescan_message(cls, user_message: str, forbidden_topics: List[str] = []) -> GuardrailResult:
         """
         Classify whether triggered keywords are Security Violations or just Out-of-Scope business topics.
+        The message is normalized once (casefold, accents stripped, tokenized) and all keyword
+        categories are found in a single pass of a compiled automaton over its tokens.
         """
-        user_msg_lower = user_message.lower()
+        normalized = normalize_text(user_message)
+        hits = {
+            category: [display_keyword(kw) for kw in keywords]
+            for category, keywords in cls._matcher(forbidden_topics).match(normalized, prepared=True).items()
+        }
         
         # 1. Security Check (Highest Priority)
-        security_triggers = [kw for kw in cls.SECURITY_VIOLATION_KEYWORDS if kw.lower() in user_msg_lower]
+        security_triggers = hits["security"]
         if security_triggers:
             return GuardrailResult(
                 classification="security_violation",
@@ -39,7 +55,7 @@ class GuardrailEngine:
             )
         
         # 2. Legal/Medical Check (Also Security)
-        legal_triggers = [kw for kw in cls.LEGAL_KEYWORDS if kw.lower() in user_msg_lower]
+        legal_triggers = hits["legal"]
         if legal_triggers:
             return GuardrailResult(
                 classification="legal_violation",
@@ -47,7 +63,7 @@ class GuardrailEngine:
                 is_safe=False
             )
         
-        medical_triggers = [kw for kw in cls.MEDICAL_KEYWORDS if kw.lower() in user_msg_lower]
+        medical_triggers = hits["medical"]
         if medical_triggers:
             return GuardrailResult(
                 classification="medical_violation",
@@ -56,7 +72,7 @@ class GuardrailEngine:
             )
         
         # 3. Business Boundary Check (Out of Scope)
-        business_triggers = [topic for topic in forbidden_topics if topic.lower() in user_msg_lower]
+        business_triggers = hits["business"]
         if business_triggers:
             return GuardrailResult(
                 classification="out_of_scope",
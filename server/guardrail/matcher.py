@@ -0,0 +1,167 @@
+import re
+import unicodedata
+from collections import OrderedDict, deque
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Compiled automata kept per forbidden-topic set (tenants rarely have more than a few)
+MATCHER_CACHE_SIZE = 32
+
+# A trailing "*" marks a keyword as a stem (prefix of a word), e.g. "politic*"
+STEM_MARKER = "*"
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Casefold, strip accents and tokenize `text` into a space-padded token
+    string (" hola necesito un medico "), so word boundaries are plain spaces.
+    """
+    folded = (text or "").casefold()
+    if not folded.isascii():
+        decomposed = unicodedata.normalize("NFKD", folded)
+        folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " " + " ".join(_TOKEN_RE.findall(folded)) + " "
+
+
+def _plural_forms(word: str) -> List[str]:
+    """Spanish plural variants of a word (luz -> luces, voto -> votos, ley -> leyes)."""
+    forms = [word, word + "s", word + "es"]
+    if word.endswith("z"):
+        forms.append(word[:-1] + "ces")
+    return forms
+
+
+def word_patterns(keyword: str) -> List[str]:
+    """
+    Patterns to look for in a normalized token string: whole words (and their
+    plurals) are padded with spaces on both sides, stems only on the left.
+    """
+    is_stem = keyword.endswith(STEM_MARKER)
+    tokens = normalize_text(keyword.rstrip(STEM_MARKER)).split()
+    if not tokens:
+        return []
+    head = " " + " ".join(tokens[:-1] + [""]) if len(tokens) > 1 else " "
+    if is_stem:
+        return [head + tokens[-1]]
+    return [head + form + " " for form in _plural_forms(tokens[-1])]
+
+
+def display_keyword(keyword: str) -> str:
+    return keyword.rstrip(STEM_MARKER)
+
+
+class AhoCorasickMatcher:
+    """
+    Multi-pattern matcher (Aho–Corasick automaton).
+
+    Built from {category: [keywords]}; each keyword expands to one or more
+    patterns, all found in a single pass over the text whatever the number of
+    keywords. `match()` returns, per category, the keywords found in the order
+    they were configured.
+
+    By default keywords are raw case-insensitive substrings. The guardrail
+    passes `word_patterns`/`normalize_text` to match whole words and stems on
+    accent-free tokens instead.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]],
+                 expand: Callable[[str], List[str]] = lambda kw: [kw.lower()],
+                 prepare: Callable[[str], str] = str.lower):
+        self._prepare = prepare
+        self._order: Dict[str, List[str]] = {}
+        # pattern -> [(category, original keyword)]
+        pattern_owners: Dict[str, List[Tuple[str, str]]] = {}
+        for category, keywords in categories.items():
+            self._order[category] = []
+            for kw in keywords:
+                patterns = [p for p in expand(kw) if p]
+                if not patterns or kw in self._order[category]:
+                    continue
+                self._order[category].append(kw)
+                for pattern in patterns:
+                    owners = pattern_owners.setdefault(pattern, [])
+                    if (category, kw) not in owners:
+                        owners.append((category, kw))
+
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+        for pattern in pattern_owners:
+            self._add(pattern)
+        self._link()
+        self._owners = pattern_owners
+        self._rank = {
+            (category, kw): i for category, keywords in self._order.items() for i, kw in enumerate(keywords)
+        }
+
+    def _add(self, pattern: str):
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append(pattern)
+
+    def _link(self):
+        """Breadth-first computation of failure links and merged outputs."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_patterns(self, prepared: str) -> set:
+        """Set of patterns occurring in an already prepared text."""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = set()
+        node = 0
+        for ch in prepared:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                found.update(out[node])
+        return found
+
+    def match(self, text: str, prepared: bool = False) -> Dict[str, List[str]]:
+        """Keywords found per category. Pass prepared=True to reuse an already prepared text."""
+        hits: Dict[str, list] = {category: [] for category in self._order}
+        for pattern in self.find_patterns(text if prepared else self._prepare(text)):
+            for category, kw in self._owners[pattern]:
+                hits[category].append((self._rank[(category, kw)], kw))
+        return {category: [kw for _, kw in sorted(found)] for category, found in hits.items()}
+
+
+_cache: "OrderedDict[tuple, AhoCorasickMatcher]" = OrderedDict()
+
+
+def get_matcher(static_categories: Dict[str, List[str]], forbidden_topics: Iterable[str]) -> AhoCorasickMatcher:
+    """
+    Return the word-level automaton for the built-in categories plus a
+    tenant's forbidden topics, compiling it only the first time this keyword
+    set is seen. Match it against `normalize_text(message)` with prepared=True.
+    """
+    topics = tuple(forbidden_topics or ())
+    key = (tuple((name, tuple(kws)) for name, kws in static_categories.items()), topics)
+    matcher = _cache.get(key)
+    if matcher is not None:
+        _cache.move_to_end(key)
+        return matcher
+
+    matcher = AhoCorasickMatcher({**static_categories, "business": topics},
+                                 expand=word_patterns, prepare=normalize_text)
+    _cache[key] = matcher
+    if len(_cache) > MATCHER_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return matcher
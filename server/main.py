@@ -26,11 +26,33 @@ async def lifespan(app: FastAPI):
     # Startup: Start worker tasks
     import asyncio
     from services.maintenance import cleanup_stale_messages
-    from routers.websocket import start_heartbeat
+    from routers.websocket import start_heartbeat, manager
+    from services.broadcast_bus import get_broadcast_bus
+    from database import AsyncSessionLocal
+    from services.conversation_summary import ensure_summaries
+    from services.inbound_queue import inbound_queue
+    from services.receipt_aggregator import receipt_aggregator
+    from services.scheduler import auto_send_scheduler, SCHEDULER_BACKEND
+    from services.driver_registry import driver_registry
+    from services.outbound_dispatcher import outbound_dispatcher
+    from routers.whatsapp import run_inbound_job
+
+    # Make sure the sidebar projection exists (first start after upgrading)
+    try:
+        async with AsyncSessionLocal() as db:
+            await ensure_summaries(db)
+    except Exception as e:
+        logger.error(f"Lifespan: Could not verify conversation summaries: {e}")
     
     # Run tasks in background
     cleanup_task = asyncio.create_task(cleanup_stale_messages())
     heartbeat_task = asyncio.create_task(start_heartbeat())
+    await manager.attach_bus(get_broadcast_bus())
+    inbound_queue.start(run_inbound_job)
+    receipt_aggregator.start()
+    if SCHEDULER_BACKEND == "local":
+        auto_send_scheduler.start()
+    outbound_dispatcher.start()
     
     logger.info("Lifespan: Maintenance and Heartbeat tasks started")
     
@@ -39,6 +61,12 @@ async def lifespan(app: FastAPI):
     # Shutdown: Clean up if needed
     cleanup_task.cancel()
     heartbeat_task.cancel()
+    await inbound_queue.stop()
+    await receipt_aggregator.stop()
+    await auto_send_scheduler.stop()
+    await outbound_dispatcher.stop()
+    await driver_registry.aclose()
+    await manager.detach_bus()
     logger.info("Lifespan: Worker tasks stopped")
 
 app = FastAPI(title="WhatsApp AI Dashboard", lifespan=lifespan)
@@ -57,6 +85,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursors of the list endpoints are read by the dashboard
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.middleware("http")
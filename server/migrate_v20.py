@@ -0,0 +1,53 @@
+from sqlalchemy import create_engine, text
+import os
+
+# Database URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+def migrate():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Running migration v20: Create knowledge_chunks table...")
+        
+        try:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS knowledge_chunks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dataset_id INTEGER REFERENCES ai_datasets(id),
+                    ordinal INTEGER DEFAULT 0,
+                    content TEXT,
+                    term_freqs_json TEXT DEFAULT '{}',
+                    token_count INTEGER DEFAULT 0,
+                    tenant_id VARCHAR DEFAULT 'default'
+                )
+            """))
+            
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_knowledge_chunks_id ON knowledge_chunks (id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_knowledge_chunks_dataset_id ON knowledge_chunks (dataset_id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_knowledge_chunks_tenant_id ON knowledge_chunks (tenant_id)"))
+            
+            conn.commit()
+            print("knowledge_chunks table created successfully.")
+        except Exception as e:
+            print(f"Failed to create knowledge_chunks table: {e}")
+            return
+
+    # Backfill chunks for datasets that were ingested before retrieval existed
+    from database import SessionLocal
+    from models import AIDataset, KnowledgeChunk
+    from services.knowledge_service import KnowledgeService
+    
+    with SessionLocal() as db:
+        datasets = db.query(AIDataset).all()
+        backfilled = 0
+        for ds in datasets:
+            has_chunks = db.query(KnowledgeChunk.id).filter(KnowledgeChunk.dataset_id == ds.id).first()
+            if has_chunks or not ds.content:
+                continue
+            db.add_all(KnowledgeService.build_chunks(ds.id, ds.content, tenant_id=ds.tenant_id or "default"))
+            backfilled += 1
+        db.commit()
+        print(f"Backfilled chunks for {backfilled} datasets.")
+
+if __name__ == "__main__":
+    migrate()
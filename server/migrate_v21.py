@@ -0,0 +1,67 @@
+from sqlalchemy import create_engine, text
+import os
+
+# Database URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+def migrate():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Running migration v21: Create conversation_summaries table...")
+        
+        try:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS conversation_summaries (
+                    conversation_id INTEGER PRIMARY KEY,
+                    client_id INTEGER,
+                    is_latest BOOLEAN DEFAULT 1,
+                    is_pinned BOOLEAN DEFAULT 0,
+                    is_archived BOOLEAN DEFAULT 0,
+                    channel VARCHAR DEFAULT 'whatsapp',
+                    last_message_id INTEGER,
+                    last_message TEXT,
+                    last_message_time DATETIME,
+                    pending_count INTEGER DEFAULT 0,
+                    unread_count INTEGER DEFAULT 0,
+                    tenant_id VARCHAR DEFAULT 'default',
+                    updated_at DATETIME
+                )
+            """))
+            
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_conversation_summaries_client_id ON conversation_summaries (client_id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_conversation_summaries_tenant_id ON conversation_summaries (tenant_id)"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_conversation_summaries_sidebar "
+                "ON conversation_summaries (is_latest, is_pinned, last_message_time, conversation_id)"
+            ))
+            
+            conn.commit()
+            print("conversation_summaries table created successfully.")
+        except Exception as e:
+            print(f"Failed to create conversation_summaries table: {e}")
+            return
+
+    # Populate the projection from existing conversations
+    rebuild()
+
+def rebuild():
+    import asyncio
+    from database import AsyncSessionLocal
+    from services.conversation_summary import rebuild_all
+
+    async def _run():
+        async with AsyncSessionLocal() as db:
+            count = await rebuild_all(db)
+            await db.commit()
+            return count
+
+    count = asyncio.run(_run())
+    print(f"Rebuilt summaries for {count} conversations.")
+
+if __name__ == "__main__":
+    # `python migrate_v21.py --rebuild` repairs a drifted projection without touching the schema
+    import sys
+    if "--rebuild" in sys.argv:
+        rebuild()
+    else:
+        migrate()
@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, text
+import os
+
+# Database URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+def migrate():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Running migration v22: Add (conversation_id, timestamp) index to messages...")
+        
+        try:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_messages_conversation_timestamp "
+                "ON messages (conversation_id, timestamp)"
+            ))
+            conn.commit()
+            print("ix_messages_conversation_timestamp created successfully.")
+        except Exception as e:
+            print(f"Failed to create ix_messages_conversation_timestamp: {e}")
+
+if __name__ == "__main__":
+    migrate()
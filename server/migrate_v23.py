@@ -0,0 +1,27 @@
+from sqlalchemy import create_engine, inspect, text
+import os
+
+# Database URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+def migrate():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Running migration v23: Add send_after column to messages (durable auto-send scheduler)...")
+
+        try:
+            columns = [col["name"] for col in inspect(conn).get_columns("messages")]
+            if "send_after" not in columns:
+                print("Adding send_after column to messages...")
+                conn.execute(text("ALTER TABLE messages ADD COLUMN send_after TIMESTAMP"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_messages_status_send_after "
+                "ON messages (status, send_after)"
+            ))
+            conn.commit()
+            print("messages.send_after and ix_messages_status_send_after created successfully.")
+        except Exception as e:
+            print(f"Failed to migrate messages.send_after: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,33 @@
+from sqlalchemy import create_engine, inspect, text
+import os
+
+# Database URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+def migrate():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Running migration v24: Add outbound delivery columns to messages...")
+
+        try:
+            columns = [col["name"] for col in inspect(conn).get_columns("messages")]
+            new_columns = [
+                ("send_attempts", "INTEGER DEFAULT 0"),
+                ("next_attempt_at", "TIMESTAMP"),
+                ("last_error", "TEXT")
+            ]
+            for col_name, col_type in new_columns:
+                if col_name not in columns:
+                    print(f"Adding {col_name} column to messages...")
+                    conn.execute(text(f"ALTER TABLE messages ADD COLUMN {col_name} {col_type}"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_messages_status_next_attempt "
+                "ON messages (status, next_attempt_at)"
+            ))
+            conn.commit()
+            print("Outbound delivery columns and ix_messages_status_next_attempt created successfully.")
+        except Exception as e:
+            print(f"Failed to migrate outbound delivery columns: {e}")
+
+if __name__ == "__main__":
+    migrate()
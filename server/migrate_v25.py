@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, inspect, text
+import os
+
+# Database URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+def migrate():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Running migration v25: Add stream_responses to ai_configs...")
+
+        try:
+            columns = [col["name"] for col in inspect(conn).get_columns("ai_configs")]
+            if "stream_responses" not in columns:
+                print("Adding stream_responses column to ai_configs...")
+                conn.execute(text("ALTER TABLE ai_configs ADD COLUMN stream_responses BOOLEAN DEFAULT 0"))
+            conn.commit()
+            print("stream_responses column created successfully.")
+        except Exception as e:
+            print(f"Failed to migrate stream_responses: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, inspect, text
+import os
+
+# Database URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+def migrate():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Running migration v26: Add cache_hit to security_audits...")
+
+        try:
+            columns = [col["name"] for col in inspect(conn).get_columns("security_audits")]
+            if "cache_hit" not in columns:
+                print("Adding cache_hit column to security_audits...")
+                conn.execute(text("ALTER TABLE security_audits ADD COLUMN cache_hit BOOLEAN DEFAULT 0"))
+            conn.commit()
+            print("cache_hit column created successfully.")
+        except Exception as e:
+            print(f"Failed to migrate cache_hit: {e}")
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,23 @@
+from sqlalchemy import create_engine, text
+import os
+
+# Database URL
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./sql_app.db")
+
+def migrate():
+    engine = create_engine(DATABASE_URL)
+    with engine.connect() as conn:
+        print("Running migration v27: Add inbound recovery index to messages...")
+
+        try:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_messages_sender_timestamp "
+                "ON messages (sender, timestamp)"
+            ))
+            conn.commit()
+            print("ix_messages_sender_timestamp created successfully.")
+        except Exception as e:
+            print(f"Failed to migrate inbound recovery index: {e}")
+
+if __name__ == "__main__":
+    migrate()
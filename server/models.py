@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Boolean, Index
 from sqlalchemy.orm import relationship
 from database import Base
 import datetime
@@ -42,7 +42,7 @@ class Message(Base):
     sender = Column(String) # "user" (client), "agent" (AI), "system"
     content = Column(Text)
     timestamp = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
-    status = Column(String, default="sent") # pending, sent, delivered, failed
+    status = Column(String, default="sent") # pending, queued, sending, sent, delivered, read, failed
     is_ai_generated = Column(Boolean, default=False)
     confidence = Column(Integer, default=0) # 0-100
     is_violation = Column(Boolean, default=False)
@@ -53,9 +53,52 @@ class Message(Base):
     # Media Support (Added v11)
     media_url = Column(String, nullable=True)
     media_type = Column(String, nullable=True) # "image", "pdf", "video"
+
+    # Delayed auto-send (Added v23): due time of a pending AI draft, see services/scheduler.py
+    send_after = Column(DateTime, nullable=True)
+
+    # Outbound delivery (Added v24): queued -> sending -> sent | failed, see services/outbound_dispatcher.py
+    send_attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
     
     conversation = relationship("Conversation", back_populates="messages")
 
+    __table_args__ = (
+        # History windows and "latest message" lookups per conversation
+        Index("ix_messages_conversation_timestamp", "conversation_id", "timestamp"),
+        # Scheduler scan: pending drafts ordered by due time
+        Index("ix_messages_status_send_after", "status", "send_after"),
+        # Outbound dispatcher scan: queued/sending rows ordered by next attempt
+        Index("ix_messages_status_next_attempt", "status", "next_attempt_at"),
+        # Inbound recovery sweep: recent user messages
+        Index("ix_messages_sender_timestamp", "sender", "timestamp"),
+    )
+
+
+class ConversationSummaryRecord(Base):
+    """Denormalized sidebar projection, maintained on write (see services/conversation_summary.py)."""
+    __tablename__ = "conversation_summaries"
+
+    # No foreign keys: rows are rewritten after the source rows change, including deletes
+    conversation_id = Column(Integer, primary_key=True)
+    client_id = Column(Integer, index=True)
+    is_latest = Column(Boolean, default=True) # Latest conversation of its client (shown in the sidebar)
+    is_pinned = Column(Boolean, default=False)
+    is_archived = Column(Boolean, default=False)
+    channel = Column(String, default="whatsapp")
+    last_message_id = Column(Integer, nullable=True)
+    last_message = Column(Text, nullable=True)
+    last_message_time = Column(DateTime) # Falls back to conversation start when there are no messages
+    pending_count = Column(Integer, default=0)
+    unread_count = Column(Integer, default=0)
+    tenant_id = Column(String, default="default", index=True)
+    updated_at = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc), onupdate=lambda: datetime.datetime.now(datetime.timezone.utc))
+
+    __table_args__ = (
+        Index("ix_conversation_summaries_sidebar", "is_latest", "is_pinned", "last_message_time", "conversation_id"),
+    )
+
 
 class AIConfig(Base):
     __tablename__ = "ai_configs"
@@ -85,6 +128,7 @@ class AIConfig(Base):
     intent_rules_json = Column(Text, default="[]") 
     fallback_message = Column(Text, default="I am currently having trouble processing your request.")
     preferred_model = Column(String, default="gpt-4-turbo")
+    stream_responses = Column(Boolean, default=False) # Push partial drafts to the dashboard while generating
     # Branding & UI/UX (SaaS White-Label)
     logo_url = Column(String, nullable=True)
     primary_color = Column(String, default="#2563eb") # Tailwind blue-600 default
@@ -140,6 +184,7 @@ class SecurityAudit(Base):
     timestamp = Column(DateTime, default=lambda: datetime.datetime.now(datetime.timezone.utc))
     reasoning = Column(Text)
     triggered_keywords = Column(Text) # JSON list
+    cache_hit = Column(Boolean, default=False) # Reply reused from the response cache (no LLM call)
     tenant_id = Column(String, default="default", index=True)
 
 
@@ -155,6 +200,18 @@ class AIDataset(Base):
     tenant_id = Column(String, default="default", index=True)
 
 
+class KnowledgeChunk(Base):
+    __tablename__ = "knowledge_chunks"
+
+    id = Column(Integer, primary_key=True, index=True)
+    dataset_id = Column(Integer, ForeignKey("ai_datasets.id"), index=True)
+    ordinal = Column(Integer, default=0) # Position of the chunk inside its dataset
+    content = Column(Text)
+    term_freqs_json = Column(Text, default="{}") # Precomputed {term: count} for the lexical index
+    token_count = Column(Integer, default=0)
+    tenant_id = Column(String, default="default", index=True)
+
+
 class AIConfigSnapshot(Base):
     __tablename__ = "ai_config_snapshots"
 
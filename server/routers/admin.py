@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import select, delete, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_async_db
-from models import AIConfig, AIDataset, AIConfigSnapshot, Message, SecurityAudit, User, AuditLog
+from models import AIConfig, AIDataset, AIConfigSnapshot, Message, SecurityAudit, User, AuditLog, KnowledgeChunk
 from pydantic import BaseModel
 from typing import List, Optional
 import json
@@ -15,7 +15,9 @@ try:
 except ImportError:
     from backports import zoneinfo # Fallback for older python if needed, but 3.9+ has it
 from services.encryption import encrypt_string, decrypt_string
-from services.knowledge_service import KnowledgeService
+from services.knowledge_service import KnowledgeService, INGEST_PROGRESS
+from services.config_cache import config_cache
+from services.knowledge_index import knowledge_index
 from fastapi import File, UploadFile
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
@@ -39,6 +41,7 @@ class AIConfigRequest(BaseModel):
     intent_rules: List[dict] = []
     fallback_message: str = "I am currently having trouble processing your request."
     preferred_model: str = "gpt-4-turbo"
+    stream_responses: bool = False
     logo_url: Optional[str] = None
     primary_color: str = os.getenv("DEFAULT_PRIMARY_COLOR", "#2563eb")
     ui_density: str = "comfortable"
@@ -87,6 +90,7 @@ async def get_ai_config(db: AsyncSession = Depends(get_async_db), admin: User =
         "intent_rules": json.loads(config.intent_rules_json),
         "fallback_message": config.fallback_message,
         "preferred_model": getattr(config, 'preferred_model', 'gpt-4-turbo'),
+        "stream_responses": bool(config.stream_responses),
         "logo_url": getattr(config, 'logo_url', None),
         "primary_color": getattr(config, 'primary_color', os.getenv("DEFAULT_PRIMARY_COLOR", "#2563eb")),
         "ui_density": getattr(config, 'ui_density', 'comfortable'),
@@ -133,6 +137,7 @@ async def update_ai_config(req: AIConfigRequest, db: AsyncSession = Depends(get_
     config.intent_rules_json = json.dumps(req.intent_rules)
     config.fallback_message = req.fallback_message
     config.preferred_model = req.preferred_model
+    config.stream_responses = req.stream_responses
     config.logo_url = req.logo_url
     config.primary_color = req.primary_color
     config.ui_density = req.ui_density
@@ -169,6 +174,7 @@ async def update_ai_config(req: AIConfigRequest, db: AsyncSession = Depends(get_
     
     await db.commit()
     await db.refresh(config)
+    config_cache.invalidate("config_update")
     
     # --- AUTOMATIC SNAPSHOT ---
     snapshot = AIConfigSnapshot(
@@ -257,6 +263,7 @@ async def rollback_to_snapshot(snapshot_id: int, db: AsyncSession = Depends(get_
     config.primary_color = snapshot.primary_color
     
     await db.commit()
+    config_cache.invalidate("snapshot_rollback")
     logger.info(f"AI Configuration rolled back to snapshot {snapshot_id}")
     return {"status": "success", "message": f"Rolled back to {snapshot.version_name or snapshot.version_label or snapshot.created_at}"}
 
@@ -353,8 +360,11 @@ async def create_dataset(req: AIDatasetRequest, db: AsyncSession = Depends(get_a
         content=req.content
     )
     db.add(new_ds)
+    await db.flush()
+    await KnowledgeService.replace_chunks(db, new_ds)
     await db.commit()
     await db.refresh(new_ds)
+    knowledge_index.invalidate("dataset_create")
     return new_ds
 
 @router.post("/datasets/{ds_id}/toggle")
@@ -364,6 +374,7 @@ async def toggle_dataset(ds_id: int, db: AsyncSession = Depends(get_async_db)):
     if ds:
         ds.is_active = not ds.is_active
         await db.commit()
+        knowledge_index.invalidate("dataset_toggle")
         return {"status": "success", "is_active": ds.is_active}
     return {"status": "error", "message": "Dataset not found"}
 
@@ -374,10 +385,21 @@ async def update_dataset(ds_id: int, req: AIDatasetRequest, db: AsyncSession = D
     if not ds:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
+    content_changed = ds.content != req.content
+    if content_changed and KnowledgeService.is_truncated_preview(ds.content):
+        # Re-chunking the preview would replace the full upload with its first rows
+        raise HTTPException(
+            status_code=409,
+            detail="This dataset was uploaded as a file and only a preview of its content is stored; upload a new file to change its content"
+        )
     ds.name = req.name
     ds.data_type = req.data_type
     ds.content = req.content
+    # Streamed uploads only keep a preview in `content`; don't re-chunk unless it was edited
+    if content_changed:
+        await KnowledgeService.replace_chunks(db, ds)
     await db.commit()
+    knowledge_index.invalidate("dataset_update")
     logger.info(f"Dataset {ds_id} updated")
     return {"status": "success", "message": "Dataset updated"}
 
@@ -388,8 +410,10 @@ async def delete_dataset(ds_id: int, db: AsyncSession = Depends(get_async_db)):
     if not ds:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
+    await db.execute(delete(KnowledgeChunk).filter(KnowledgeChunk.dataset_id == ds_id))
     await db.delete(ds)
     await db.commit()
+    knowledge_index.invalidate("dataset_delete")
     logger.info(f"Dataset {ds_id} deleted")
     return {"status": "success", "message": "Dataset deleted"}
 
@@ -404,34 +428,53 @@ async def upload_dataset(
     """Upload and process a knowledge file (CSV/JSON)."""
     logger.info(f"Uploading dataset: {name} ({data_type})")
     
+    dataset_id = None
     try:
-        content = await file.read()
-        processed_content = KnowledgeService.ground_knowledge(data_type, content)
-        
+        # Created inactive; ingest_upload activates it once every chunk is written
         new_ds = AIDataset(
             name=name,
             data_type=data_type,
-            content=processed_content
+            content="",
+            is_active=False
         )
         db.add(new_ds)
         await db.commit()
         await db.refresh(new_ds)
+        # Kept outside the ORM object: a failed ingest rolls back and expires it
+        dataset_id = new_ds.id
+        
+        stats = await KnowledgeService.ingest_upload(db, new_ds, data_type, file)
+        knowledge_index.invalidate("dataset_upload")
         
         # --- AUDIT LOG ---
         audit = AuditLog(
             user_id=admin.id,
             action="UPLOAD_DATASET",
-            resource=f"Dataset {new_ds.id}",
-            details=f"Uploaded {data_type} dataset: {name}"
+            resource=f"Dataset {dataset_id}",
+            details=f"Uploaded {data_type} dataset: {name} ({stats['rows']} rows, {stats['chunks']} chunks)"
         )
         db.add(audit)
         await db.commit()
         
-        return {"status": "success", "dataset_id": new_ds.id}
+        return {"status": "success", "dataset_id": dataset_id, "rows": stats["rows"], "chunks": stats["chunks"]}
     except Exception as e:
         logger.error(f"Upload failed: {e}")
+        if dataset_id is not None:
+            # Drop the partially ingested dataset (chunk batches may already be committed)
+            await db.rollback()
+            await db.execute(delete(KnowledgeChunk).filter(KnowledgeChunk.dataset_id == dataset_id))
+            await db.execute(delete(AIDataset).filter(AIDataset.id == dataset_id))
+            await db.commit()
         raise HTTPException(status_code=400, detail=str(e))
 
+@router.get("/datasets/{ds_id}/progress")
+async def get_dataset_ingest_progress(ds_id: int, admin: User = Depends(get_admin_user)):
+    """Report the progress of a streaming dataset upload."""
+    progress = INGEST_PROGRESS.get(ds_id)
+    if not progress:
+        raise HTTPException(status_code=404, detail="No ingestion in progress for this dataset")
+    return progress
+
 @router.get("/analytics/intents")
 async def get_intent_analytics(db: AsyncSession = Depends(get_async_db)):
     """Analyze intent frequencies from message metadata."""
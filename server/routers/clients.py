@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy import select, delete, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_async_db
-from models import Client, Conversation, User
+from models import Client, Conversation, User, ConversationSummaryRecord
 from pydantic import BaseModel
 from typing import List, Optional
 from routers.auth import get_admin_user, get_current_user
@@ -84,6 +84,7 @@ async def delete_client(id: int, db: AsyncSession = Depends(get_async_db), admin
     if not client:
         raise HTTPException(status_code=404, detail="Client not found")
         
+    await db.execute(delete(ConversationSummaryRecord).where(ConversationSummaryRecord.client_id == id))
     await db.execute(delete(Client).where(Client.id == id))
     await db.commit()
     return {"status": "deleted"}
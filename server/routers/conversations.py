@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import select, delete, update
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select, delete, update, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 from database import get_async_db
-from models import Client, Conversation, Message, AIConfig, User, AuditLog
+from models import Client, Conversation, Message, User, AuditLog, ConversationSummaryRecord, Order, Product
+from services import conversation_summary
 from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from logger import setup_logger
-from services.messaging_hub import MessagingHubService
+from services.outbound_dispatcher import outbound_dispatcher, enqueue, enqueue_pending
 from routers.auth import get_current_user
+import base64
 import datetime
 import json
 from services.metrics import MESSAGE_APPROVALS_TOTAL, MESSAGE_REJECTIONS_TOTAL, HUMAN_MESSAGES_TOTAL
@@ -42,6 +44,7 @@ class ConversationSummary(BaseModel):
     is_pinned: bool = False
     auto_ai_enabled: bool = True
     has_pending: bool = False
+    unread_count: int = 0
     channel: str = "whatsapp"
 
     model_config = ConfigDict(from_attributes=True)
@@ -58,7 +61,7 @@ class BulkActionRequest(BaseModel):
 
 class BulkMessageActionRequest(BaseModel):
     message_ids: List[int]
-    action: str  # "delete"
+    action: str  # "delete" | "approve"
 
 class ClientInit(BaseModel):
     phone_number: str
@@ -86,180 +89,283 @@ async def initiate_conversation(init: ClientInit, db: AsyncSession = Depends(get
     if not conv:
         conv = Conversation(client_id=client.id, is_active=True, channel=init.channel or "whatsapp")
         db.add(conv)
+        await db.flush()
+        await conversation_summary.refresh_summaries(db, [conv.id])
         await db.commit()
         await db.refresh(conv)
         
     return {"id": conv.id, "client_name": client.name, "client_phone": client.phone_number}
 
+def _encode_cursor(row) -> str:
+    payload = [bool(row["is_pinned"]), row["last_message_time"].isoformat() if row["last_message_time"] else None, row["id"]]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def _decode_cursor(cursor: str):
+    try:
+        pinned, sort_time, conv_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return bool(pinned), datetime.datetime.fromisoformat(sort_time) if sort_time else None, int(conv_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def list_conversation_summaries(
+    db: AsyncSession,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    archived: Optional[bool] = None,
+    pinned: Optional[bool] = None,
+    has_pending: Optional[bool] = None,
+    channel: Optional[str] = None
+):
+    """
+    Read the sidebar listing from the `conversation_summaries` projection,
+    which is maintained on write. With a limit this is an index range scan
+    over (is_latest, is_pinned, last_message_time) plus primary-key joins for
+    the page rows only. Returns (rows, next_cursor).
+    """
+    summary = ConversationSummaryRecord
+    query = (
+        select(
+            summary.conversation_id.label("id"),
+            summary.client_id,
+            Client.name.label("client_name"),
+            Client.phone_number.label("client_phone"),
+            summary.last_message,
+            summary.last_message_time,
+            Conversation.is_active,
+            summary.is_archived,
+            summary.is_pinned,
+            Conversation.auto_ai_enabled,
+            (summary.pending_count > 0).label("has_pending"),
+            summary.unread_count,
+            summary.channel
+        )
+        .join(Conversation, Conversation.id == summary.conversation_id)
+        .join(Client, Client.id == summary.client_id)
+        .filter(summary.is_latest == True)
+    )
+
+    if archived is not None:
+        query = query.filter(summary.is_archived == archived)
+    if pinned is not None:
+        query = query.filter(summary.is_pinned == pinned)
+    if has_pending is not None:
+        query = query.filter(summary.pending_count > 0 if has_pending else summary.pending_count == 0)
+    if channel:
+        query = query.filter(summary.channel == channel)
+    if cursor:
+        c_pinned, c_time, c_id = _decode_cursor(cursor)
+        query = query.filter(
+            tuple_(summary.is_pinned, summary.last_message_time, summary.conversation_id) < tuple_(c_pinned, c_time, c_id)
+        )
+
+    query = query.order_by(summary.is_pinned.desc(), summary.last_message_time.desc(), summary.conversation_id.desc())
+    if limit:
+        query = query.limit(limit + 1)
+
+    result = await db.execute(query)
+    rows = []
+    for r in result.mappings():
+        row = dict(r)
+        row["last_message"] = row["last_message"] if row["last_message"] is not None else "No messages"
+        row["auto_ai_enabled"] = row["auto_ai_enabled"] if row["auto_ai_enabled"] is not None else True
+        row["has_pending"] = bool(row["has_pending"])
+        rows.append(row)
+
+    next_cursor = None
+    if limit and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1])
+    return rows, next_cursor
+
 @router.get("/", response_model=List[ConversationSummary])
-async def get_conversations(db: AsyncSession = Depends(get_async_db)):
+async def get_conversations(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    archived: Optional[bool] = None,
+    pinned: Optional[bool] = None,
+    has_pending: Optional[bool] = None,
+    channel: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get all conversations with their latest status for the sidebar.
+    Get conversations with their latest status for the sidebar.
+
+    Without `limit` every conversation is returned (legacy behaviour). With
+    `limit`, the cursor for the next page is returned in the X-Next-Cursor header.
     """
-    results = []
-    
-    # Get all clients
-    result = await db.execute(select(Client))
-    clients = result.scalars().all()
-    
-    for client in clients:
-        # Get latest conversation
-        conv_result = await db.execute(select(Conversation).filter(
-            Conversation.client_id == client.id
-        ).order_by(Conversation.started_at.desc()).limit(1))
-        conv = conv_result.scalars().first()
-        
-        if conv:
-            # Get latest message
-            msg_result = await db.execute(select(Message).filter(
-                Message.conversation_id == conv.id
-            ).order_by(Message.timestamp.desc()).limit(1))
-            last_msg = msg_result.scalars().first()
-            
-            # Check for pending messages
-            pending_result = await db.execute(select(Message).filter(
-                Message.conversation_id == conv.id,
-                Message.status == "pending"
-            ))
-            has_pending = pending_result.scalars().first() is not None
-
-            results.append({
-                "id": conv.id,
-                "client_id": client.id,
-                "client_name": client.name,
-                "client_phone": client.phone_number,
-                "last_message": last_msg.content if last_msg else "No messages",
-                "last_message_time": last_msg.timestamp if last_msg else conv.started_at,
-                "is_active": conv.is_active,
-                "is_archived": conv.is_archived,
-                "is_pinned": conv.is_pinned,
-                "auto_ai_enabled": conv.auto_ai_enabled,
-                "has_pending": has_pending,
-                "channel": conv.channel or "whatsapp"
-            })
-            
-    # Sort by pinned first, then time desc
-    results.sort(key=lambda x: (x["is_pinned"], x["last_message_time"]), reverse=True)
-    return results
+    rows, next_cursor = await list_conversation_summaries(
+        db, limit=limit, cursor=cursor, archived=archived,
+        pinned=pinned, has_pending=has_pending, channel=channel
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+MESSAGE_PAGE_DEFAULT = 100
 
 @router.get("/{conversation_id}/messages", response_model=List[MessageResponse])
-async def get_conversation_messages(conversation_id: int, db: AsyncSession = Depends(get_async_db)):
+async def get_conversation_messages(
+    conversation_id: int,
+    response: Response,
+    limit: int = Query(MESSAGE_PAGE_DEFAULT, ge=1, le=1000),
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    include_metadata: bool = True,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Get full message history for a conversation.
+    Get a window of the message history, in ascending order.
+
+    Without cursors the latest `limit` messages are returned. `before_id` pages
+    back from a message (scroll-back), `after_id` fetches what came after one
+    (catch-up). `X-Next-Cursor` carries the id to pass as `before_id` (or
+    `after_id`) for the next window and is absent when there is nothing left.
     """
-    result = await db.execute(select(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(Message.timestamp.asc()))
-    messages = result.scalars().all()
-    
-    return messages
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+
+    columns = [Message.id, Message.sender, Message.content, Message.timestamp, Message.status,
+               Message.is_ai_generated, Message.confidence, Message.is_violation]
+    if include_metadata:
+        columns.append(Message.metadata_json)
+    query = select(*columns).filter(Message.conversation_id == conversation_id)
+
+    anchor_id = before_id if before_id is not None else after_id
+    if anchor_id is not None:
+        anchor = await db.execute(select(Message.timestamp).filter(
+            Message.id == anchor_id, Message.conversation_id == conversation_id
+        ))
+        anchor_time = anchor.scalar()
+        if anchor_time is None:
+            raise HTTPException(status_code=404, detail="Cursor message not found")
+        if before_id is not None:
+            query = query.filter(tuple_(Message.timestamp, Message.id) < tuple_(anchor_time, anchor_id))
+        else:
+            query = query.filter(tuple_(Message.timestamp, Message.id) > tuple_(anchor_time, anchor_id))
+
+    # Walk the (conversation_id, timestamp) index from the window edge
+    if after_id is not None:
+        query = query.order_by(Message.timestamp.asc(), Message.id.asc())
+    else:
+        query = query.order_by(Message.timestamp.desc(), Message.id.desc())
+    result = await db.execute(query.limit(limit + 1))
+    rows = [dict(row) for row in result.mappings()]
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after_id is None:
+        rows.reverse()
+    if has_more and rows:
+        response.headers["X-Next-Cursor"] = str(rows[-1]["id"] if after_id is not None else rows[0]["id"])
+    if not include_metadata:
+        for row in rows:
+            row["metadata_json"] = None
+    return rows
 
 from routers.websocket import manager
 import json
 
+def _order_product_ids(metadata: dict):
+    if not metadata.get("requires_order_creation"):
+        return []
+    return [item.get("product_id") for item in metadata.get("order_details", [])]
+
+async def _load_order_products(db: AsyncSession, metadatas) -> dict:
+    """Products referenced by the order details of the given drafts, in one query."""
+    ids = {pid for metadata in metadatas for pid in _order_product_ids(metadata) if pid is not None}
+    if not ids:
+        return {}
+    result = await db.execute(select(Product).filter(Product.id.in_(ids)))
+    return {product.id: product for product in result.scalars().all()}
+
+def _create_order_from_draft(db: AsyncSession, msg: Message, metadata: dict, products: dict):
+    """Stage an Order for an approved draft that asked for one (prices come from the catalog)."""
+    if not metadata.get("requires_order_creation"):
+        return
+    try:
+        total_amount = 0
+        processed_items = []
+        for item in metadata.get("order_details", []):
+            # Verify product and price
+            product = products.get(item.get("product_id"))
+            if product:
+                qty = item.get("quantity", 1)
+                price = product.price # Use actual DB price
+                total_amount += price * qty
+                processed_items.append({
+                    "product_id": product.id,
+                    "name": product.name,
+                    "quantity": qty,
+                    "price": price
+                })
+
+        if processed_items:
+            db.add(Order(
+                client_id=msg.conversation.client_id,
+                total_amount=total_amount,
+                currency="CRC", # Default for now
+                items_json=json.dumps(processed_items),
+                status="pending"
+            ))
+            logger.info(f"AUTO-ORDER: Created Order for Client {msg.conversation.client_id} from Message {msg.id}")
+    except Exception as e:
+        logger.error(f"Failed to auto-create order from message {msg.id}: {e}")
+
 @router.post("/messages/{message_id}/approve")
 async def approve_message(message_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     """
     Approve a pending AI message to be sent.
     """
+    # Claimed with a conditional UPDATE: a repeated or concurrent approval finds nothing to claim
+    if not await enqueue_pending(db, [message_id]):
+        status = (await db.execute(select(Message.status).filter(Message.id == message_id))).scalar()
+        await db.rollback()
+        if status is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        # Already approved (or sent/rejected): re-queueing would send it and create its order twice
+        raise HTTPException(status_code=409, detail=f"Message is not pending approval (status: {status})")
+
     result = await db.execute(
         select(Message)
         .options(joinedload(Message.conversation).joinedload(Conversation.client))
         .filter(Message.id == message_id)
+        .execution_options(populate_existing=True)
     )
-    msg = result.scalars().first()
-    if not msg:
-        raise HTTPException(status_code=404, detail="Message not found")
-        
-    msg.status = "sent"
+    msg = result.scalars().one()
     
     # --- AUTO-ORDER CREATION ---
     metadata = json.loads(msg.metadata_json or "{}")
-    if metadata.get("requires_order_creation"):
-        try:
-            from models import Order, Product
-            order_items = metadata.get("order_details", [])
-            if order_items:
-                total_amount = 0
-                processed_items = []
-                for item in order_items:
-                    # Verify product and price
-                    pid = item.get("product_id")
-                    res = await db.execute(select(Product).filter(Product.id == pid))
-                    product = res.scalars().first()
-                    if product:
-                        qty = item.get("quantity", 1)
-                        price = product.price # Use actual DB price
-                        total_amount += price * qty
-                        processed_items.append({
-                            "product_id": product.id,
-                            "name": product.name,
-                            "quantity": qty,
-                            "price": price
-                        })
-                
-                if processed_items:
-                    new_order = Order(
-                        client_id=msg.conversation.client_id,
-                        total_amount=total_amount,
-                        currency="CRC", # Default for now
-                        items_json=json.dumps(processed_items),
-                        status="pending"
-                    )
-                    db.add(new_order)
-                    logger.info(f"AUTO-ORDER: Created Order for Client {msg.conversation.client_id} from Message {message_id}")
-        except Exception as e:
-            logger.error(f"Failed to auto-create order from message {message_id}: {e}")
+    products = await _load_order_products(db, [metadata])
+    _create_order_from_draft(db, msg, metadata, products)
     # ---------------------------
 
+    # Delivery is handed to the outbound queue; the order and audit entry commit with the claim
+    client_phone = msg.conversation.client.phone_number
+    db.add(AuditLog(
+        user_id=current_user.id,
+        action="APPROVE_MESSAGE",
+        resource=f"Message {message_id}",
+        details=f"Approved AI suggestion for {client_phone}"
+    ))
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, [msg.conversation_id])
     await db.commit()
     MESSAGE_APPROVALS_TOTAL.inc()
-    logger.info(f"Message {message_id} APPROVED and marked as sent")
+    logger.info(f"Message {message_id} APPROVED and queued for delivery")
     
     # Broadcast update
-    client_phone = msg.conversation.client.phone_number
     await manager.broadcast(json.dumps({
         "id": msg.id,
         "sender": "agent",
         "content": msg.content,
         "phone": client_phone,
         "timestamp": msg.timestamp.isoformat(),
-        "status": "sent",
+        "status": "queued",
         "is_ai_generated": True
-    }))
-    
-    # --- OUTBOUND DELIVERY ---
-    result = await db.execute(select(AIConfig).filter(AIConfig.is_active == True))
-    config = result.scalars().first()
-    if config:
-        config_dict = {
-            "whatsapp_driver": config.whatsapp_driver,
-            "whatsapp_api_token": config.whatsapp_api_token,
-            "whatsapp_phone_id": config.whatsapp_phone_id,
-            "email_driver": config.email_driver,
-            "meta_driver": config.meta_driver,
-            "email_smtp_server": config.email_smtp_server,
-            "facebook_api_token": config.facebook_api_token
-        }
-        # Use MessagingHub to detect channel and send
-        adapter = MessagingHubService.get_adapter(msg.conversation.channel, config_dict)
-        external_id = await adapter.send_message(to=client_phone, text=msg.content)
-        
-        if isinstance(external_id, str):
-            msg.external_id = external_id
-            await db.commit()
-    # -------------------------
+    }), event_type="message_sent", conversation_id=msg.conversation_id, tenant_id=msg.tenant_id)
 
-    # --- AUDIT LOG ---
-    audit = AuditLog(
-        user_id=current_user.id,
-        action="APPROVE_MESSAGE",
-        resource=f"Message {message_id}",
-        details=f"Approved AI suggestion for {client_phone}"
-    )
-    db.add(audit)
-    await db.commit()
-    # -----------------
+    await outbound_dispatcher.dispatch(db, [msg.id])
     
     return {"status": "approved"}
 
@@ -273,7 +379,10 @@ async def reject_message(message_id: int, db: AsyncSession = Depends(get_async_d
     if not msg:
         raise HTTPException(status_code=404, detail="Message not found")
         
+    conversation_id = msg.conversation_id
     await db.delete(msg)
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, [conversation_id])
     await db.commit()
     MESSAGE_REJECTIONS_TOTAL.inc()
     logger.info(f"Message {message_id} REJECTED and deleted by {current_user.username}")
@@ -303,6 +412,8 @@ async def edit_message(message_id: int, update: MessageUpdate, db: AsyncSession
         
     old_content = msg.content
     msg.content = update.content
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, [msg.conversation_id])
     await db.commit()
     logger.info(f"Message {message_id} EDITED by {current_user.username}")
     
@@ -326,6 +437,8 @@ async def archive_conversation(conversation_id: int, db: AsyncSession = Depends(
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     conv.is_archived = True
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, [conversation_id])
     await db.commit()
     logger.info(f"Conversation {conversation_id} ARCHIVED")
     return {"status": "archived"}
@@ -337,6 +450,8 @@ async def unarchive_conversation(conversation_id: int, db: AsyncSession = Depend
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     conv.is_archived = False
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, [conversation_id])
     await db.commit()
     return {"status": "unarchived"}
 
@@ -347,6 +462,8 @@ async def pin_conversation(conversation_id: int, db: AsyncSession = Depends(get_
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     conv.is_pinned = True
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, [conversation_id])
     await db.commit()
     logger.info(f"Conversation {conversation_id} PINNED")
     return {"status": "pinned"}
@@ -358,6 +475,8 @@ async def unpin_conversation(conversation_id: int, db: AsyncSession = Depends(ge
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     conv.is_pinned = False
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, [conversation_id])
     await db.commit()
     return {"status": "unpinned"}
 
@@ -372,6 +491,13 @@ async def toggle_auto_ai(conversation_id: int, db: AsyncSession = Depends(get_as
     logger.info(f"Conversation {conversation_id} AI set to {conv.auto_ai_enabled}")
     return {"status": "updated", "auto_ai_enabled": conv.auto_ai_enabled}
 
+@router.post("/{conversation_id}/read")
+async def mark_conversation_read(conversation_id: int, db: AsyncSession = Depends(get_async_db)):
+    """Reset the unread counter of a conversation in the sidebar."""
+    await conversation_summary.mark_read(db, conversation_id)
+    await db.commit()
+    return {"status": "read"}
+
 @router.delete("/{conversation_id}")
 async def delete_conversation(conversation_id: int, db: AsyncSession = Depends(get_async_db)):
     """
@@ -385,6 +511,8 @@ async def delete_conversation(conversation_id: int, db: AsyncSession = Depends(g
     # Cascade delete messages manually if not handled by DB FK
     await db.execute(delete(Message).filter(Message.conversation_id == conversation_id))
     await db.delete(conv)
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, [conversation_id])
     await db.commit()
     
     logger.info(f"Conversation {conversation_id} and its messages DELETED")
@@ -402,6 +530,7 @@ async def bulk_conversation_action(req: BulkActionRequest, db: AsyncSession = De
     
     if req.action == "archive":
         await db.execute(update(Conversation).filter(Conversation.id.in_(req.conversation_ids)).values(is_archived=True))
+        await conversation_summary.refresh_summaries(db, req.conversation_ids)
         await db.commit()
         return {"status": "success", "action": "archive", "count": len(req.conversation_ids)}
         
@@ -410,6 +539,7 @@ async def bulk_conversation_action(req: BulkActionRequest, db: AsyncSession = De
         await db.execute(delete(Message).filter(Message.conversation_id.in_(req.conversation_ids)))
         # Delete conversations
         await db.execute(delete(Conversation).filter(Conversation.id.in_(req.conversation_ids)))
+        await conversation_summary.refresh_summaries(db, req.conversation_ids)
         await db.commit()
         return {"status": "success", "action": "delete", "count": len(req.conversation_ids)}
         
@@ -427,12 +557,75 @@ async def bulk_message_action(req: BulkMessageActionRequest, db: AsyncSession =
     logger.info(f"Processing bulk message action '{req.action}' for {len(req.message_ids)} messages by {current_user.username}")
     
     if req.action == "delete":
+        affected = await conversation_summary.conversation_ids_for_messages(db, req.message_ids)
         await db.execute(delete(Message).filter(Message.id.in_(req.message_ids)))
+        await conversation_summary.refresh_summaries(db, affected)
         await db.commit()
         return {"status": "success", "action": "delete", "count": len(req.message_ids)}
+    elif req.action == "approve":
+        return await _bulk_approve(db, req.message_ids, current_user)
     else:
         raise HTTPException(status_code=400, detail="Invalid action")
 
+async def _bulk_approve(db: AsyncSession, message_ids: List[int], current_user: User):
+    """
+    Approve many pending drafts at once: drafts are claimed with one
+    conditional UPDATE, targets and referenced products are loaded set-based,
+    the claim, orders and audit entries commit in one transaction, and delivery is handed to the outbound queue, whose
+    per-channel worker pools send them concurrently.
+    """
+    # Only the drafts this request claimed get an order, an audit entry and a send
+    claimed = await enqueue_pending(db, message_ids)
+    if not claimed:
+        await db.rollback()
+        return {"status": "no_op", "action": "approve", "count": 0, "skipped": sorted(set(message_ids))}
+
+    result = await db.execute(
+        select(Message)
+        .options(joinedload(Message.conversation).joinedload(Conversation.client))
+        .filter(Message.id.in_(claimed))
+        .order_by(Message.id)
+        .execution_options(populate_existing=True)
+    )
+    messages = result.scalars().all()
+
+    metadatas = [json.loads(msg.metadata_json or "{}") for msg in messages]
+    products = await _load_order_products(db, metadatas)
+    for msg, metadata in zip(messages, metadatas):
+        _create_order_from_draft(db, msg, metadata, products)
+    db.add_all([
+        AuditLog(
+            user_id=current_user.id,
+            action="APPROVE_MESSAGE",
+            resource=f"Message {msg.id}",
+            details=f"Approved AI suggestion for {msg.conversation.client.phone_number} (bulk)"
+        )
+        for msg in messages
+    ])
+    await db.flush()
+    await conversation_summary.refresh_summaries(db, {msg.conversation_id for msg in messages})
+    await db.commit()
+    MESSAGE_APPROVALS_TOTAL.inc(len(messages))
+    logger.info(f"{len(messages)} messages APPROVED in bulk by {current_user.username} and queued for delivery")
+
+    for msg in messages:
+        await manager.broadcast(json.dumps({
+            "id": msg.id,
+            "sender": "agent",
+            "content": msg.content,
+            "phone": msg.conversation.client.phone_number,
+            "timestamp": msg.timestamp.isoformat(),
+            "status": "queued",
+            "is_ai_generated": True
+        }), event_type="message_sent", conversation_id=msg.conversation_id, tenant_id=msg.tenant_id)
+
+    approved = [msg.id for msg in messages]
+    await outbound_dispatcher.dispatch(db, approved)
+
+    # Unknown ids and messages that are no longer pending (already approved, rejected or expired)
+    skipped = sorted(set(message_ids) - set(approved))
+    return {"status": "success", "action": "approve", "count": len(approved), "skipped": skipped}
+
 @router.post("/{conversation_id}/messages")
 async def send_human_message(conversation_id: int, req: MessageCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     """
@@ -451,10 +644,13 @@ async def send_human_message(conversation_id: int, req: MessageCreate, db: Async
         conversation_id=conversation_id,
         sender="agent",
         content=req.content,
-        status="sent",
         is_ai_generated=False
     )
+    enqueue(msg)
     db.add(msg)
+    await db.flush()
+    # Operator replied: the conversation counts as read
+    await conversation_summary.record_message(db, msg, mark_read=True)
     await db.commit()
     await db.refresh(msg)
     HUMAN_MESSAGES_TOTAL.inc()
@@ -467,30 +663,10 @@ async def send_human_message(conversation_id: int, req: MessageCreate, db: Async
         "content": msg.content,
         "phone": client_phone,
         "timestamp": msg.timestamp.isoformat(),
-        "status": "sent",
+        "status": "queued",
         "is_ai_generated": False
-    }))
-    
-    # --- OUTBOUND DELIVERY ---
-    result = await db.execute(select(AIConfig).filter(AIConfig.is_active == True))
-    config = result.scalars().first()
-    if config:
-        config_dict = {
-            "whatsapp_driver": config.whatsapp_driver,
-            "whatsapp_api_token": config.whatsapp_api_token,
-            "whatsapp_phone_id": config.whatsapp_phone_id,
-            "email_driver": config.email_driver,
-            "meta_driver": config.meta_driver,
-            "email_smtp_server": config.email_smtp_server,
-            "facebook_api_token": config.facebook_api_token
-        }
-        # Use MessagingHub to detect channel and send
-        adapter = MessagingHubService.get_adapter(conv.channel, config_dict)
-        external_id = await adapter.send_message(to=client_phone, text=msg.content)
-        
-        if isinstance(external_id, str):
-            msg.external_id = external_id
-            await db.commit()
-    # -------------------------
+    }), event_type="message_sent", conversation_id=conversation_id, tenant_id=msg.tenant_id)
+
+    await outbound_dispatcher.dispatch(db, [msg.id])
     
-    return {"status": "sent", "id": msg.id}
+    return {"status": "queued", "id": msg.id}
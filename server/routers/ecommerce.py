@@ -7,6 +7,7 @@ from pydantic import BaseModel
 from typing import List, Optional
 from routers.auth import get_admin_user, get_current_user
 from services.security_decorators import require_enterprise_plan
+from services.config_cache import config_cache
 import json
 from datetime import datetime
 
@@ -41,12 +42,14 @@ async def create_product(req: ProductRequest, db: AsyncSession = Depends(get_asy
     db.add(product)
     await db.commit()
     await db.refresh(product)
+    config_cache.invalidate("product_create")
     return product
 
 @router.delete("/products/{id}")
 async def delete_product(id: int, db: AsyncSession = Depends(get_async_db), admin: User = Depends(get_admin_user)):
     await db.execute(delete(Product).where(Product.id == id))
     await db.commit()
+    config_cache.invalidate("product_delete")
     return {"status": "deleted"}
 
 @router.get("/orders")
@@ -1,72 +1,271 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from typing import List
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+import itertools
+import os
 import time
 import asyncio
 import json
 from logger import setup_logger
+from services.metrics import (
+    WS_ACTIVE_CONNECTIONS, WS_SEND_QUEUE_DEPTH, WS_MESSAGES_DROPPED_TOTAL, WS_SLOW_CONSUMERS_EVICTED_TOTAL,
+    WS_EVENTS_COALESCED_TOTAL, WS_FRAME_EVENTS
+)
 
 logger = setup_logger("websocket")
 
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+WS_EVICT_AFTER_DROPS = int(os.getenv("WS_EVICT_AFTER_DROPS", "32"))
+WS_MAX_CRITICAL_BACKLOG = int(os.getenv("WS_MAX_CRITICAL_BACKLOG", "2000"))
+WS_BATCH_TICK_SECONDS = float(os.getenv("WS_BATCH_TICK_MS", "50")) / 1000
+
+# Never dropped: a client that cannot take them is evicted and resyncs on reconnect
+CRITICAL_EVENTS = {"new_message", "message_sent", "security_alert", "notification"}
+# Only the latest frame per message id matters
+COALESCED_EVENTS = {"message_update", "message_status_update"}
+
+_connection_ids = itertools.count(1)
+
+
+class ClientConnection:
+    """
+    A registered socket with its own send buffers and writer task, so a slow
+    client only ever delays itself. Buffers are split by priority: critical
+    events are kept in order, status updates are coalesced per message id and
+    everything else is bounded and dropped on overflow.
+    """
+
+    def __init__(self, websocket: WebSocket, queue_size: int = WS_SEND_QUEUE_SIZE):
+        self.id = str(next(_connection_ids))
+        self.websocket = websocket
+        self.queue_size = queue_size
+        self.critical = deque()
+        self.normal = deque()
+        self.coalesced: OrderedDict = OrderedDict()
+        self.ready = asyncio.Event()
+        self.dropped = 0 # Since the last successful flush
+        self.writer: asyncio.Task = None
+        # None = legacy client that receives every event; otherwise {sub_id: filter}
+        self.subscriptions: Optional[Dict[str, dict]] = None
+        self._sub_ids = itertools.count(1)
+
+    @property
+    def depth(self) -> int:
+        return len(self.critical) + len(self.normal) + len(self.coalesced)
+
+    def subscribe(self, sub_id: Optional[str] = None, tenant_id: Optional[str] = None,
+                  conversation_id: Optional[int] = None, types: Optional[List[str]] = None) -> str:
+        if self.subscriptions is None:
+            self.subscriptions = {}
+        sub_id = str(sub_id or next(self._sub_ids))
+        self.subscriptions[sub_id] = {
+            "tenant_id": tenant_id,
+            "conversation_id": conversation_id,
+            "types": set(types) if types else None,
+        }
+        return sub_id
+
+    def unsubscribe(self, sub_id: Optional[str] = None):
+        """Drop one subscription, or all of them (back to receiving everything)."""
+        if sub_id is None:
+            self.subscriptions = None
+        elif self.subscriptions:
+            self.subscriptions.pop(str(sub_id), None)
+
+    def wants(self, event_type: Optional[str], conversation_id: Optional[int], tenant_id: Optional[str]) -> bool:
+        if self.subscriptions is None:
+            return True
+        for sub in self.subscriptions.values():
+            if sub["types"] is not None and event_type not in sub["types"]:
+                continue
+            if sub["conversation_id"] is not None and sub["conversation_id"] != conversation_id:
+                continue
+            if sub["tenant_id"] is not None and sub["tenant_id"] != (tenant_id or "default"):
+                continue
+            return True
+        return False
+
+    def offer(self, message: str, event_type: Optional[str] = None, coalesce_key=None) -> str:
+        """
+        Buffer a frame without waiting. Returns "queued", "coalesced",
+        "dropped" (low priority buffer full) or "overflow" (critical backlog full).
+        """
+        if event_type in CRITICAL_EVENTS:
+            if len(self.critical) >= WS_MAX_CRITICAL_BACKLOG:
+                return "overflow"
+            self.critical.append(message)
+            outcome = "queued"
+        elif coalesce_key is not None and (event_type, coalesce_key) in self.coalesced:
+            self.coalesced[(event_type, coalesce_key)] = message
+            return "coalesced"
+        elif len(self.normal) + len(self.coalesced) >= self.queue_size:
+            self.dropped += 1
+            return "dropped"
+        elif coalesce_key is not None:
+            self.coalesced[(event_type, coalesce_key)] = message
+            outcome = "queued"
+        else:
+            self.normal.append(message)
+            outcome = "queued"
+
+        self.ready.set()
+        WS_SEND_QUEUE_DEPTH.labels(connection=self.id).set(self.depth)
+        return outcome
+
+    def drain(self) -> List[str]:
+        """Take everything buffered: critical events first, status updates last."""
+        frames = list(self.critical) + list(self.normal) + list(self.coalesced.values())
+        self.critical.clear()
+        self.normal.clear()
+        self.coalesced.clear()
+        self.ready.clear()
+        WS_SEND_QUEUE_DEPTH.labels(connection=self.id).set(0)
+        return frames
+
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.msg_count = 0
-        self.last_reset = time.time()
-        self.RATE_LIMIT = 100 # msgs per second
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.bus = None # Cross-process backplane, attached in the app lifespan
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.connections)
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        conn = ClientConnection(websocket)
+        conn.writer = asyncio.create_task(self._writer(conn))
+        self.connections[websocket] = conn
+        WS_ACTIVE_CONNECTIONS.set(len(self.connections))
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, message: str):
-        # Rolling window rate limiter
-        now = time.time()
-        if now - self.last_reset > 1.0:
-            self.msg_count = 0
-            self.last_reset = now
-            
-        self.msg_count += 1
-        
-        if self.msg_count > self.RATE_LIMIT:
-            if self.msg_count % 10 == 0:
-                 logger.warning(f"Rate limit exceeded ({self.msg_count}/{self.RATE_LIMIT}). Dropping message.")
+        conn = self.connections.pop(websocket, None)
+        if conn is None:
             return
+        if conn.writer and conn.writer is not asyncio.current_task():
+            conn.writer.cancel()
+        try:
+            WS_SEND_QUEUE_DEPTH.remove(conn.id)
+        except KeyError:
+            pass
+        WS_ACTIVE_CONNECTIONS.set(len(self.connections))
+
+    async def attach_bus(self, bus):
+        """Share broadcasts with the other workers through `bus`."""
+        self.bus = bus
+        await bus.start(self._on_remote)
+
+    async def detach_bus(self):
+        if self.bus is not None:
+            await self.bus.stop()
+            self.bus = None
+
+    async def _on_remote(self, message: str, route: dict):
+        self._fan_out(message, route.get("event_type"), route.get("conversation_id"),
+                      route.get("tenant_id"), route.get("coalesce_key"))
 
-        for connection in self.active_connections[:]:
+    async def _writer(self, conn: ClientConnection):
+        """
+        Flush one connection once per tick: a single buffered event is sent
+        as-is, several are wrapped in one {"type": "batch", "events": [...]}
+        frame. A send that stalls or fails evicts the client.
+        """
+        while True:
+            await conn.ready.wait()
+            if WS_BATCH_TICK_SECONDS > 0:
+                await asyncio.sleep(WS_BATCH_TICK_SECONDS)
+            frames = conn.drain()
+            if not frames:
+                continue
+            WS_FRAME_EVENTS.observe(len(frames))
+            payload = frames[0] if len(frames) == 1 else '{"type": "batch", "events": [' + ", ".join(frames) + "]}"
             try:
-                await connection.send_text(message)
+                await asyncio.wait_for(conn.websocket.send_text(payload), timeout=WS_SEND_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                self._evict(conn, "send_timeout")
+                return
             except Exception as e:
                 logger.error(f"Error sending broadcast: {e}")
-                self.disconnect(connection)
+                self.disconnect(conn.websocket)
+                return
+            # The client caught up: only drops piling up between flushes count towards eviction
+            conn.dropped = 0
+
+    def _evict(self, conn: ClientConnection, reason: str):
+        logger.warning(f"Evicting slow WebSocket client {conn.id} ({reason}, {conn.dropped} dropped)")
+        WS_SLOW_CONSUMERS_EVICTED_TOTAL.labels(reason=reason).inc()
+        self.disconnect(conn.websocket)
+        asyncio.create_task(self._close(conn.websocket))
+
+    @staticmethod
+    async def _close(websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), timeout=1)
+        except Exception:
+            pass
+
+    def _fan_out(self, message: str, event_type: Optional[str] = None, conversation_id: Optional[int] = None,
+                 tenant_id: Optional[str] = None, coalesce_key=None):
+        for conn in list(self.connections.values()):
+            if not conn.wants(event_type, conversation_id, tenant_id):
+                continue
+            outcome = conn.offer(message, event_type, coalesce_key)
+            if outcome == "coalesced":
+                WS_EVENTS_COALESCED_TOTAL.labels(event_type=event_type).inc()
+            elif outcome == "dropped":
+                WS_MESSAGES_DROPPED_TOTAL.labels(reason="queue_full").inc()
+                if conn.dropped >= WS_EVICT_AFTER_DROPS:
+                    self._evict(conn, "queue_full")
+            elif outcome == "overflow":
+                self._evict(conn, "critical_backlog")
+
+    async def broadcast(self, message: str, *, event_type: Optional[str] = None,
+                        conversation_id: Optional[int] = None, tenant_id: Optional[str] = None):
+        """
+        Buffer a frame for every local connection subscribed to it and publish
+        it once for the other workers. Never waits on a client socket.
+
+        The routing keys are passed alongside the serialized frame so it never
+        has to be parsed again per connection. Status updates are parsed once
+        here to find the message id they are coalesced on.
+        """
+        coalesce_key = None
+        if event_type in COALESCED_EVENTS:
+            try:
+                coalesce_key = json.loads(message).get("id")
+            except (ValueError, AttributeError):
+                pass
+
+        route = {"event_type": event_type, "conversation_id": conversation_id,
+                 "tenant_id": tenant_id, "coalesce_key": coalesce_key}
+        self._fan_out(message, **route)
+        if self.bus is not None:
+            await self.bus.publish(message, route)
 
     async def heartbeat(self):
-        """Send a PING to all clients and remove inactive ones."""
-        if not self.active_connections:
+        """Queue a PING for all clients; dead clients are dropped by their writer."""
+        if not self.connections:
             return
             
         ping = json.dumps({"type": "ping", "timestamp": time.time()})
-        logger.debug(f"Sending heartbeat to {len(self.active_connections)} clients")
-        
-        for connection in self.active_connections[:]:
-            try:
-                await connection.send_text(ping)
-            except Exception:
-                # If send fails, assume client is gone
-                self.disconnect(connection)
+        logger.debug(f"Sending heartbeat to {len(self.connections)} clients")
+        for conn in list(self.connections.values()):
+            conn.offer(ping, "ping")
 
-    async def broadcast_security_alert(self, phone: str, reason: str):
+    async def broadcast_security_alert(self, phone: str, reason: str,
+                                       conversation_id: Optional[int] = None, tenant_id: Optional[str] = None):
         alert = {
             "type": "security_alert",
             "phone": phone,
             "reason": reason,
             "timestamp": time.time()
         }
-        await self.broadcast(json.dumps(alert))
+        await self.broadcast(json.dumps(alert), event_type="security_alert",
+                             conversation_id=conversation_id, tenant_id=tenant_id)
 
-    async def broadcast_notification(self, notification_data: dict):
+    async def broadcast_notification(self, notification_data: dict, tenant_id: Optional[str] = None):
         """
         Broadcasting generic notifications for the UI NotificationCenter.
         Expects: {type, severity, title, description}
@@ -76,7 +275,34 @@ class ConnectionManager:
             "data": notification_data,
             "timestamp": time.time()
         }
-        await self.broadcast(json.dumps(payload))
+        await self.broadcast(json.dumps(payload), event_type="notification", tenant_id=tenant_id)
+
+    async def handle_client_frame(self, websocket: WebSocket, data: str):
+        """
+        Process an inbound control frame:
+            {"action": "subscribe", "id"?, "tenant_id"?, "conversation_id"?, "types"?: [...]}
+            {"action": "unsubscribe", "id"?}   (no id = drop all, receive everything again)
+        """
+        conn = self.connections.get(websocket)
+        if conn is None:
+            return
+        try:
+            frame = json.loads(data)
+        except ValueError:
+            return
+        if not isinstance(frame, dict):
+            return
+
+        action = frame.get("action")
+        if action == "subscribe":
+            types = frame.get("types")
+            if types is not None and not isinstance(types, list):
+                types = [types]
+            sub_id = conn.subscribe(frame.get("id"), frame.get("tenant_id"), frame.get("conversation_id"), types)
+            conn.offer(json.dumps({"type": "subscribed", "id": sub_id}), "subscribed")
+        elif action == "unsubscribe":
+            conn.unsubscribe(frame.get("id"))
+            conn.offer(json.dumps({"type": "unsubscribed", "id": frame.get("id")}), "unsubscribed")
 
 manager = ConnectionManager()
 router = APIRouter(prefix="/ws", tags=["WebSocket"])
@@ -86,12 +312,9 @@ async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # We keep the connection open.
-            # If the client sends data, we can handle it here, 
-            # but mostly we use this channel to PUSH data to client.
+            # Mostly a PUSH channel; inbound frames only manage subscriptions.
             data = await websocket.receive_text()
-            # echo or ignore
-            pass
+            await manager.handle_client_frame(websocket, data)
     except WebSocketDisconnect:
         manager.disconnect(websocket)
     except Exception as e:
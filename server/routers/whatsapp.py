@@ -1,188 +1,251 @@
-from fastapi import APIRouter, Request, Depends, BackgroundTasks
+from fastapi import APIRouter, Request, Depends, Query
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_async_db, AsyncSessionLocal
+from database import get_async_db, AsyncSessionLocal, dialect_insert
 from models import Message, Conversation, Client
 from routers.websocket import manager
 from logger import setup_logger
 from services.ai_agent import AIAgent
+from services import conversation_summary
+from services.message_context import MessageContext
+from services.inbound_queue import inbound_queue
+from services.wamid_dedup import wamid_dedup
+from services.receipt_aggregator import receipt_aggregator
+from services.scheduler import schedule_auto_send, dispatch_scheduled
+from services.outbound_dispatcher import outbound_dispatcher, enqueue
 import datetime
 import json
-import asyncio
 
 router = APIRouter(prefix="/whatsapp", tags=["WhatsApp"])
 logger = setup_logger("whatsapp")
 ai_agent = AIAgent()
 
-async def delayed_auto_send(msg_id: int, delay_minutes: int):
+def _parse_payload(raw_data: dict):
     """
-    Background Task: Wait for delay_minutes, then auto-send if still pending.
+    Flatten a webhook payload into (messages, statuses). Meta batches several
+    entries and changes, each carrying several messages and statuses, into a
+    single POST; the simulator posts one flat message.
     """
-    if delay_minutes <= 0:
-        return
-    
-    logger.info(f"Scheduled auto-send for Message {msg_id} in {delay_minutes} minutes.")
-    await asyncio.sleep(delay_minutes * 60)
-    
-    async with AsyncSessionLocal() as db:
-        try:
-            result = await db.execute(select(Message).filter(Message.id == msg_id))
-            msg = result.scalars().first()
-            if msg and msg.status == "pending":
-                logger.info(f"Auto-send delay reached for Message {msg_id}. Sending now.")
-                msg.status = "sent"
-                await db.commit()
-                
-                # Broadcast update
-                await manager.broadcast(json.dumps({
-                    "type": "message_update",
-                    "id": msg.id,
-                    "status": "sent"
-                }))
-        finally:
-            await db.close()
+    messages, statuses = [], []
 
-@router.post("/webhook")
-async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_async_db)):
-    raw_data = await request.json()
-    
-    # 1. Detect Payload Type (Meta Production vs Simulator)
-    is_meta = raw_data.get("object") == "whatsapp_business_account"
-    
-    if is_meta:
+    if raw_data.get("object") == "whatsapp_business_account" and isinstance(raw_data.get("entry"), list):
         # Process Meta Production Payload
-        try:
-            value = raw_data["entry"][0]["changes"][0]["value"]
-            
-            # 1.1 Handle Status Updates (Read/Delivered)
-            if "statuses" in value:
-                status_data = value["statuses"][0]
-                wamid = status_data["id"]
-                new_status = status_data["status"] # "delivered", "read", "sent", "failed"
-                
-                logger.info(f"META STATUS UPDATE: {wamid} -> {new_status}")
-                
-                result = await db.execute(select(Message).filter(Message.external_id == wamid))
-                msg = result.scalars().first()
-                if msg:
-                    msg.status = new_status
-                    await db.commit()
-                    
-                    # Broadcast status update to dashboard
-                    await manager.broadcast(json.dumps({
-                        "type": "message_status_update",
-                        "id": msg.id,
-                        "status": new_status,
-                        "phone": msg.conversation.client.phone_number
-                    }))
-                return {"status": "ok"}
-
-            # 1.2 Handle Incoming Messages
-            if "messages" in value:
-                msg_data = value["messages"][0]
-                sender_phone = msg_data["from"]
-                message_content = msg_data.get("text", {}).get("body", "")
-                external_id = msg_data["id"]
-                media_url = None
-                media_type = None
-                
-                # Extract profile name if available
-                profile_name = value.get("contacts", [{}])[0].get("profile", {}).get("name")
-                
-                # Check for media (Simplified)
-                if msg_data["type"] != "text":
-                    media_type = msg_data["type"]
-                    # Meta requires a separate API call to get the media URL from the media ID
-                    # For now, we'll store the media_id in media_url as a placeholder
-                    media_url = msg_data.get(media_type, {}).get("id")
-                    message_content = f"[{media_type.upper()} ATTACHMENT]"
-            else:
-                return {"status": "ok", "detail": "not a message or status"}
-        except (KeyError, IndexError):
-            # Fallback for simulator if it sends object="whatsapp_business_account" but flat structure
-            message_content = raw_data.get("message", "")
-            sender_phone = raw_data.get("sender", "unknown")
-            external_id = raw_data.get("id")
-            media_url = raw_data.get("media_url")
-            media_type = raw_data.get("media_type")
-            profile_name = None
-    else:
-        # Process Simulator/Mock Payload (Backward Compatibility)
-        message_content = raw_data.get("message", "")
-        sender_phone = raw_data.get("sender", "unknown")
-        external_id = raw_data.get("id") # Optional wamid for testing
-        media_url = raw_data.get("media_url")
-        media_type = raw_data.get("media_type")
-        profile_name = None
-
-    logger.info(f"Processing message from {sender_phone}: {message_content[:50]}...")
-    
-    # 2. Find or create Client
-    result = await db.execute(select(Client).filter(Client.phone_number == sender_phone))
-    client = result.scalars().first()
-    if not client:
-        name = profile_name if profile_name else f"User {sender_phone}"
-        client = Client(phone_number=sender_phone, name=name)
-        db.add(client)
-        await db.commit()
-        await db.refresh(client)
-    elif profile_name and client.name.startswith("User "):
-         # Update name if we just got a real one from Meta
-         client.name = profile_name
-         await db.commit()
+        for entry in raw_data["entry"]:
+            for change in entry.get("changes", []):
+                value = change.get("value", {})
+                contacts = value.get("contacts", [])
+                profiles = {c.get("wa_id"): c.get("profile", {}).get("name") for c in contacts}
+                single_profile = contacts[0].get("profile", {}).get("name") if len(contacts) == 1 else None
+
+                for msg_data in value.get("messages", []):
+                    message_content = msg_data.get("text", {}).get("body", "")
+                    media_url = None
+                    media_type = None
+                    # Check for media (Simplified)
+                    if msg_data.get("type", "text") != "text":
+                        media_type = msg_data["type"]
+                        # Meta requires a separate API call to get the media URL from the media ID
+                        # For now, we'll store the media_id in media_url as a placeholder
+                        media_url = msg_data.get(media_type, {}).get("id")
+                        message_content = f"[{media_type.upper()} ATTACHMENT]"
+                    messages.append({
+                        "phone": msg_data["from"],
+                        "content": message_content,
+                        "external_id": msg_data.get("id"),
+                        "media_url": media_url,
+                        "media_type": media_type,
+                        "profile_name": profiles.get(msg_data["from"]) or single_profile
+                    })
+
+                for status_data in value.get("statuses", []):
+                    # "delivered", "read", "sent", "failed"
+                    statuses.append((status_data["id"], status_data["status"]))
+        return messages, statuses
+
+    # Process Simulator/Mock Payload (Backward Compatibility), also sent flat
+    # with object="whatsapp_business_account" by the simulator
+    messages.append({
+        "phone": raw_data.get("sender", "unknown"),
+        "content": raw_data.get("message", ""),
+        "external_id": raw_data.get("id"), # Optional wamid for testing
+        "media_url": raw_data.get("media_url"),
+        "media_type": raw_data.get("media_type"),
+        "profile_name": None
+    })
+    return messages, statuses
 
-    # 3. Find or create Active Conversation
+
+async def _ingest_messages(db: AsyncSession, batch):
+    """
+    Store a batch of inbound messages: clients and active conversations of all
+    senders are resolved with set-based queries and everything is committed
+    once. Returns (message, conversation, phone) for every message stored.
+    """
+    # 2. Find or create Clients
+    phones = list(dict.fromkeys(m["phone"] for m in batch)) # Arrival order
+    profile_names = {m["phone"]: m["profile_name"] for m in batch if m["profile_name"]}
+    result = await db.execute(select(Client).filter(Client.phone_number.in_(phones)))
+    clients = {c.phone_number: c for c in result.scalars().all()}
+    missing = [p for p in phones if p not in clients]
+    insert = dialect_insert(db)
+    if missing and insert is not None:
+        # Create as an upsert: concurrent first messages of a new sender don't collide
+        await db.execute(
+            insert(Client)
+            .values([{"phone_number": phone, "name": profile_names.get(phone) or f"User {phone}"} for phone in missing])
+            .on_conflict_do_nothing(index_elements=[Client.phone_number])
+        )
+        result = await db.execute(select(Client).filter(Client.phone_number.in_(missing)))
+        clients.update({c.phone_number: c for c in result.scalars().all()})
+    for phone in [p for p in phones if p not in clients]:
+        clients[phone] = Client(phone_number=phone, name=profile_names.get(phone) or f"User {phone}")
+        db.add(clients[phone])
+    for phone, name in profile_names.items():
+        # Update name if we just got a real one from Meta
+        if (clients[phone].name or "").startswith("User "):
+            clients[phone].name = name
+    await db.flush()
+
+    # 3. Find or create Active Conversations
     result = await db.execute(select(Conversation).filter(
-        Conversation.client_id == client.id, 
+        Conversation.client_id.in_([c.id for c in clients.values()]),
         Conversation.is_active == True
     ))
-    conversation = result.scalars().first()
-    
-    if not conversation:
-        conversation = Conversation(client_id=client.id)
-        db.add(conversation)
-        await db.commit()
-        await db.refresh(conversation)
+    conversations = {}
+    for conversation in result.scalars().all():
+        conversations.setdefault(conversation.client_id, conversation)
+    new_conversations = []
+    for client in clients.values():
+        if client.id not in conversations:
+            conversations[client.id] = Conversation(client_id=client.id)
+            new_conversations.append(conversations[client.id])
+    if new_conversations:
+        db.add_all(new_conversations)
+        await db.flush()
+        await conversation_summary.refresh_summaries(db, [c.id for c in new_conversations])
 
-    # 4. Save User Message
-    user_msg = Message(
-        conversation_id=conversation.id,
-        sender="user",
-        content=message_content,
-        media_url=media_url,
-        media_type=media_type,
-        external_id=external_id
-    )
-    db.add(user_msg)
+    # 4. Save User Messages (ON CONFLICT DO NOTHING on the wamid)
+    stored = []
+    for m in batch:
+        conversation = conversations[clients[m["phone"]].id]
+        user_msg = await wamid_dedup.insert_message(
+            db,
+            conversation_id=conversation.id,
+            sender="user",
+            content=m["content"],
+            media_url=m["media_url"],
+            media_type=m["media_type"],
+            external_id=m["external_id"]
+        )
+        if user_msg is None:
+            continue
+        await conversation_summary.record_message(db, user_msg)
+        stored.append((user_msg, conversation, m["phone"]))
     await db.commit()
-    await db.refresh(user_msg)
 
-    # Broadcast User Message
-    await manager.broadcast(json.dumps({
-        "type": "new_message",
-        "id": user_msg.id,
-        "sender": "user",
-        "content": message_content,
-        "phone": sender_phone,
-        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
-        "media_url": user_msg.media_url,
-        "media_type": user_msg.media_type
-    }))
+    for user_msg, _, _ in stored:
+        wamid_dedup.remember(user_msg.external_id)
+    return stored
+
+
+@router.post("/webhook")
+async def whatsapp_webhook(
+    request: Request,
+    wait: bool = Query(False, description="Process the AI reply inline and return it (sandbox)"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Persist the inbound messages (and status updates) of a delivery and
+    acknowledge. AI generation is handed to the inbound queue workers when they
+    are running (see services/inbound_queue.py); a message that does not fit
+    in the backlog is left to its recovery sweep. When the workers are not
+    running, or with ?wait=true, it runs inline and the reply is returned.
+    """
+    raw_data = await request.json()
+
+    # 1. Detect Payload Type (Meta Production vs Simulator) and flatten the batch
+    inbound, statuses = _parse_payload(raw_data)
+    if not inbound and not statuses:
+        return {"status": "ok", "detail": "not a message or status"}
+
+    # 1.1 Handle Status Updates (Read/Delivered): batched across deliveries by the aggregator
+    if statuses:
+        logger.info(f"META STATUS UPDATES: {len(statuses)} receipts")
+        if receipt_aggregator.running:
+            receipt_aggregator.add(statuses)
+        else:
+            await receipt_aggregator.apply(db, statuses)
+
+    # 1.2 Redeliveries of messages we already stored: acknowledge without reprocessing
+    duplicates = await wamid_dedup.duplicates(db, [m["external_id"] for m in inbound])
+    batch, seen = [], set()
+    for m in inbound:
+        wamid = m["external_id"]
+        if wamid and (wamid in duplicates or wamid in seen):
+            logger.info(f"Duplicate delivery of {wamid} from {m['phone']} ignored")
+            continue
+        if wamid:
+            seen.add(wamid)
+        logger.info(f"Processing message from {m['phone']}: {m['content'][:50]}...")
+        batch.append(m)
+
+    stored = await _ingest_messages(db, batch) if batch else []
+    if inbound and not stored:
+        return {"status": "ok", "detail": "duplicate"}
+
+    results = []
+    for user_msg, conversation, sender_phone in stored:
+        # Broadcast User Message
+        await manager.broadcast(json.dumps({
+            "type": "new_message",
+            "id": user_msg.id,
+            "conversation_id": conversation.id,
+            "sender": "user",
+            "content": user_msg.content,
+            "phone": sender_phone,
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "media_url": user_msg.media_url,
+            "media_type": user_msg.media_type
+        }), event_type="new_message", conversation_id=conversation.id, tenant_id=conversation.tenant_id)
+
+    for user_msg, conversation, sender_phone in stored:
+        # 4. Generate AI Response (off the request path when the workers are running)
+        if wait or not inbound_queue.running:
+            results.append(await process_inbound_message(db, conversation.id, user_msg.id))
+        elif await inbound_queue.submit(conversation.id, user_msg.id):
+            results.append({"status": "queued", "message_id": user_msg.id})
+        else:
+            # Backlog full: acknowledge now, the recovery sweep answers it in conversation order
+            results.append({"status": "deferred", "message_id": user_msg.id})
+
+    if not results:
+        return {"status": "ok"}
+    if len(results) == 1:
+        return results[0]
+    return {"status": "ok", "results": results}
+
+
+async def process_inbound_message(db: AsyncSession, conversation_id: int, user_msg_id: int):
+    """
+    Guardrail + AI reply for a persisted inbound message. Runs inline from the
+    webhook or from an inbound queue worker.
+    """
+    conversation = await db.get(Conversation, conversation_id)
+    user_msg = await db.get(Message, user_msg_id)
+    client = await db.get(Client, conversation.client_id)
+    sender_phone = client.phone_number
+    message_content = user_msg.content
 
-    # 4. Generate AI Response
     logger.debug(f"Triggering AI response generation for {sender_phone}")
     
     # 4.1 Sentinel Shield: Absolute Blocking
-    from guardrail.engine import GuardrailEngine
-    from models import AIConfig
-    
-    result = await db.execute(select(AIConfig).filter(AIConfig.is_active == True))
-    config = result.scalars().first()
-    forbidden_topics = json.loads(config.forbidden_topics_json) if config else []
+    # Config snapshot and guardrail prescan are resolved once and reused by the AI agent
+    context = await MessageContext.build(db, ai_agent, sender_phone, message_content,
+                                         client=client, conversation=conversation)
+    config = context.config
+    guardrail_result = context.guardrail
     
-    guardrail_result = GuardrailEngine.prescan_message(message_content, forbidden_topics)
-    
-    if guardrail_result.classification in ["security_violation", "legal_violation", "medical_violation"]:
+    if context.is_blocked:
         logger.warning(f"SENTINEL: Blocking {guardrail_result.classification} from {sender_phone}")
         
         # 1. Save user message with violation flag (Already saved as user_msg above, but let's update it)
@@ -194,7 +257,8 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks,
         await db.commit()
         
         # 2. Notify Dashboard via WS (Red Alert)
-        await manager.broadcast_security_alert(sender_phone, f"Violation: {guardrail_result.classification}")
+        await manager.broadcast_security_alert(sender_phone, f"Violation: {guardrail_result.classification}",
+                                               conversation_id=conversation.id, tenant_id=conversation.tenant_id)
         
         # 3. TERMINATE: No AI response
         return {"status": "blocked", "reason": "sentinel_violation"}
@@ -204,7 +268,9 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks,
         logger.info(f"AI Response DISABLED for conversation {conversation.id} (Manual Force Mode)")
         return {"status": "skipped", "reason": "manual_force_mode"}
 
-    ai_result = await ai_agent.generate_response(sender_phone, message_content, db=db)
+    # The SecurityAudit row is committed together with the AI message below
+    ai_result = await ai_agent.generate_response(sender_phone, message_content, db=db, context=context,
+                                                 commit=False)
     
     ai_response_text = ai_result["content"]
     confidence = ai_result["confidence"]
@@ -214,8 +280,8 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks,
     # 5. Decision Engine: Check Thresholds for Auto-Response
     # Defaults
     auto_threshold = 90
-    if config:
-        auto_threshold = config.auto_respond_threshold
+    if config.get("is_configured"):
+        auto_threshold = config["auto_respond_threshold"]
 
     # Determine status
     msg_status = "pending"
@@ -225,12 +291,12 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks,
         msg_status = "pending" # Always escalate forbidden topics
         logger.info(f"Escalating out-of-scope query from {sender_phone} to human operator.")
     elif confidence >= auto_threshold:
-        msg_status = "sent"
+        msg_status = "queued"
         logger.info(f"Auto-responding to {sender_phone} (Confidence: {confidence}% >= Threshold: {auto_threshold}%)")
-    elif config and confidence >= config.review_threshold:
+    elif config.get("is_configured") and confidence >= config["review_threshold"]:
         msg_status = "pending"
         should_delay_send = True
-        logger.info(f"Queuing for DELAYED auto-send (Confidence: {confidence}% >= Review Threshold: {config.review_threshold}%)")
+        logger.info(f"Queuing for DELAYED auto-send (Confidence: {confidence}% >= Review Threshold: {config['review_threshold']}%)")
     else:
         logger.info(f"Queuing response to {sender_phone} for human review (Confidence: {confidence}% < Threshold: {auto_threshold}%)")
 
@@ -244,22 +310,25 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks,
         confidence=confidence,
         metadata_json=json.dumps(metadata)
     )
+    # 7. Delayed auto-send: the due time is persisted with the draft (auto_send_delay is in seconds)
+    scheduled = should_delay_send and (config.get("auto_send_delay") or 0) > 0
+    if scheduled:
+        schedule_auto_send(ai_msg, config["auto_send_delay"])
+        logger.info(f"Scheduled auto-send for {sender_phone} in {config['auto_send_delay']} seconds.")
+    if msg_status == "queued":
+        enqueue(ai_msg)
     db.add(ai_msg)
+    await db.flush()
+    await conversation_summary.record_message(db, ai_msg)
     await db.commit()
-    await db.refresh(ai_msg) # Get ID
-
-    # 7. Schedule Background Delay Task if needed
-    if should_delay_send and config and config.auto_send_delay > 0:
-        background_tasks.add_task(
-            delayed_auto_send, 
-            ai_msg.id, 
-            config.auto_send_delay
-        )
+    if scheduled:
+        dispatch_scheduled(ai_msg)
 
     # Broadcast AI Message
     await manager.broadcast(json.dumps({
         "type": "new_message",
         "id": ai_msg.id,
+        "conversation_id": conversation.id,
         "sender": "agent",
         "content": ai_response_text,
         "phone": sender_phone,
@@ -268,6 +337,15 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks,
         "is_ai_generated": True,
         "confidence": confidence,
         "metadata": metadata
-    }))
+    }), event_type="new_message", conversation_id=conversation.id, tenant_id=conversation.tenant_id)
+
+    if msg_status == "queued":
+        await outbound_dispatcher.dispatch(db, [ai_msg.id])
 
     return {"reply": ai_response_text}
+
+
+async def run_inbound_job(conversation_id: int, user_msg_id: int):
+    """Inbound queue handler: process a queued message on its own session."""
+    async with AsyncSessionLocal() as db:
+        await process_inbound_message(db, conversation_id, user_msg_id)
@@ -12,6 +12,11 @@ from models import AIConfig, AIDataset, Message, SecurityAudit
 from routers.websocket import manager
 from guardrail.engine import GuardrailEngine
 from services.encryption import decrypt_string
+from services.config_cache import config_cache
+from services.prompt_builder import PromptBuilder, render_intent_mapping
+from services.knowledge_index import knowledge_index
+from services.draft_stream import DraftStreamer
+from services.response_cache import response_cache, estimate_tokens
 from services.metrics import (
     AI_REQUESTS_TOTAL, SECURITY_VIOLATIONS_TOTAL, 
     REQUEST_LATENCY_MS, TOKENS_USED_TOTAL, MANUAL_REVIEWS_TOTAL
@@ -26,11 +31,19 @@ logger = setup_logger("ai_agent")
 class AIAgent:
     def __init__(self):
         self.context = {}
+        self.prompt_builder = PromptBuilder()
 
-    async def _get_active_config(self, db: AsyncSession):
+    async def get_active_config(self, db: AsyncSession):
+        """
+        Return the active config snapshot, served from the versioned in-process
+        cache. The snapshot is shared and must not be mutated by callers.
+        """
         if not db:
             return self._default_config()
-            
+
+        return await config_cache.get(db, self._load_active_config)
+
+    async def _load_active_config(self, db: AsyncSession):
         result = await db.execute(select(AIConfig).filter(AIConfig.is_active == True))
         config = result.scalars().first()
         
@@ -44,6 +57,7 @@ class AIAgent:
             "rules": json.loads(config.rules_json),
             "auto_respond_threshold": config.auto_respond_threshold,
             "review_threshold": config.review_threshold,
+            "auto_send_delay": config.auto_send_delay,
             "forbidden_topics": json.loads(config.forbidden_topics_json),
             "language_code": config.language_code,
             "translate_messages": config.translate_messages,
@@ -52,12 +66,18 @@ class AIAgent:
             "intent_rules": json.loads(config.intent_rules_json),
             "fallback_message": config.fallback_message,
             "preferred_model": config.preferred_model,
+            "stream_responses": bool(config.stream_responses),
             "openai_api_key": decrypt_string(config.openai_api_key),
             "openai_api_base": config.openai_api_base,
             "whatsapp_api_token": decrypt_string(config.whatsapp_api_token),
             "whatsapp_phone_id": config.whatsapp_phone_id,
             "whatsapp_driver": config.whatsapp_driver or "mock",
+            "email_driver": config.email_driver,
+            "email_smtp_server": config.email_smtp_server,
+            "meta_driver": config.meta_driver,
+            "facebook_api_token": decrypt_string(config.facebook_api_token),
             "suggestions_json": json.loads(config.suggestions_json or "[]"),
+            "timezone": config.timezone or "UTC",
             "products": await self._get_active_products(db),
             "is_configured": True
         }
@@ -85,6 +105,7 @@ class AIAgent:
             "rules": [],
             "auto_respond_threshold": 100,
             "review_threshold": 0,
+            "auto_send_delay": 0,
             "forbidden_topics": [],
             "intent_rules": [],
             "fallback_message": "I am not configured yet. Please go to the Admin panel to set up my identity and rules.",
@@ -96,35 +117,56 @@ class AIAgent:
 
 
     def _build_intent_mapping_context(self, intent_rules):
+        """Render the UI-configured intent mapping section (see prompt_builder)."""
+        return render_intent_mapping(intent_rules)
+
+    async def _complete(self, model, messages, api_key, api_base, streamer=None):
         """
-        Dynamically build intent mapping instructions from UI-configured intent_rules.
-        
-        Example intent_rules format:
-        [
-            {"intent": "Consulta de Precio", "keywords": ["precio", "costo", "cuánto cuesta"]},
-            {"intent": "Pedido", "keywords": ["pedir", "ordenar", "comprar"]},
-            {"intent": "Horario", "keywords": ["horario", "abierto", "cerrado"]}
-        ]
+        Run the chat completion and return (content, total_tokens). With a
+        streamer the completion is consumed as a token stream and each chunk
+        is pushed to it; streamed responses carry no usage, so tokens are 0.
         """
-        if not intent_rules:
-            return ""
-        
-        intent_context = "\n### DYNAMIC INTENT MAPPING (UI-Configured):\n"
-        for rule in intent_rules:
-            intent_name = rule.get("intent", "General")
-            keywords = rule.get("keywords", [])
-            if keywords:
-                keywords_str = ", ".join(keywords)
-                intent_context += f"- Intent '{intent_name}': Triggered by keywords [{keywords_str}]\n"
-        
-        return intent_context
+        response = await openai.ChatCompletion.acreate(
+            model=model, 
+            messages=messages,
+            temperature=0.3, 
+            api_key=api_key,
+            api_base=api_base,
+            request_timeout=60, # Increased for local LLM inference
+            stream=streamer is not None
+        )
+        if streamer is None:
+            tokens_used = response.usage.get('total_tokens', 0) if hasattr(response, 'usage') else 0
+            return response.choices[0].message["content"], tokens_used
 
-    async def generate_response(self, client_id, user_message, db: AsyncSession = None):
+        parts = []
+        try:
+            async for chunk in response:
+                choices = chunk.get("choices") or []
+                delta = choices[0].get("delta", {}).get("content") if choices else None
+                if delta:
+                    parts.append(delta)
+                    await streamer.feed(delta)
+        finally:
+            await streamer.finish()
+        return "".join(parts), 0
+
+    async def generate_response(self, client_id, user_message, db: AsyncSession = None, context=None,
+                                commit: bool = True):
+        """
+        Generate the AI reply for `user_message`. When the caller already
+        resolved a MessageContext (the webhook does), its config snapshot,
+        client and guardrail result are reused instead of being looked up again.
+        With commit=False the SecurityAudit row is only added to `db` and is
+        committed by the caller together with the AI message. When the config
+        enables stream_responses and the context has a conversation, partial
+        drafts are pushed to its dashboards while the model generates.
+        """
         start_time = time.time()
         logger.debug(f"Generating response for Client {client_id}: {user_message[:50]}...")
         
         # 1. Fetch Config
-        config = await self._get_active_config(db)
+        config = context.config if context is not None else await self.get_active_config(db)
         
         if not config.get("is_configured", True):
             return {
@@ -133,46 +175,34 @@ class AIAgent:
                 "metadata": {"intent": "unconfigured", "reasoning": "No active AIConfig found in database."}
             }
         
+        fallback_msg = config.get("fallback_message") or "I am currently having trouble processing your request."
+
         # 2. Pre-Scan: Classify Trigger Type
-        # 2. Pre-Scan: Classify Trigger Type
-        forbidden_topics = config.get("forbidden_topics", [])
-        guardrail_result = GuardrailEngine.prescan_message(user_message, forbidden_topics)
+        if context is not None:
+            guardrail_result = context.guardrail
+        else:
+            guardrail_result = GuardrailEngine.prescan_message(user_message, config.get("forbidden_topics", []))
         trigger_type = guardrail_result.classification if guardrail_result.classification != "in_scope" else None
         triggered_keywords = guardrail_result.triggered_keywords
         
-        # 3. Build Knowledge Base & Product Context
-        datasets_context = ""
-        knowledge_texts = []
+        # 3. Knowledge Base: retrieve only the top-k chunks relevant to this message
+        knowledge_sources = []
+        knowledge_key = ()
         if db:
-            from models import AIDataset
-            result = await db.execute(select(AIDataset).filter(AIDataset.is_active == True))
-            datasets = result.scalars().all()
-            for ds in datasets:
-                knowledge_texts.append(f"### Source: {ds.name}\n{ds.content}")
-        
-        if knowledge_texts:
-            datasets_context = (
-                "\n### KNOWLEDGE BASE (MASTER SOURCE OF TRUTH):\n" +
-                "\n---\n".join(knowledge_texts) +
-                "\n### END KNOWLEDGE BASE\n"
-            )
-
-        products = config.get("products", [])
-        if products:
-            products_context = "\n### PRODUCT CATALOG:\n"
-            for p in products:
-                products_context += f"- ID: {p['id']} | Name: {p['name']} | Price: {p['price']} {p['currency']} | Stock: {p['stock']} | Desc: {p['description']}\n"
-            products_context += "### END PRODUCT CATALOG\n"
-        else:
-            products_context = ""
+            hits = await knowledge_index.search(db, user_message)
+            knowledge_sources = [(hit["source"], hit["content"]) for hit in hits]
+            knowledge_key = tuple(hit["id"] for hit in hits)
 
         # 3.1. Fetch Client Order History
         order_history_context = ""
         if db:
             from models import Order, Client
-            # Find client internal ID from phone
-            client_res = await db.execute(select(Client).filter(Client.phone == str(client_id)))
-            client_obj = client_res.scalars().first()
+            if context is not None and context.client is not None:
+                client_obj = context.client
+            else:
+                # Find client internal ID from phone
+                client_res = await db.execute(select(Client).filter(Client.phone_number == str(client_id)))
+                client_obj = client_res.scalars().first()
             if client_obj:
                 orders_res = await db.execute(
                     select(Order).filter(Order.client_id == client_obj.id).order_by(Order.created_at.desc()).limit(5)
@@ -184,79 +214,16 @@ class AIAgent:
                         order_history_context += f"- Order #{o.id} | Date: {o.created_at.strftime('%Y-%m-%d')} | Total: {o.total_amount/100} {o.currency} | Status: {o.status}\n"
                     order_history_context += "### END ORDER HISTORY\n"
 
-        # 4. Build Intent Mapping Context (Dynamic from UI)
-        intent_mapping_context = self._build_intent_mapping_context(config.get("intent_rules", []))
-        
-        # 5. Build Forbidden Topics Context (For LLM awareness)
-        forbidden_context = ""
-        if forbidden_topics:
-            forbidden_list_str = ", ".join(forbidden_topics)
-            forbidden_context = (
-                f"\n### BUSINESS SCOPE BOUNDARIES:\n"
-                f"We DO NOT offer the following products/services: [{forbidden_list_str}]\n"
-                f"If a customer asks about these topics, politely inform them we don't offer that service "
-                f"and redirect to our available products from the Catalog.\n"
-                f"IMPORTANT: These are BUSINESS boundaries, NOT security violations. Be friendly.\n"
-            )
-        
-        # 6. Language & Tone & Timezone
-        lang_code = config.get("language_code", "es-CR")
-        tone = config.get("tone", "friendly, concise, and professional")
-        timezone = config.get("timezone", "UTC")
+        # 4-7. Assemble System Prompt from pre-rendered sections
         local_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        
-        lang_instruction = f"Respond in {lang_code}. Tone: {tone}. Current Time: {local_time} ({timezone})."
-        
-        # 7. Construct System Prompt
-        rules_list = config.get("rules", [])
-        rules_str = "\n".join([f"- {r}" for r in rules_list]) if rules_list else "No specific rules configured."
-        
-        identity_prompt = config.get("identity_prompt") or f"You are the virtual assistant for {config['business_name']}."
-        
-        system_prompt = (
-            f"{identity_prompt}\n"
-            f"Business Description: {config['business_description']}\n\n"
-            f"### OPERATIONAL RULES:\n{rules_str}\n\n"
-            f"{datasets_context}\n"
-            f"{products_context}\n"
-            f"{order_history_context}\n"
-            f"{forbidden_context}\n"
-            f"{intent_mapping_context}\n"
-            f"### CATEGORIZATION FRAMEWORK:\n"
-            f"You must classify every user message into ONE of these categories:\n\n"
-            f"1. **Commercial/Logistics** (AUTHORIZED):\n"
-            f"   - Questions about products, prices, orders, delivery, payment, hours, location.\n"
-            f"   - Use Knowledge Base AND Product Catalog to answer. If info not in KB/Catalog, set `is_out_of_knowledge: true`.\n"
-            f"   - **E-COMMERCE RULE**: If a user expresses intent to BUY or ORDER, verify if the products exist in the CATALOG.\n"
-            f"   - If they state specific products and quantities: set `requires_order_creation: true` and populate `order_details` list.\n"
-            f"   - **CX RULE**: If sentiment is NEGATIVE (Complaint, Delay, Issue) -> **DO NOT** ask to buy/order. Focus 100% on resolution.\n"
-            f"   - **CX RULE**: If Intent is 'Missing Order' -> Ask for Order Number immediately.\n\n"
-            f"2. **Out of Scope - Business Boundary** (FRIENDLY REDIRECT):\n"
-            f"   - Customer asks about products/services we don't offer.\n"
-            f"   - Set `is_out_of_knowledge: true` and `classification: 'out_of_scope'`.\n"
-            f"   - Response: Friendly, apologetic, redirect to what we DO offer.\n\n"
-            f"3. **Security Violation** (BLOCK IMMEDIATELY):\n"
-            f"   - Politics, protests, religion, hate speech, insults, abuse, medical/legal advice.\n"
-            f"   - Set `classification: 'security_violation'`.\n"
-            f"   - Response: Cold, bureaucratic.\n\n"
-            f"### CLOSING PROTOCOL:\n"
-            f"- **Neutral**: 'How else can I help?' (Use for support/complaints)\n"
-            f"- **Sales**: 'Would you like to order?' (ONLY for positive buying signals)\n"
-            f"- **NEVER** use aggressive closing on negative sentiment.\n\n"
-            f"### RESPONSE FORMAT (JSON):\n"
-            f"{{\n"
-            f'  "reply": "Your response in {lang_code}",\n'
-            f'  "domain": "Commercial/Logistics | Security_Violation",\n'
-            f'  "classification": "in_scope | out_of_scope | security_violation | legal_violation | medical_violation",\n'
-            f'  "primary_intent": "Detected intent",\n'
-            f'  "is_out_of_knowledge": true/false,\n'
-            f'  "requires_order_creation": true/false,\n'
-            f'  "order_details": [ {{ "product_id": int, "quantity": int, "price": float }} ],\n'
-            f'  "tone_applied": "Friendly | Corporate_Neutral",\n'
-            f'  "confidence_self_assessment": 0-100\n'
-            f"}}\n\n"
-            f"{lang_instruction}"
+        system_prompt = self.prompt_builder.build(
+            config,
+            knowledge_sources=knowledge_sources,
+            knowledge_key=knowledge_key,
+            order_history_context=order_history_context,
+            local_time=local_time
         )
+        logger.debug(f"System prompt assembled ({len(system_prompt)} chars): {self.prompt_builder.last_sizes}")
 
         # 8. Build Message History
         history = self.context.get(client_id, [])
@@ -300,36 +267,48 @@ class AIAgent:
                     api_base = api_base.replace("localhost", "host.docker.internal").replace("127.0.0.1", "host.docker.internal")
                     logger.info(f"Docker Network Fix: Translated API base to {api_base}")
 
-            response = await openai.ChatCompletion.acreate(
-                model=preferred_model, 
-                messages=messages,
-                temperature=0.3, 
-                api_key=api_key,
-                api_base=api_base,
-                request_timeout=60 # Increased for local LLM inference
-            )
-            
-            content = response.choices[0].message["content"]
+            # 9.1. Response cache: a repeated question reuses the envelope of an earlier
+            # LLM call. Prompts with client-specific context (previous turns, order
+            # history) always go to the model.
+            cache_scope = (config.get("config_version"), knowledge_index.version)
+            cacheable = not history and not order_history_context
+            cached = response_cache.lookup(user_message, cache_scope) if cacheable else response_cache.skip()
+
+            if cached is not None:
+                raw_result = cached.result
+                tokens_used = 0
+            else:
+                # Opt-in: show the draft to reviewers while it is being generated
+                streamer = None
+                if config.get("stream_responses") and context is not None and context.conversation is not None:
+                    streamer = DraftStreamer(context.conversation.id, context.conversation.tenant_id or "default")
+                content, tokens_used = await self._complete(preferred_model, messages, api_key, api_base, streamer)
             
-            # Clean markdown code blocks
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
+                # Clean markdown code blocks
+                if "```json" in content:
+                    content = content.split("```json")[1].split("```")[0].strip()
+                elif "```" in content:
+                    content = content.split("```")[1].split("```")[0].strip()
             
-            try:
-                raw_result = json.loads(content)
-            except:
-                # Fallback if JSON parsing fails
-                raw_result = {
-                    "reply": content,
-                    "is_out_of_knowledge": False,
-                    "primary_intent": "General",
-                    "domain": "Commercial/Logistics",
-                    "classification": "in_scope",
-                    "tone_applied": "Friendly",
-                    "confidence_self_assessment": 50
-                }
+                parsed = True
+                try:
+                    raw_result = json.loads(content)
+                except:
+                    parsed = False
+                    # Fallback if JSON parsing fails
+                    raw_result = {
+                        "reply": content,
+                        "is_out_of_knowledge": False,
+                        "primary_intent": "General",
+                        "domain": "Commercial/Logistics",
+                        "classification": "in_scope",
+                        "tone_applied": "Friendly",
+                        "confidence_self_assessment": 50
+                    }
+
+                if cacheable and parsed and not raw_result.get("requires_order_creation"):
+                    response_cache.store(user_message, cache_scope, raw_result,
+                                         tokens_used or estimate_tokens(messages, content))
 
             reply_text = raw_result.get("reply", fallback_msg)
             is_out_of_kb = raw_result.get("is_out_of_knowledge", False)
@@ -398,11 +377,13 @@ class AIAgent:
             else:
                 applied_rules.append(f"Rule: In-scope commercial query. Intent: {intent}")
             
+            if cached is not None:
+                applied_rules.append(f"Cache: reused the response to an earlier question (similarity {cached.similarity:.2f}, age {int(cached.age_seconds)}s)")
+
             reasoning = " | ".join(applied_rules) if applied_rules else f"Intent '{intent}' validated."
 
             # 11. SaaS Analytics & Audit
             latency_ms = int((time.time() - start_time) * 1000)
-            tokens_used = response.usage.get('total_tokens', 0) if hasattr(response, 'usage') else 0
             
             if latency_ms > 8000:
                 audit_status = "Latency_Violation"
@@ -438,10 +419,12 @@ class AIAgent:
                     tokens_used=tokens_used,
                     status=audit_status,
                     reasoning=reasoning,
-                    triggered_keywords=json.dumps(triggered_keywords)
+                    triggered_keywords=json.dumps(triggered_keywords),
+                    cache_hit=cached is not None
                 )
                 db.add(audit)
-                await db.commit()
+                if commit:
+                    await db.commit()
 
             # 12. Security Alert (Only for actual violations)
             if classification in ["security_violation", "legal_violation", "medical_violation"]:
@@ -453,7 +436,7 @@ class AIAgent:
                         "phone": client_id,
                         "timestamp": time.time()
                     }
-                    await manager.broadcast(json.dumps(alert_data))
+                    await manager.broadcast(json.dumps(alert_data), event_type="security_alert")
                     logger.warning(f"SECURITY ALERT: {classification} for {client_id}")
                 except Exception as ex:
                     logger.error(f"Failed to broadcast security alert: {ex}")
@@ -493,6 +476,8 @@ class AIAgent:
                     "model": preferred_model,
                     "latency_ms": latency_ms,
                     "tokens_used": tokens_used,
+                    "cache_hit": cached is not None,
+                    "cache_similarity": round(cached.similarity, 2) if cached is not None else None,
                     "status": audit_status,
                     "status_suggestion": "auto" if confidence_score >= config.get("auto_respond_threshold", 85) else "pending",
                     "triggered_keywords": triggered_keywords,
@@ -520,7 +505,8 @@ class AIAgent:
                     reasoning=str(e)
                 )
                 db.add(audit)
-                await db.commit()
+                if commit:
+                    await db.commit()
                 
             return {
                 "content": fallback_msg,
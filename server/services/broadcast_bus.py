@@ -0,0 +1,164 @@
+import abc
+import asyncio
+import json
+import os
+import uuid
+from typing import Awaitable, Callable, Optional
+from logger import setup_logger
+from services.metrics import BROADCAST_BUS_MESSAGES_TOTAL
+
+logger = setup_logger("broadcast_bus")
+
+BROADCAST_BACKEND = os.getenv("BROADCAST_BACKEND", "memory")
+BROADCAST_CHANNEL = os.getenv("BROADCAST_CHANNEL", "dashboard:broadcast")
+BROADCAST_PUBLISH_QUEUE_SIZE = int(os.getenv("BROADCAST_PUBLISH_QUEUE_SIZE", "1000"))
+
+# handler(message, route): route holds the routing keys given to broadcast()
+Handler = Callable[[str, dict], Awaitable[None]]
+
+
+class BroadcastBus(abc.ABC):
+    """
+    Pub/sub backplane between processes that serve dashboard WebSockets.
+
+    Each process fans a broadcast out to its own sockets first and then
+    publishes it once; the other subscribed processes fan it out locally.
+    Messages published by a bus are never delivered back to its own handler.
+    """
+
+    def __init__(self):
+        self.origin = uuid.uuid4().hex
+        self._handler: Optional[Handler] = None
+
+    async def start(self, handler: Handler):
+        self._handler = handler
+
+    async def stop(self):
+        self._handler = None
+
+    @abc.abstractmethod
+    async def publish(self, message: str, route: Optional[dict] = None):
+        pass
+
+    async def _deliver(self, message: str, route: Optional[dict] = None):
+        if self._handler is None:
+            return
+        BROADCAST_BUS_MESSAGES_TOTAL.labels(direction="received").inc()
+        try:
+            await self._handler(message, route or {})
+        except Exception as e:
+            logger.error(f"Broadcast handler failed: {e}")
+
+
+class InMemoryBroadcastBus(BroadcastBus):
+    """
+    Single-process stand-in. Buses created with the same `peers` list behave
+    like separate workers sharing one Redis channel (used by tests).
+    """
+
+    def __init__(self, peers: Optional[list] = None):
+        super().__init__()
+        self._peers = peers if peers is not None else []
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        if self not in self._peers:
+            self._peers.append(self)
+
+    async def stop(self):
+        if self in self._peers:
+            self._peers.remove(self)
+        await super().stop()
+
+    async def publish(self, message: str, route: Optional[dict] = None):
+        BROADCAST_BUS_MESSAGES_TOTAL.labels(direction="published").inc()
+        for peer in list(self._peers):
+            if peer is not self:
+                await peer._deliver(message, route)
+
+
+class RedisBroadcastBus(BroadcastBus):
+    """
+    Redis pub/sub backplane. While started, publishes go through a bounded
+    queue drained by a background task so callers never wait on Redis; a
+    publish-only bus (e.g. from a Celery task) publishes directly.
+    """
+
+    def __init__(self, url: str, channel: str = BROADCAST_CHANNEL):
+        super().__init__()
+        import redis.asyncio as aioredis
+        self.channel = channel
+        self._redis = aioredis.from_url(url, decode_responses=True)
+        self._outbox: Optional[asyncio.Queue] = None
+        self._tasks = []
+
+    async def start(self, handler: Handler):
+        await super().start(handler)
+        self._outbox = asyncio.Queue(maxsize=BROADCAST_PUBLISH_QUEUE_SIZE)
+        self._tasks = [
+            asyncio.create_task(self._subscriber()),
+            asyncio.create_task(self._publisher()),
+        ]
+        logger.info(f"Redis broadcast bus subscribed to '{self.channel}'")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._outbox = None
+        await super().stop()
+        await self._redis.aclose()
+
+    def _envelope(self, message: str, route: Optional[dict]) -> str:
+        return json.dumps({"origin": self.origin, "data": message, "route": route or {}})
+
+    async def publish(self, message: str, route: Optional[dict] = None):
+        if self._outbox is None:
+            await self._redis.publish(self.channel, self._envelope(message, route))
+            BROADCAST_BUS_MESSAGES_TOTAL.labels(direction="published").inc()
+            return
+        try:
+            self._outbox.put_nowait((message, route))
+        except asyncio.QueueFull:
+            BROADCAST_BUS_MESSAGES_TOTAL.labels(direction="dropped").inc()
+            logger.warning("Broadcast bus outbox full. Dropping message for other workers.")
+
+    async def _publisher(self):
+        while True:
+            message, route = await self._outbox.get()
+            try:
+                await self._redis.publish(self.channel, self._envelope(message, route))
+                BROADCAST_BUS_MESSAGES_TOTAL.labels(direction="published").inc()
+            except Exception as e:
+                BROADCAST_BUS_MESSAGES_TOTAL.labels(direction="dropped").inc()
+                logger.error(f"Broadcast publish failed: {e}")
+
+    async def _subscriber(self):
+        backoff = 1
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                backoff = 1
+                async for item in pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    envelope = json.loads(item["data"])
+                    if envelope.get("origin") == self.origin:
+                        continue
+                    await self._deliver(envelope["data"], envelope.get("route"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Broadcast bus subscription lost: {e}. Reconnecting in {backoff}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+def get_broadcast_bus(backend: str = None) -> BroadcastBus:
+    """Build the bus selected by BROADCAST_BACKEND ("memory" or "redis")."""
+    backend = (backend or BROADCAST_BACKEND).lower()
+    if backend == "redis":
+        return RedisBroadcastBus(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    return InMemoryBroadcastBus()
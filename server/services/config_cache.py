@@ -0,0 +1,108 @@
+import asyncio
+import os
+import time
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from logger import setup_logger
+from models import AIConfig, Product
+from services.metrics import CONFIG_CACHE_HITS_TOTAL, CONFIG_CACHE_MISSES_TOTAL
+
+logger = setup_logger("config_cache")
+
+# How long a cached snapshot is trusted before re-checking its version stamp.
+# Local writes invalidate immediately; the TTL only bounds staleness for writes
+# made by other worker processes.
+CONFIG_CACHE_TTL_SECONDS = float(os.getenv("CONFIG_CACHE_TTL_SECONDS", "5"))
+
+
+class ConfigCache:
+    """
+    Versioned in-process cache for the active AIConfig snapshot.
+
+    The snapshot is keyed on (AIConfig.id, AIConfig.updated_at) plus a cheap
+    stamp of the active product catalog. Admin writes call `invalidate()` so the
+    next read reloads; otherwise the key is re-checked at most once per TTL with
+    a single lightweight query instead of reloading, re-parsing and re-decrypting
+    the whole config on every inbound message.
+    """
+
+    def __init__(self, ttl_seconds: float = CONFIG_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._snapshot = None
+        self._key = None
+        self._generation = 0        # Bumped by invalidate()
+        self._loaded_generation = -1
+        self._checked_at = 0.0
+        self._version = 0           # Bumped on every reload, exposed as config_version
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self, reason: str = "manual"):
+        """Drop the cached snapshot so the next read reloads from the database."""
+        self._generation += 1
+        logger.debug(f"Config cache invalidated ({reason})")
+
+    async def _fetch_key(self, db: AsyncSession):
+        product_count = select(func.count(Product.id)).filter(Product.is_active == True).scalar_subquery()
+        product_max_id = select(func.max(Product.id)).filter(Product.is_active == True).scalar_subquery()
+        result = await db.execute(
+            select(AIConfig.id, AIConfig.updated_at, product_count, product_max_id)
+            .filter(AIConfig.is_active == True)
+            .limit(1)
+        )
+        row = result.first()
+        return tuple(row) if row else None
+
+    async def get(self, db: AsyncSession, loader):
+        """
+        Return the cached snapshot, reloading through `loader(db)` when it was
+        invalidated or its version stamp changed. The returned dict is shared
+        between callers and must be treated as read-only.
+        """
+        if self._is_fresh():
+            CONFIG_CACHE_HITS_TOTAL.labels(kind="fresh").inc()
+            return self._snapshot
+
+        async with self._lock:
+            if self._is_fresh():
+                CONFIG_CACHE_HITS_TOTAL.labels(kind="fresh").inc()
+                return self._snapshot
+
+            generation = self._generation
+            key = await self._fetch_key(db)
+
+            if self._snapshot is not None and self._loaded_generation == generation and key == self._key:
+                self._checked_at = time.monotonic()
+                CONFIG_CACHE_HITS_TOTAL.labels(kind="revalidated").inc()
+                return self._snapshot
+
+            if self._snapshot is None:
+                reason = "cold"
+            elif self._loaded_generation != generation:
+                reason = "invalidated"
+            else:
+                reason = "changed"
+            CONFIG_CACHE_MISSES_TOTAL.labels(reason=reason).inc()
+
+            snapshot = await loader(db)
+            self._version += 1
+            snapshot["config_version"] = self._version
+            self._snapshot = snapshot
+            self._key = key
+            self._loaded_generation = generation
+            self._checked_at = time.monotonic()
+            logger.debug(f"Config cache reloaded ({reason}), version {self._version}")
+            return snapshot
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._snapshot is not None
+            and self._loaded_generation == self._generation
+            and time.monotonic() - self._checked_at < self.ttl_seconds
+        )
+
+
+config_cache = ConfigCache()
@@ -0,0 +1,182 @@
+import datetime
+from typing import Iterable
+from sqlalchemy import select, delete, update, insert, func, or_, DateTime
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from logger import setup_logger
+from models import Conversation, Message, ConversationSummaryRecord
+
+logger = setup_logger("conversation_summary")
+
+# Maintenance helpers for the `conversation_summaries` projection. They only
+# stage changes on the given session; callers commit them together with the
+# write that caused them so the projection stays transactionally consistent.
+
+
+def _projection_query(client_ids):
+    """Compute summary rows of the given clients' conversations from the source tables."""
+    latest_conv = select(
+        Conversation.id.label("conversation_id"),
+        func.row_number().over(
+            partition_by=Conversation.client_id,
+            order_by=(Conversation.started_at.desc(), Conversation.id.desc())
+        ).label("rn")
+    ).filter(Conversation.client_id.in_(client_ids)).subquery()
+
+    last_msg_id = (
+        select(Message.id)
+        .filter(Message.conversation_id == Conversation.id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(1)
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+    pending_count = (
+        select(func.count(Message.id))
+        .filter(Message.conversation_id == Conversation.id, Message.status == "pending")
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+    last_reply_time = (
+        select(func.max(Message.timestamp))
+        .filter(Message.conversation_id == Conversation.id, Message.sender != "user")
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+    # Customer messages received after the last agent/system reply
+    unread_count = (
+        select(func.count(Message.id))
+        .filter(
+            Message.conversation_id == Conversation.id,
+            Message.sender == "user",
+            or_(last_reply_time.is_(None), Message.timestamp > last_reply_time)
+        )
+        .correlate(Conversation)
+        .scalar_subquery()
+    )
+    last_msg = aliased(Message)
+
+    return (
+        select(
+            Conversation.id.label("conversation_id"),
+            Conversation.client_id,
+            (latest_conv.c.rn == 1).label("is_latest"),
+            func.coalesce(Conversation.is_pinned, False).label("is_pinned"),
+            func.coalesce(Conversation.is_archived, False).label("is_archived"),
+            func.coalesce(Conversation.channel, "whatsapp").label("channel"),
+            last_msg.id.label("last_message_id"),
+            last_msg.content.label("last_message"),
+            func.coalesce(last_msg.timestamp, Conversation.started_at, type_=DateTime).label("last_message_time"),
+            pending_count.label("pending_count"),
+            unread_count.label("unread_count"),
+            func.coalesce(Conversation.tenant_id, "default").label("tenant_id")
+        )
+        .join(latest_conv, latest_conv.c.conversation_id == Conversation.id)
+        .outerjoin(last_msg, last_msg.id == last_msg_id)
+    )
+
+
+async def refresh_summaries(db: AsyncSession, conversation_ids: Iterable[int]):
+    """
+    Recompute the projection rows of the given conversations (and of the other
+    conversations of their clients, since the "latest conversation" flag may
+    move). Rows of conversations that no longer exist are removed.
+    """
+    ids = {cid for cid in conversation_ids if cid is not None}
+    if not ids:
+        return
+
+    result = await db.execute(
+        select(ConversationSummaryRecord.client_id).filter(ConversationSummaryRecord.conversation_id.in_(ids))
+    )
+    client_ids = set(result.scalars().all())
+    result = await db.execute(select(Conversation.client_id).filter(Conversation.id.in_(ids)))
+    client_ids.update(result.scalars().all())
+    client_ids.discard(None)
+
+    scope = ConversationSummaryRecord.conversation_id.in_(ids)
+    if client_ids:
+        scope = or_(scope, ConversationSummaryRecord.client_id.in_(client_ids))
+
+    # Keep operator read state: never raise unread above what was stored
+    result = await db.execute(
+        select(ConversationSummaryRecord.conversation_id, ConversationSummaryRecord.unread_count).filter(scope)
+    )
+    previous_unread = dict(result.all())
+
+    rows = []
+    if client_ids:
+        result = await db.execute(_projection_query(client_ids))
+        rows = [dict(r) for r in result.mappings()]
+    for row in rows:
+        if row["conversation_id"] in previous_unread:
+            row["unread_count"] = min(row["unread_count"], previous_unread[row["conversation_id"]] or 0)
+        row["updated_at"] = datetime.datetime.now(datetime.timezone.utc)
+
+    await db.execute(delete(ConversationSummaryRecord).filter(scope))
+    if rows:
+        await db.execute(insert(ConversationSummaryRecord), rows)
+
+
+async def record_message(db: AsyncSession, message: Message, mark_read: bool = False):
+    """
+    Apply a newly inserted (and flushed) message to its conversation summary
+    with a single UPDATE. Falls back to a refresh when the row does not exist.
+    """
+    values = {
+        "last_message_id": message.id,
+        "last_message": message.content,
+        "last_message_time": message.timestamp,
+        "pending_count": ConversationSummaryRecord.pending_count + (1 if message.status == "pending" else 0),
+        "updated_at": datetime.datetime.now(datetime.timezone.utc)
+    }
+    if mark_read:
+        values["unread_count"] = 0
+    elif message.sender == "user":
+        values["unread_count"] = ConversationSummaryRecord.unread_count + 1
+
+    result = await db.execute(
+        update(ConversationSummaryRecord)
+        .filter(ConversationSummaryRecord.conversation_id == message.conversation_id)
+        .values(**values)
+    )
+    if result.rowcount == 0:
+        await refresh_summaries(db, [message.conversation_id])
+
+
+async def mark_read(db: AsyncSession, conversation_id: int):
+    await db.execute(
+        update(ConversationSummaryRecord)
+        .filter(ConversationSummaryRecord.conversation_id == conversation_id)
+        .values(unread_count=0)
+    )
+
+
+async def conversation_ids_for_messages(db: AsyncSession, message_ids: Iterable[int]):
+    """Resolve the conversations touched by a set of messages (before deleting them)."""
+    message_ids = list(message_ids)
+    if not message_ids:
+        return set()
+    result = await db.execute(select(Message.conversation_id).filter(Message.id.in_(message_ids)).distinct())
+    return set(result.scalars().all())
+
+
+async def rebuild_all(db: AsyncSession, batch_size: int = 1000):
+    """Rebuild the whole projection from the source tables (repair command)."""
+    await db.execute(delete(ConversationSummaryRecord))
+    result = await db.execute(select(Conversation.id).order_by(Conversation.id))
+    all_ids = result.scalars().all()
+    for i in range(0, len(all_ids), batch_size):
+        await refresh_summaries(db, all_ids[i:i + batch_size])
+    logger.info(f"Rebuilt conversation summaries for {len(all_ids)} conversations")
+    return len(all_ids)
+
+
+async def ensure_summaries(db: AsyncSession):
+    """Rebuild the projection when it is out of sync with conversations (e.g. after upgrading)."""
+    conversations = (await db.execute(select(func.count(Conversation.id)))).scalar()
+    summaries = (await db.execute(select(func.count(ConversationSummaryRecord.conversation_id)))).scalar()
+    if conversations != summaries:
+        logger.warning(f"Conversation summaries out of sync ({summaries}/{conversations}). Rebuilding...")
+        await rebuild_all(db)
+        await db.commit()
@@ -0,0 +1,156 @@
+import json
+import os
+import re
+import time
+from logger import setup_logger
+from routers.websocket import manager
+from services.metrics import DRAFT_STREAM_EVENTS_TOTAL, DRAFT_FIRST_TOKEN_MS
+
+logger = setup_logger("draft_stream")
+
+# Minimum time between two draft_delta events of one generation (deltas are coalesced in between)
+DRAFT_STREAM_INTERVAL_MS = float(os.getenv("DRAFT_STREAM_INTERVAL_MS", "100"))
+
+_REPLY_KEY = re.compile(r'"reply"\s*:\s*"')
+_SIMPLE_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class ReplyExtractor:
+    """
+    Incrementally extracts the "reply" string of the JSON envelope the model
+    is asked to produce, so partial drafts can be shown while the rest of the
+    envelope (intent, confidence, order details) is still being generated.
+
+    `feed()` takes raw stream chunks and returns the newly decoded reply text.
+    Output that does not start with a JSON object (optionally inside a
+    markdown fence) is treated as a plain-text reply, matching the parser's
+    fallback for non-JSON completions.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._state = "scan"
+        self._escape = None
+        self._high_surrogate = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> str:
+        if not chunk or self._state == "done":
+            return ""
+        if self._state == "plain":
+            return chunk
+        if self._state == "value":
+            return self._decode(chunk)
+
+        self._buffer += chunk
+        # Wait until the preamble (whitespace, an optional ```json fence) is complete
+        head = self._buffer.lstrip()
+        if "```".startswith(head):
+            return ""
+        if head.startswith("```"):
+            head = head[3:]
+            if "json".startswith(head.lower()):
+                return ""
+            if head[:4].lower() == "json":
+                head = head[4:]
+            head = head.lstrip()
+            if not head:
+                return ""
+        if not head.startswith("{"):
+            self._state = "plain"
+            text, self._buffer = self._buffer, ""
+            return text
+
+        match = _REPLY_KEY.search(self._buffer)
+        if not match:
+            return ""
+        rest = self._buffer[match.end():]
+        self._buffer = ""
+        self._state = "value"
+        return self._decode(rest)
+
+    def _decode(self, chunk: str) -> str:
+        out = []
+        for char in chunk:
+            if self._state == "done":
+                break
+            if self._escape is not None:
+                self._escape += char
+                if self._escape == "u" or (self._escape.startswith("u") and len(self._escape) < 5):
+                    continue
+                out.append(self._unescape(self._escape))
+                self._escape = None
+            elif char == "\\":
+                self._escape = ""
+            elif char == '"':
+                self._state = "done"
+            else:
+                out.append(char)
+        return "".join(out)
+
+    def _unescape(self, escape: str) -> str:
+        if not escape.startswith("u"):
+            return _SIMPLE_ESCAPES.get(escape, escape)
+        try:
+            code = int(escape[1:], 16)
+        except ValueError:
+            return ""
+        if 0xD800 <= code <= 0xDBFF:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code <= 0xDFFF and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+
+class DraftStreamer:
+    """
+    Pushes the reply of a generation in progress to the dashboards watching
+    the conversation as `draft_delta` events. Deltas are coalesced to at most
+    one event per DRAFT_STREAM_INTERVAL_MS; `finish()` flushes the rest and
+    sends a final event with done=true so the client can drop its preview
+    (the stored draft arrives as a regular new_message event).
+    """
+
+    def __init__(self, conversation_id: int, tenant_id: str = "default",
+                 interval_ms: float = DRAFT_STREAM_INTERVAL_MS):
+        self.conversation_id = conversation_id
+        self.tenant_id = tenant_id
+        self.interval = interval_ms / 1000
+        self.extractor = ReplyExtractor()
+        self._pending = []
+        self._sent_at = 0.0
+        self._started = time.perf_counter()
+        self._first_token = True
+
+    async def feed(self, chunk: str):
+        if self._first_token and chunk:
+            self._first_token = False
+            DRAFT_FIRST_TOKEN_MS.observe((time.perf_counter() - self._started) * 1000)
+        delta = self.extractor.feed(chunk)
+        if delta:
+            self._pending.append(delta)
+        if self._pending and time.monotonic() - self._sent_at >= self.interval:
+            await self._emit(done=False)
+
+    async def finish(self):
+        await self._emit(done=True)
+
+    async def _emit(self, done: bool):
+        delta, self._pending = "".join(self._pending), []
+        self._sent_at = time.monotonic()
+        try:
+            await manager.broadcast(json.dumps({
+                "type": "draft_delta",
+                "conversation_id": self.conversation_id,
+                "delta": delta,
+                "done": done
+            }), event_type="draft_delta", conversation_id=self.conversation_id, tenant_id=self.tenant_id)
+            DRAFT_STREAM_EVENTS_TOTAL.inc()
+        except Exception as e:
+            # A preview is best effort; the generation itself must not fail
+            logger.warning(f"Could not push draft delta for conversation {self.conversation_id}: {e}")
@@ -0,0 +1,150 @@
+import asyncio
+import contextlib
+import hashlib
+import importlib.util
+import json
+import os
+from collections import Counter, OrderedDict
+from typing import Callable
+import httpx
+from logger import setup_logger
+from services.metrics import OUTBOUND_HTTP_POOLS
+
+logger = setup_logger("driver_registry")
+
+OUTBOUND_MAX_CONNECTIONS = int(os.getenv("OUTBOUND_MAX_CONNECTIONS", "100"))
+OUTBOUND_MAX_KEEPALIVE = int(os.getenv("OUTBOUND_MAX_KEEPALIVE", "20"))
+OUTBOUND_KEEPALIVE_EXPIRY = float(os.getenv("OUTBOUND_KEEPALIVE_EXPIRY", "60"))
+OUTBOUND_TIMEOUT_SECONDS = float(os.getenv("OUTBOUND_TIMEOUT_SECONDS", "10"))
+# "auto" enables HTTP/2 when the h2 package is installed (httpx[http2])
+OUTBOUND_HTTP2 = os.getenv("OUTBOUND_HTTP2", "auto")
+DRIVER_REGISTRY_SIZE = int(os.getenv("DRIVER_REGISTRY_SIZE", "32"))
+
+
+def fingerprint(*parts) -> str:
+    """Stable digest of driver settings/credentials, used as a cache key without keeping them readable."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def http2_enabled() -> bool:
+    if OUTBOUND_HTTP2 == "auto":
+        return importlib.util.find_spec("h2") is not None
+    return OUTBOUND_HTTP2.lower() in ("1", "true", "yes")
+
+
+class DriverRegistry:
+    """
+    Process-wide cache of channel drivers and of the pooled HTTP clients they
+    send through, keyed by (channel, credentials). Sends reuse warm
+    keep-alive (and, with h2 installed, HTTP/2) connections instead of paying
+    a TCP + TLS handshake per message.
+
+    Entries are bounded (DRIVER_REGISTRY_SIZE). Sends hold a `lease()` on
+    their client, so a client evicted e.g. after a token rotation is closed
+    as soon as its in-flight requests finish. The lifespan calls `aclose()`
+    on shutdown.
+    """
+
+    def __init__(self, size: int = DRIVER_REGISTRY_SIZE, **client_kwargs):
+        self.size = size
+        self.client_kwargs = client_kwargs
+        self._drivers = OrderedDict()
+        self._clients = OrderedDict()
+        self._retired = []
+        self._in_flight = Counter()
+        self._reaper = None
+
+    def _new_client(self, channel: str) -> httpx.AsyncClient:
+        options = {
+            "limits": httpx.Limits(
+                max_connections=OUTBOUND_MAX_CONNECTIONS,
+                max_keepalive_connections=OUTBOUND_MAX_KEEPALIVE,
+                keepalive_expiry=OUTBOUND_KEEPALIVE_EXPIRY
+            ),
+            "timeout": httpx.Timeout(OUTBOUND_TIMEOUT_SECONDS),
+            "http2": http2_enabled()
+        }
+        options.update(self.client_kwargs)
+        logger.info(f"Opening HTTP pool for channel '{channel}' (http2={options['http2']})")
+        return httpx.AsyncClient(**options)
+
+    def client(self, channel: str, *credentials) -> httpx.AsyncClient:
+        """Shared HTTP client for a (channel, credentials) pair."""
+        key = (channel, fingerprint(*credentials))
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = self._new_client(channel)
+            self._clients[key] = client
+            while len(self._clients) > self.size:
+                _, evicted = self._clients.popitem(last=False)
+                self._retire(evicted)
+            OUTBOUND_HTTP_POOLS.set(len(self._clients) + len(self._retired))
+        else:
+            self._clients.move_to_end(key)
+        return client
+
+    @contextlib.asynccontextmanager
+    async def lease(self, channel: str, *credentials):
+        """Shared HTTP client for one send; it is not closed while the lease is held."""
+        client = self.client(channel, *credentials)
+        self._in_flight[client] += 1
+        try:
+            yield client
+        finally:
+            self._in_flight[client] -= 1
+            if self._in_flight[client] <= 0:
+                del self._in_flight[client]
+                if client in self._retired:
+                    await self._reap()
+
+    def _retire(self, client: httpx.AsyncClient):
+        self._retired.append(client)
+        if client in self._in_flight:
+            return # Closed by the last lease
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return # No loop to close it on; aclose() takes care of it
+        if self._reaper is None or self._reaper.done():
+            self._reaper = loop.create_task(self._reap())
+
+    async def _reap(self):
+        """Close retired clients that no send is using anymore."""
+        idle = [client for client in self._retired if client not in self._in_flight]
+        self._retired = [client for client in self._retired if client in self._in_flight]
+        for client in idle:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP pool: {e}")
+        OUTBOUND_HTTP_POOLS.set(len(self._clients) + len(self._retired))
+
+    def get(self, key, factory: Callable):
+        """Cached driver/adapter for `key`, built with `factory()` on first use."""
+        driver = self._drivers.get(key)
+        if driver is None:
+            driver = factory()
+            self._drivers[key] = driver
+            while len(self._drivers) > self.size:
+                self._drivers.popitem(last=False)
+        else:
+            self._drivers.move_to_end(key)
+        return driver
+
+    async def aclose(self):
+        clients = list(self._clients.values()) + self._retired
+        self._clients.clear()
+        self._retired = []
+        self._in_flight.clear()
+        self._drivers.clear()
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing HTTP pool: {e}")
+        OUTBOUND_HTTP_POOLS.set(0)
+        if clients:
+            logger.info(f"Closed {len(clients)} outbound HTTP pools")
+
+
+driver_registry = DriverRegistry()
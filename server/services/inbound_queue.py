@@ -0,0 +1,207 @@
+import asyncio
+import datetime
+import os
+import time
+from typing import Awaitable, Callable, List, Optional
+from sqlalchemy import select, exists
+from sqlalchemy.orm import aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from logger import setup_logger
+from models import Message, Conversation
+from services.metrics import INBOUND_QUEUE_DEPTH, INBOUND_JOBS_TOTAL, INBOUND_QUEUE_WAIT_MS
+
+logger = setup_logger("inbound_queue")
+
+INBOUND_WORKERS = int(os.getenv("INBOUND_WORKERS", "4"))
+INBOUND_QUEUE_SIZE = int(os.getenv("INBOUND_QUEUE_SIZE", "1000"))
+INBOUND_DRAIN_SECONDS = float(os.getenv("INBOUND_DRAIN_SECONDS", "10"))
+# How long the webhook waits for room in a full shard before acknowledging and leaving the message to recovery
+INBOUND_SUBMIT_TIMEOUT_SECONDS = float(os.getenv("INBOUND_SUBMIT_TIMEOUT_SECONDS", "2"))
+# Recovery sweep: user messages older than INBOUND_RECOVERY_AFTER_SECONDS (and within the window)
+# that have no later agent message are submitted again, at startup and every INBOUND_RECOVERY_SECONDS
+INBOUND_RECOVERY_SECONDS = float(os.getenv("INBOUND_RECOVERY_SECONDS", "60"))
+INBOUND_RECOVERY_AFTER_SECONDS = float(os.getenv("INBOUND_RECOVERY_AFTER_SECONDS", "120"))
+INBOUND_RECOVERY_WINDOW_HOURS = float(os.getenv("INBOUND_RECOVERY_WINDOW_HOURS", "6"))
+INBOUND_RECOVERY_BATCH_SIZE = int(os.getenv("INBOUND_RECOVERY_BATCH_SIZE", "200"))
+
+# handler(conversation_id, message_id)
+Handler = Callable[[int, int], Awaitable[None]]
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+async def find_unanswered(db: AsyncSession, limit: int = INBOUND_RECOVERY_BATCH_SIZE,
+                          after_seconds: float = INBOUND_RECOVERY_AFTER_SECONDS,
+                          window_hours: float = INBOUND_RECOVERY_WINDOW_HOURS) -> List[tuple]:
+    """
+    (conversation_id, message_id) of persisted user messages that never got
+    a reply: no agent message follows them in their conversation. Blocked
+    messages and conversations in manual mode are not answered by the AI and
+    are skipped. Oldest first, so a conversation is resumed in order.
+    """
+    now = _utcnow().replace(tzinfo=None)
+    later = aliased(Message)
+    answered = exists().where(
+        later.conversation_id == Message.conversation_id,
+        later.sender == "agent",
+        later.id > Message.id
+    )
+    result = await db.execute(
+        select(Message.conversation_id, Message.id)
+        .join(Conversation, Conversation.id == Message.conversation_id)
+        .filter(
+            Message.sender == "user",
+            Message.is_violation.is_not(True),
+            Message.timestamp <= now - datetime.timedelta(seconds=after_seconds),
+            Message.timestamp >= now - datetime.timedelta(hours=window_hours),
+            Conversation.is_active == True,
+            Conversation.auto_ai_enabled == True,
+            ~answered
+        )
+        .order_by(Message.id)
+        .limit(limit)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+class InboundQueue:
+    """
+    Hands persisted inbound messages to in-process workers so the webhook can
+    acknowledge Meta before the guardrail and LLM round trip.
+
+    Jobs are sharded by conversation id: every shard is served by a single
+    worker, so messages of one conversation are answered in arrival order
+    while different conversations are processed concurrently.
+
+    Jobs only live in memory, but the messages they refer to are committed
+    before they are submitted: a recovery sweep (at startup, then every
+    INBOUND_RECOVERY_SECONDS) re-submits user messages that never got a
+    reply, e.g. because the process restarted or the backlog was full.
+    """
+
+    def __init__(self, workers: int = INBOUND_WORKERS, maxsize: int = INBOUND_QUEUE_SIZE,
+                 session_factory=AsyncSessionLocal, recovery_seconds: float = INBOUND_RECOVERY_SECONDS,
+                 submit_timeout: float = INBOUND_SUBMIT_TIMEOUT_SECONDS):
+        self.workers = max(1, workers)
+        self.maxsize = maxsize
+        self.session_factory = session_factory
+        self.recovery_seconds = recovery_seconds
+        self.submit_timeout = submit_timeout
+        self._shards = []
+        self._tasks = []
+        self._recovery: Optional[asyncio.Task] = None
+        self._handler: Optional[Handler] = None
+        self._in_flight = set() # Message ids queued or being processed
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    @property
+    def depth(self) -> int:
+        return sum(shard.qsize() for shard in self._shards)
+
+    def start(self, handler: Handler):
+        if self.running:
+            return
+        self._handler = handler
+        self._shards = [asyncio.Queue(maxsize=self.maxsize) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(shard)) for shard in self._shards]
+        if self.recovery_seconds > 0:
+            self._recovery = asyncio.create_task(self._recover_loop())
+        logger.info(f"Inbound queue started with {self.workers} workers")
+
+    async def stop(self, timeout: float = INBOUND_DRAIN_SECONDS):
+        """Let the workers finish what is queued (up to `timeout`), then cancel them."""
+        if not self.running:
+            return
+        if self._recovery is not None:
+            self._recovery.cancel()
+            await asyncio.gather(self._recovery, return_exceptions=True)
+            self._recovery = None
+        tasks, shards = self._tasks, self._shards
+        self._tasks = []
+        try:
+            await asyncio.wait_for(asyncio.gather(*(shard.join() for shard in shards)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Inbound queue stopped with {sum(s.qsize() for s in shards)} messages left for recovery")
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._shards = []
+        self._in_flight.clear()
+        INBOUND_QUEUE_DEPTH.set(0)
+
+    async def submit(self, conversation_id: int, message_id: int) -> bool:
+        """
+        Queue a committed message for AI generation. When its shard is full,
+        waits up to `submit_timeout` for room; returns False when the workers
+        are not running or the shard stayed full. A message that could not be
+        queued is answered by the recovery sweep, never inline, so it is not
+        answered ahead of earlier messages of its conversation.
+        """
+        if not self.running:
+            return False
+        if message_id in self._in_flight:
+            return True
+        shard = self._shards[conversation_id % len(self._shards)]
+        job = (conversation_id, message_id, time.monotonic())
+        try:
+            shard.put_nowait(job)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(shard.put(job), self.submit_timeout)
+            except asyncio.TimeoutError:
+                INBOUND_JOBS_TOTAL.labels(status="rejected").inc()
+                logger.warning(f"Inbound backlog full: message {message_id} left for the recovery sweep")
+                return False
+        self._in_flight.add(message_id)
+        INBOUND_QUEUE_DEPTH.inc()
+        return True
+
+    async def recover(self) -> int:
+        """Re-submit persisted user messages that never got a reply. Returns how many were queued."""
+        async with self.session_factory() as db:
+            jobs = await find_unanswered(db)
+        queued = 0
+        for conversation_id, message_id in jobs:
+            if message_id in self._in_flight:
+                continue
+            if not await self.submit(conversation_id, message_id):
+                break
+            queued += 1
+        if queued:
+            INBOUND_JOBS_TOTAL.labels(status="recovered").inc(queued)
+            logger.info(f"Inbound recovery re-queued {queued} unanswered messages")
+        return queued
+
+    async def _recover_loop(self):
+        while True:
+            try:
+                await self.recover()
+            except Exception as e:
+                logger.error(f"Inbound recovery sweep failed: {e}")
+            await asyncio.sleep(self.recovery_seconds)
+
+    async def _worker(self, shard: asyncio.Queue):
+        while True:
+            conversation_id, message_id, enqueued_at = await shard.get()
+            INBOUND_QUEUE_DEPTH.dec()
+            INBOUND_QUEUE_WAIT_MS.observe((time.monotonic() - enqueued_at) * 1000)
+            try:
+                await self._handler(conversation_id, message_id)
+                INBOUND_JOBS_TOTAL.labels(status="processed").inc()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                INBOUND_JOBS_TOTAL.labels(status="failed").inc()
+                logger.error(f"Inbound message {message_id} (conversation {conversation_id}) failed: {e}")
+            finally:
+                self._in_flight.discard(message_id)
+                shard.task_done()
+
+
+inbound_queue = InboundQueue()
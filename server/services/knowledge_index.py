@@ -0,0 +1,135 @@
+import asyncio
+import json
+import math
+import os
+import time
+from collections import defaultdict
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from logger import setup_logger
+from models import AIDataset, KnowledgeChunk
+from services.knowledge_service import KnowledgeService
+from services.metrics import KB_RETRIEVAL_LATENCY_MS, KB_CHUNKS_RETRIEVED, KB_INDEX_CHUNKS
+
+logger = setup_logger("knowledge_index")
+
+KB_TOP_K = int(os.getenv("KB_TOP_K", "4"))
+KB_INDEX_TTL_SECONDS = float(os.getenv("KB_INDEX_TTL_SECONDS", "30"))
+
+# Standard Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class KnowledgeIndex:
+    """
+    In-process BM25 index over the persisted KnowledgeChunk rows of all active
+    datasets. Term frequencies are computed once at ingest time, so (re)building
+    the index is a single query plus dictionary work; no network is involved.
+
+    Admin dataset writes call `invalidate()`. Writes from other processes are
+    picked up by re-checking a (chunk count, max chunk id) stamp once per TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = KB_INDEX_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._postings = {}
+        self._chunks = []
+        self._doc_lengths = []
+        self._avgdl = 0.0
+        self._key = None
+        self._generation = 0
+        self._loaded_generation = -1
+        self._checked_at = 0.0
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self, reason: str = "manual"):
+        self._generation += 1
+        logger.debug(f"Knowledge index invalidated ({reason})")
+
+    async def _fetch_key(self, db: AsyncSession):
+        result = await db.execute(
+            select(func.count(KnowledgeChunk.id), func.max(KnowledgeChunk.id))
+            .join(AIDataset, AIDataset.id == KnowledgeChunk.dataset_id)
+            .filter(AIDataset.is_active == True)
+        )
+        return tuple(result.first())
+
+    async def ensure_loaded(self, db: AsyncSession):
+        if self._loaded_generation == self._generation and time.monotonic() - self._checked_at < self.ttl_seconds:
+            return
+
+        async with self._lock:
+            generation = self._generation
+            key = await self._fetch_key(db)
+            if self._loaded_generation == generation and key == self._key:
+                self._checked_at = time.monotonic()
+                return
+
+            result = await db.execute(
+                select(KnowledgeChunk.id, KnowledgeChunk.content, KnowledgeChunk.term_freqs_json,
+                       KnowledgeChunk.token_count, AIDataset.name)
+                .join(AIDataset, AIDataset.id == KnowledgeChunk.dataset_id)
+                .filter(AIDataset.is_active == True)
+                .order_by(KnowledgeChunk.dataset_id, KnowledgeChunk.ordinal)
+            )
+            self._build([
+                {"id": row.id, "content": row.content, "source": row.name,
+                 "term_freqs": json.loads(row.term_freqs_json or "{}"), "length": row.token_count or 0}
+                for row in result
+            ])
+            self._key = key
+            self._loaded_generation = generation
+            self._checked_at = time.monotonic()
+
+    def _build(self, chunks):
+        postings = defaultdict(list)
+        doc_lengths = []
+        for idx, chunk in enumerate(chunks):
+            for term, tf in chunk.pop("term_freqs").items():
+                postings[term].append((idx, tf))
+            doc_lengths.append(chunk["length"])
+
+        self._postings = dict(postings)
+        self._chunks = chunks
+        self._doc_lengths = doc_lengths
+        self._avgdl = (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0
+        self._version += 1
+        KB_INDEX_CHUNKS.set(len(chunks))
+        logger.info(f"Knowledge index rebuilt: {len(chunks)} chunks, {len(postings)} terms (version {self._version})")
+
+    def _score(self, query: str, top_k: int):
+        n_docs = len(self._chunks)
+        if not n_docs:
+            return []
+
+        scores = defaultdict(float)
+        for term in set(KnowledgeService.tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for idx, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._doc_lengths[idx] / (self._avgdl or 1))
+                scores[idx] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [dict(self._chunks[idx], score=round(score, 4)) for idx, score in ranked]
+
+    async def search(self, db: AsyncSession, query: str, top_k: int = KB_TOP_K):
+        """Return the top_k chunks for `query` as dicts with id, source, content and score."""
+        start = time.perf_counter()
+        await self.ensure_loaded(db)
+        hits = self._score(query, top_k)
+        KB_RETRIEVAL_LATENCY_MS.observe((time.perf_counter() - start) * 1000)
+        KB_CHUNKS_RETRIEVED.observe(len(hits))
+        return hits
+
+
+knowledge_index = KnowledgeIndex()
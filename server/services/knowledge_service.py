@@ -1,12 +1,43 @@
+import codecs
 import csv
 import json
 import io
+import os
+import time
+import re
+import unicodedata
+from collections import Counter
 from typing import List, Dict, Any
+from sqlalchemy import delete, insert
+from sqlalchemy.ext.asyncio import AsyncSession
 from logger import setup_logger
-from models import AIDataset
+from models import AIDataset, KnowledgeChunk
 
 logger = setup_logger("knowledge_service")
 
+# Target size of a retrieval chunk (rows/lines are never split)
+CHUNK_MAX_CHARS = int(os.getenv("KB_CHUNK_MAX_CHARS", "800"))
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Streaming ingestion tuning
+INGEST_READ_BYTES = int(os.getenv("KB_INGEST_READ_BYTES", str(64 * 1024)))
+INGEST_BATCH_CHUNKS = int(os.getenv("KB_INGEST_BATCH_CHUNKS", "200"))
+INGEST_PREVIEW_CHARS = 2000
+# Trailer of the content preview kept for streamed uploads (the full data only lives in the chunks)
+PREVIEW_TRUNCATED_MARKER = "[... preview truncated:"
+INGEST_MAX_ITEM_CHARS = int(os.getenv("KB_INGEST_MAX_ITEM_CHARS", str(16 * 1024 * 1024)))
+
+# Progress of in-flight uploads, keyed by dataset id
+INGEST_PROGRESS: Dict[int, Dict[str, Any]] = {}
+
+# Very frequent words that carry no retrieval signal
+STOPWORDS = {
+    "el", "la", "los", "las", "un", "una", "de", "del", "y", "o", "en", "que", "por", "para",
+    "con", "es", "se", "al", "lo", "su", "mi", "me", "te", "tu", "a",
+    "the", "an", "and", "or", "of", "to", "in", "is", "for", "on", "it"
+}
+
 class KnowledgeService:
     @staticmethod
     def parse_csv(content: bytes) -> str:
@@ -62,3 +93,294 @@ class KnowledgeService:
             return KnowledgeService.parse_json(content)
         else:
             return content.decode("utf-8")
+
+    @staticmethod
+    def tokenize(text: str) -> List[str]:
+        """Casefold, strip accents and split into index terms."""
+        decomposed = unicodedata.normalize("NFKD", text.casefold())
+        stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+        return [t for t in _TOKEN_RE.findall(stripped) if t not in STOPWORDS]
+
+    @staticmethod
+    def chunk_text(text: str, max_chars: int = CHUNK_MAX_CHARS) -> List[str]:
+        """Group consecutive lines into chunks of roughly max_chars characters."""
+        chunks = []
+        current = []
+        size = 0
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            if current and size + len(line) > max_chars:
+                chunks.append("\n".join(current))
+                current = []
+                size = 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            chunks.append("\n".join(current))
+        return chunks
+
+    @staticmethod
+    def make_chunk(dataset_id: int, ordinal: int, content: str, tenant_id: str = "default") -> dict:
+        """Build the column values of a KnowledgeChunk, including its term frequencies."""
+        terms = KnowledgeService.tokenize(content)
+        return {
+            "dataset_id": dataset_id,
+            "ordinal": ordinal,
+            "content": content,
+            "term_freqs_json": json.dumps(Counter(terms), ensure_ascii=False),
+            "token_count": len(terms),
+            "tenant_id": tenant_id
+        }
+
+    @staticmethod
+    def build_chunks(dataset_id: int, content: str, tenant_id: str = "default") -> List[KnowledgeChunk]:
+        """Split dataset content into indexed KnowledgeChunk rows."""
+        return [
+            KnowledgeChunk(**KnowledgeService.make_chunk(dataset_id, i, chunk, tenant_id))
+            for i, chunk in enumerate(KnowledgeService.chunk_text(content or ""))
+        ]
+
+    @staticmethod
+    def is_truncated_preview(content: str) -> bool:
+        """True for the content of a streamed upload, which is only a preview of what was indexed."""
+        last_line = (content or "").rstrip().rpartition("\n")[2]
+        return last_line.startswith(PREVIEW_TRUNCATED_MARKER)
+
+    @staticmethod
+    async def replace_chunks(db: AsyncSession, dataset: AIDataset):
+        """Re-chunk a dataset. The caller is responsible for committing."""
+        await db.execute(delete(KnowledgeChunk).filter(KnowledgeChunk.dataset_id == dataset.id))
+        chunks = KnowledgeService.build_chunks(dataset.id, dataset.content, tenant_id=dataset.tenant_id or "default")
+        db.add_all(chunks)
+        logger.info(f"Dataset {dataset.id} indexed into {len(chunks)} chunks")
+        return len(chunks)
+
+    @staticmethod
+    def format_csv_row(header: List[str], values: List[str]) -> str:
+        """Render one CSV row the same way parse_csv does."""
+        return " | ".join(
+            f"{k}: {values[i] if i < len(values) else ''}" for i, k in enumerate(header)
+        )
+
+    @staticmethod
+    async def iter_upload_text(file, progress: Dict[str, Any], read_bytes: int = INGEST_READ_BYTES):
+        """Read an UploadFile in fixed-size blocks and yield decoded text."""
+        decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        while True:
+            block = await file.read(read_bytes)
+            if not block:
+                break
+            progress["bytes_read"] += len(block)
+            text = decoder.decode(block)
+            if text:
+                yield text
+        text = decoder.decode(b"", final=True)
+        if text:
+            yield text
+
+    @staticmethod
+    async def iter_upload_lines(file, progress: Dict[str, Any]):
+        """Yield the lines of an UploadFile without reading it whole."""
+        tail = ""
+        async for text in KnowledgeService.iter_upload_text(file, progress):
+            lines = (tail + text).split("\n")
+            tail = lines.pop()
+            if len(tail) > INGEST_MAX_ITEM_CHARS:
+                raise ValueError(f"Invalid upload: line exceeds {INGEST_MAX_ITEM_CHARS} characters")
+            for line in lines:
+                yield line.rstrip("\r")
+        if tail:
+            yield tail.rstrip("\r")
+
+    @staticmethod
+    async def iter_csv_rows(file, progress: Dict[str, Any]):
+        """
+        Yield CSV rows as formatted text lines. Physical lines are grouped into
+        logical records (quoted fields may contain newlines) before parsing, so
+        only one record is held in memory at a time.
+        """
+        header = None
+        pending = []
+        pending_chars = 0
+        quotes = 0
+        async for line in KnowledgeService.iter_upload_lines(file, progress):
+            pending.append(line)
+            pending_chars += len(line) + 1
+            quotes += line.count('"')
+            if quotes % 2:
+                if pending_chars > INGEST_MAX_ITEM_CHARS:
+                    raise ValueError(f"Invalid CSV format: record exceeds {INGEST_MAX_ITEM_CHARS} characters (unterminated quoted field?)")
+                continue # Inside a quoted field that spans lines
+            record = "\n".join(pending)
+            pending = []
+            pending_chars = 0
+            quotes = 0
+            if not record.strip():
+                continue
+            values = next(csv.reader([record]))
+            if header is None:
+                header = values
+                continue
+            yield KnowledgeService.format_csv_row(header, values)
+        if pending:
+            raise ValueError("Invalid CSV format: unterminated quoted field")
+
+    @staticmethod
+    async def iter_json_items(file, progress: Dict[str, Any]):
+        """
+        Yield one text line per element of a top-level JSON array (or per
+        key of a top-level object) without loading the whole document.
+        """
+        decoder = json.JSONDecoder()
+        blocks = KnowledgeService.iter_upload_text(file, progress)
+        buf = ""
+        eof = False
+
+        async def fill():
+            nonlocal buf, eof
+            try:
+                buf += await blocks.__anext__()
+            except StopAsyncIteration:
+                eof = True
+
+        def skip(chars):
+            nonlocal buf
+            buf = buf.lstrip(chars)
+
+        async def decode_value():
+            nonlocal buf
+            while True:
+                skip(" \t\r\n")
+                try:
+                    value, end = decoder.raw_decode(buf)
+                    # Numbers/literals are not self-delimiting: wait for the next char
+                    if end < len(buf) or eof:
+                        buf = buf[end:]
+                        return value
+                except json.JSONDecodeError as e:
+                    if eof or len(buf) > INGEST_MAX_ITEM_CHARS:
+                        raise ValueError(f"Invalid JSON format: {e}")
+                await fill()
+
+        while not buf.strip() and not eof:
+            await fill()
+        skip(" \t\r\n")
+        if not buf:
+            return
+        container = buf[0]
+
+        if container not in "[{":
+            value = await decode_value()
+            yield str(value)
+            return
+
+        buf = buf[1:]
+        while True:
+            skip(" \t\r\n,")
+            while not buf and not eof:
+                await fill()
+                skip(" \t\r\n,")
+            if not buf:
+                raise ValueError("Invalid JSON format: truncated document")
+            if buf[0] in "]}":
+                return
+
+            if container == "{":
+                key = await decode_value()
+                skip(" \t\r\n")
+                while not buf and not eof:
+                    await fill()
+                    skip(" \t\r\n")
+                if not buf.startswith(":"):
+                    raise ValueError("Invalid JSON format: expected ':'")
+                buf = buf[1:]
+                value = await decode_value()
+                yield json.dumps({key: value}, ensure_ascii=False)
+            else:
+                item = await decode_value()
+                yield json.dumps(item, ensure_ascii=False) if isinstance(item, dict) else str(item)
+
+    @staticmethod
+    async def ingest_upload(db: AsyncSession, dataset: AIDataset, data_type: str, file) -> Dict[str, Any]:
+        """
+        Stream an UploadFile into knowledge chunks with bounded memory.
+
+        Rows are parsed incrementally, grouped into chunks and written with bulk
+        INSERTs of INGEST_BATCH_CHUNKS rows, committing after each batch. The
+        dataset stays inactive until ingestion completes, and only a preview of
+        the content is kept on the AIDataset row itself.
+        """
+        progress = {
+            "status": "running",
+            "bytes_read": 0,
+            "total_bytes": getattr(file, "size", None),
+            "rows": 0,
+            "chunks": 0,
+            "started_at": time.time()
+        }
+        INGEST_PROGRESS[dataset.id] = progress
+        while len(INGEST_PROGRESS) > 100:
+            INGEST_PROGRESS.pop(next(iter(INGEST_PROGRESS)))
+
+        if data_type.lower() == "csv":
+            rows = KnowledgeService.iter_csv_rows(file, progress)
+        elif data_type.lower() == "json":
+            rows = KnowledgeService.iter_json_items(file, progress)
+        else:
+            rows = KnowledgeService.iter_upload_lines(file, progress)
+
+        tenant_id = dataset.tenant_id or "default"
+        preview = []
+        preview_size = 0
+        current = []
+        current_size = 0
+        batch = []
+
+        async def flush_batch():
+            if batch:
+                await db.execute(insert(KnowledgeChunk), batch)
+                await db.commit()
+                batch.clear()
+
+        try:
+            async for line in rows:
+                if not line.strip():
+                    continue
+                progress["rows"] += 1
+                if preview_size < INGEST_PREVIEW_CHARS:
+                    preview.append(line)
+                    preview_size += len(line) + 1
+
+                if current and current_size + len(line) > CHUNK_MAX_CHARS:
+                    batch.append(KnowledgeService.make_chunk(dataset.id, progress["chunks"], "\n".join(current), tenant_id))
+                    progress["chunks"] += 1
+                    current = []
+                    current_size = 0
+                    if len(batch) >= INGEST_BATCH_CHUNKS:
+                        await flush_batch()
+                        logger.debug(f"Dataset {dataset.id} ingest: {progress['rows']} rows, {progress['bytes_read']} bytes")
+                current.append(line)
+                current_size += len(line) + 1
+
+            if current:
+                batch.append(KnowledgeService.make_chunk(dataset.id, progress["chunks"], "\n".join(current), tenant_id))
+                progress["chunks"] += 1
+            await flush_batch()
+        except Exception as e:
+            progress["status"] = "failed"
+            progress["error"] = str(e)
+            await db.rollback()
+            raise
+
+        content = "\n".join(preview)
+        if progress["rows"] > len(preview):
+            content += f"\n{PREVIEW_TRUNCATED_MARKER} {progress['rows']} rows indexed in {progress['chunks']} chunks]"
+        dataset.content = content
+        dataset.is_active = True
+        await db.commit()
+
+        progress["status"] = "completed"
+        progress["elapsed_ms"] = int((time.time() - progress["started_at"]) * 1000)
+        logger.info(f"Dataset {dataset.id} ingested: {progress['rows']} rows -> {progress['chunks']} chunks ({progress['bytes_read']} bytes)")
+        return progress
@@ -2,6 +2,7 @@ import asyncio
 import datetime
 from database import AsyncSessionLocal
 from models import Message
+from services import conversation_summary
 from logger import setup_logger
 
 logger = setup_logger("maintenance")
@@ -22,15 +23,19 @@ async def cleanup_stale_messages():
                     
                     # Find pending messages older than cutoff
                     # In SQLAlchemy 2.0 async, use update() with execute()
-                    from sqlalchemy import update
+                    from sqlalchemy import select, update
+                    stale = Message.status == "pending", Message.timestamp < cutoff
+                    affected = await db.execute(select(Message.conversation_id).filter(*stale).distinct())
+                    affected_ids = affected.scalars().all()
                     result = await db.execute(
                         update(Message)
-                        .filter(Message.status == "pending", Message.timestamp < cutoff)
+                        .filter(*stale)
                         .values(status="expired")
                     )
                     stale_count = result.rowcount
                     
                     if stale_count > 0:
+                        await conversation_summary.refresh_summaries(db, affected_ids)
                         await db.commit()
                         logger.info(f"Cleanup: Marked {stale_count} stale pending messages as 'expired'")
                     else:
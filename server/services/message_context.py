@@ -0,0 +1,36 @@
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from guardrail.engine import GuardrailEngine, GuardrailResult
+
+
+class MessageContext:
+    """
+    Everything resolved once for an inbound message and handed down the
+    pipeline (webhook -> AIAgent), so later stages do not re-read the config,
+    re-query the client or re-run the guardrail prescan.
+    """
+
+    def __init__(self, phone: str, message: str, config: dict, guardrail: GuardrailResult,
+                 client=None, conversation=None):
+        self.phone = phone
+        self.message = message
+        self.config = config
+        self.guardrail = guardrail
+        self.client = client
+        self.conversation = conversation
+
+    @classmethod
+    async def build(cls, db: AsyncSession, ai_agent, phone: str, message: str,
+                    client=None, conversation=None) -> "MessageContext":
+        # Served from the versioned config cache (no per-message AIConfig query)
+        config = await ai_agent.get_active_config(db)
+        guardrail = GuardrailEngine.prescan_message(message, config.get("forbidden_topics", []))
+        return cls(phone, message, config, guardrail, client=client, conversation=conversation)
+
+    @property
+    def is_blocked(self) -> bool:
+        return self.guardrail.classification in ["security_violation", "legal_violation", "medical_violation"]
+
+    @property
+    def client_id(self) -> Optional[int]:
+        return self.client.id if self.client is not None else None
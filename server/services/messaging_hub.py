@@ -1,6 +1,7 @@
 import abc
 from logger import setup_logger
 from services.whatsapp_service import WhatsAppService, BaseWhatsApp
+from services.driver_registry import driver_registry, fingerprint
 
 logger = setup_logger("messaging_hub")
 
@@ -43,15 +44,19 @@ class MessengerAdapter(MessageAdapter):
         logger.info(f"[MESSENGER SEND] Carrier: {driver} | To: {to} | Content: {text[:50]}...")
         return "messenger_mock_id_" + to
 
+ADAPTERS = {
+    "email": EmailAdapter,
+    "instagram": InstagramAdapter,
+    "messenger": MessengerAdapter,
+}
+
 class MessagingHubService:
     @staticmethod
     def get_adapter(channel: str, config_dict: dict) -> MessageAdapter:
-        if channel == "email":
-            return EmailAdapter(config_dict)
-        if channel == "instagram":
-            return InstagramAdapter(config_dict)
-        if channel == "messenger":
-            return MessengerAdapter(config_dict)
-        
+        """Adapter for the channel and its settings, cached in the driver registry across sends."""
         # Default to WhatsApp
-        return WhatsAppAdapter(config_dict)
+        adapter_cls = ADAPTERS.get(channel, WhatsAppAdapter)
+        return driver_registry.get(
+            ("adapter", adapter_cls.__name__, fingerprint(config_dict)),
+            lambda: adapter_cls(config_dict)
+        )
@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Histogram, Gauge
 
 # Metrics Definitions
 
@@ -45,3 +45,190 @@ HUMAN_MESSAGES_TOTAL = Counter(
     "human_messages_total",
     "Total number of messages sent manually by humans"
 )
+
+CONFIG_CACHE_HITS_TOTAL = Counter(
+    "config_cache_hits_total",
+    "Active AIConfig reads served from the in-process cache",
+    ["kind"]
+)
+
+CONFIG_CACHE_MISSES_TOTAL = Counter(
+    "config_cache_misses_total",
+    "Active AIConfig reads that reloaded the snapshot from the database",
+    ["reason"]
+)
+
+PROMPT_SECTION_CHARS = Gauge(
+    "prompt_section_chars",
+    "Size in characters of each system prompt section as last rendered",
+    ["section"]
+)
+
+PROMPT_SECTION_REBUILDS_TOTAL = Counter(
+    "prompt_section_rebuilds_total",
+    "Number of times a cached system prompt section was re-rendered",
+    ["section"]
+)
+
+KB_RETRIEVAL_LATENCY_MS = Histogram(
+    "kb_retrieval_latency_ms",
+    "Latency of knowledge base retrieval (including index refresh) in milliseconds",
+    buckets=[1, 5, 10, 25, 50, 100, 250, 1000]
+)
+
+KB_CHUNKS_RETRIEVED = Histogram(
+    "kb_chunks_retrieved",
+    "Number of knowledge chunks injected into the prompt per message",
+    buckets=[0, 1, 2, 4, 8, 16]
+)
+
+KB_INDEX_CHUNKS = Gauge(
+    "kb_index_chunks",
+    "Number of knowledge chunks currently held by the retrieval index"
+)
+
+WS_ACTIVE_CONNECTIONS = Gauge(
+    "ws_active_connections",
+    "Number of dashboard WebSocket connections currently registered"
+)
+
+WS_SEND_QUEUE_DEPTH = Gauge(
+    "ws_send_queue_depth",
+    "Number of frames waiting in a connection's send queue",
+    ["connection"]
+)
+
+WS_MESSAGES_DROPPED_TOTAL = Counter(
+    "ws_messages_dropped_total",
+    "Frames dropped instead of delivered to a dashboard connection",
+    ["reason"]
+)
+
+WS_SLOW_CONSUMERS_EVICTED_TOTAL = Counter(
+    "ws_slow_consumers_evicted_total",
+    "Dashboard connections closed because they could not keep up",
+    ["reason"]
+)
+
+BROADCAST_BUS_MESSAGES_TOTAL = Counter(
+    "broadcast_bus_messages_total",
+    "Dashboard broadcasts exchanged with other processes over the broadcast bus",
+    ["direction"]
+)
+
+WS_EVENTS_COALESCED_TOTAL = Counter(
+    "ws_events_coalesced_total",
+    "Status events superseded by a newer update for the same message before being sent",
+    ["event_type"]
+)
+
+WS_FRAME_EVENTS = Histogram(
+    "ws_frame_events",
+    "Number of events carried by each WebSocket frame sent (batched per tick)",
+    buckets=[1, 2, 5, 10, 25, 50, 100]
+)
+
+INBOUND_QUEUE_DEPTH = Gauge(
+    "inbound_queue_depth",
+    "Inbound messages acknowledged and waiting for AI generation"
+)
+
+INBOUND_JOBS_TOTAL = Counter(
+    "inbound_jobs_total",
+    "Inbound messages handled by the AI generation workers",
+    ["status"]
+)
+
+INBOUND_QUEUE_WAIT_MS = Histogram(
+    "inbound_queue_wait_ms",
+    "Time an inbound message waited in the queue before a worker picked it up",
+    buckets=[1, 5, 10, 50, 100, 500, 1000, 5000, 30000]
+)
+
+WEBHOOK_DEDUPED_TOTAL = Counter(
+    "webhook_deduped_total",
+    "Redelivered WhatsApp messages (same wamid) acknowledged without being processed again",
+    ["layer"]
+)
+
+RECEIPT_BATCH_SIZE = Histogram(
+    "receipt_batch_size",
+    "Delivery/read receipts applied per bulk UPDATE",
+    buckets=[1, 5, 10, 50, 100, 500, 1000]
+)
+
+RECEIPTS_TOTAL = Counter(
+    "receipts_total",
+    "WhatsApp status callbacks by outcome (applied, stale: would move the status backwards or unknown wamid)",
+    ["outcome"]
+)
+
+SCHEDULED_SENDS_TOTAL = Counter(
+    "scheduled_sends_total",
+    "Pending AI drafts auto-sent by the delayed-send scheduler",
+    ["backend"]
+)
+
+SCHEDULER_LAG_SECONDS = Histogram(
+    "scheduler_lag_seconds",
+    "Delay between a draft's due time (send_after) and the scheduler sending it",
+    buckets=[0.1, 0.5, 1, 2, 5, 10, 30, 60, 300]
+)
+
+OUTBOUND_SEND_LATENCY_MS = Histogram(
+    "outbound_send_latency_ms",
+    "Latency of outbound channel API calls (e.g. Graph API /messages)",
+    ["channel", "status"],
+    buckets=[5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+)
+
+OUTBOUND_HTTP_POOLS = Gauge(
+    "outbound_http_pools",
+    "Open pooled HTTP clients held by the channel driver registry"
+)
+
+OUTBOUND_SENDS_TOTAL = Counter(
+    "outbound_sends_total",
+    "Outbound delivery attempts by channel and outcome (sent, retry, failed)",
+    ["channel", "outcome"]
+)
+
+OUTBOUND_QUEUE_LAG_SECONDS = Histogram(
+    "outbound_queue_lag_seconds",
+    "Time between a message becoming due for delivery and a dispatcher claiming it",
+    ["channel"],
+    buckets=[0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 300]
+)
+
+OUTBOUND_QUEUE_DEPTH = Gauge(
+    "outbound_queue_depth",
+    "Claimed outbound messages waiting for a channel worker",
+    ["channel"]
+)
+
+DRAFT_FIRST_TOKEN_MS = Histogram(
+    "draft_first_token_ms",
+    "Time from the streamed LLM request to its first token in milliseconds",
+    buckets=[100, 250, 500, 1000, 2000, 5000, 10000, 30000]
+)
+
+DRAFT_STREAM_EVENTS_TOTAL = Counter(
+    "draft_stream_events_total",
+    "draft_delta events pushed to the dashboard while generating"
+)
+
+RESPONSE_CACHE_LOOKUPS_TOTAL = Counter(
+    "response_cache_lookups_total",
+    "AI response cache lookups by result (hit, miss, bypass)",
+    ["result"]
+)
+
+RESPONSE_CACHE_SAVED_TOKENS_TOTAL = Counter(
+    "response_cache_saved_tokens_total",
+    "LLM tokens not spent because the response was served from the cache"
+)
+
+RESPONSE_CACHE_ENTRIES = Gauge(
+    "response_cache_entries",
+    "Entries held by the AI response cache"
+)
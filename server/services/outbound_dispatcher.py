@@ -0,0 +1,333 @@
+import asyncio
+import datetime
+import json
+import os
+import random
+import time
+from typing import Iterable, Optional
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from logger import setup_logger
+from models import Message, Conversation, Client
+from routers.websocket import manager
+from services.ai_agent import AIAgent
+from services.messaging_hub import MessagingHubService
+from services.whatsapp_service import SendError
+from services.metrics import OUTBOUND_SENDS_TOTAL, OUTBOUND_QUEUE_LAG_SECONDS, OUTBOUND_QUEUE_DEPTH
+
+logger = setup_logger("outbound_dispatcher")
+ai_agent = AIAgent()
+
+# Workers per channel; "whatsapp=8,email=2" overrides individual channels
+OUTBOUND_WORKERS = int(os.getenv("OUTBOUND_WORKERS", "4"))
+OUTBOUND_CHANNEL_WORKERS = os.getenv("OUTBOUND_CHANNEL_WORKERS", "")
+# Token bucket per sender (WhatsApp phone number id, or channel): sustained rate and burst
+OUTBOUND_RATE_PER_SECOND = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "20"))
+OUTBOUND_BURST = int(os.getenv("OUTBOUND_BURST", "40"))
+OUTBOUND_MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "5"))
+OUTBOUND_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_BASE_SECONDS", "2"))
+OUTBOUND_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOUND_BACKOFF_MAX_SECONDS", "300"))
+# A claimed ("sending") row whose lease expired is claimed again (worker crash/restart)
+OUTBOUND_LEASE_SECONDS = float(os.getenv("OUTBOUND_LEASE_SECONDS", "60"))
+OUTBOUND_POLL_SECONDS = float(os.getenv("OUTBOUND_POLL_SECONDS", "5"))
+OUTBOUND_BATCH_SIZE = int(os.getenv("OUTBOUND_BATCH_SIZE", "100"))
+
+# Only these settings reach the adapters, which are cached by a fingerprint of their config
+CHANNEL_CONFIG_KEYS = (
+    "whatsapp_driver", "whatsapp_api_token", "whatsapp_phone_id",
+    "email_driver", "email_smtp_server", "meta_driver", "facebook_api_token"
+)
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def _channel_workers() -> dict:
+    overrides = {}
+    for item in filter(None, OUTBOUND_CHANNEL_WORKERS.split(",")):
+        channel, _, count = item.partition("=")
+        overrides[channel.strip()] = int(count)
+    return overrides
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with full jitter for the retry after `attempts` failed sends."""
+    ceiling = min(OUTBOUND_BACKOFF_MAX_SECONDS, OUTBOUND_BACKOFF_BASE_SECONDS * (2 ** (attempts - 1)))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def enqueue(message: Message):
+    """Mark a message for outbound delivery; the caller commits it with the rest of its write."""
+    message.status = "queued"
+    message.next_attempt_at = _utcnow()
+    message.last_error = None
+
+
+async def enqueue_pending(db: AsyncSession, message_ids: Iterable[int]) -> list:
+    """
+    Move pending drafts to the outbound queue with one conditional UPDATE and
+    return the ids it matched. Drafts that another request (a second approval,
+    the auto-send scheduler) already took are not matched, so each draft is
+    queued once. The caller commits.
+    """
+    result = await db.execute(
+        update(Message)
+        .where(Message.id.in_(list(message_ids)), Message.status == "pending")
+        .values(status="queued", send_after=None, next_attempt_at=_utcnow(), last_error=None)
+        .returning(Message.id)
+        .execution_options(synchronize_session=False)
+    )
+    return sorted(result.scalars().all())
+
+
+def status_event(message_id: int, status: str, conversation_id: Optional[int] = None, error: Optional[str] = None) -> str:
+    event = {"type": "message_update", "id": message_id, "status": status, "conversation_id": conversation_id}
+    if error:
+        event["error"] = error
+    return json.dumps(event)
+
+
+async def load_channel_config(db: AsyncSession) -> dict:
+    """Channel driver settings of the active config, from the versioned config cache."""
+    snapshot = await ai_agent.get_active_config(db)
+    return {key: snapshot[key] for key in CHANNEL_CONFIG_KEYS if key in snapshot}
+
+
+class TokenBucket:
+    """Shapes sends to `rate` per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float = OUTBOUND_RATE_PER_SECOND, capacity: int = OUTBOUND_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OutboundDispatcher:
+    """
+    Durable outbound delivery queue. The queue is the messages table itself:
+    operator and auto-send paths only mark rows "queued" (see `enqueue`) and
+    return. A feeder claims due rows in batches (FOR UPDATE SKIP LOCKED on
+    Postgres) under a lease, and per-channel worker pools send them through
+    MessagingHubService, shaped by a token bucket per sender.
+
+    Failed sends are retried with exponential backoff; after
+    OUTBOUND_MAX_ATTEMPTS the message is marked "failed". Rows claimed by a
+    process that died are picked up again once their lease expires.
+
+    Without `start()` (tests, scripts) callers deliver inline with `dispatch()`.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, workers: int = OUTBOUND_WORKERS,
+                 batch_size: int = OUTBOUND_BATCH_SIZE, poll_seconds: float = OUTBOUND_POLL_SECONDS):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.channel_workers = _channel_workers()
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self._queues = {}
+        self._tasks = []
+        self._buckets = {}
+        self._wakeup = asyncio.Event()
+        self._feeder: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._feeder is not None
+
+    def start(self):
+        if self._feeder is None:
+            self._wakeup = asyncio.Event()
+            self._feeder = asyncio.create_task(self._feed())
+            logger.info("Outbound dispatcher started")
+
+    async def stop(self):
+        """Stop feeding and sending. Claimed rows are re-claimed after their lease by the next start."""
+        if self._feeder is None:
+            return
+        tasks = [self._feeder] + self._tasks
+        self._feeder = None
+        self._tasks = []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queues = {}
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def dispatch(self, db: AsyncSession, message_ids: Iterable[int]):
+        """Hand committed queued messages to the workers, or deliver them inline when not running."""
+        if self.running:
+            self.notify()
+            return
+        jobs = await self.claim(db, message_ids=list(message_ids))
+        if jobs:
+            config = await load_channel_config(db)
+            for job in jobs:
+                await self.deliver(db, job, config)
+
+    def _bucket(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket()
+        return bucket
+
+    def _queue(self, channel: str) -> asyncio.Queue:
+        queue = self._queues.get(channel)
+        if queue is None:
+            count = self.channel_workers.get(channel, self.workers)
+            queue = self._queues[channel] = asyncio.Queue()
+            self._tasks.extend(asyncio.create_task(self._work(channel, queue)) for _ in range(count))
+        return queue
+
+    async def claim(self, db: AsyncSession, limit: int = OUTBOUND_BATCH_SIZE,
+                    message_ids: Optional[list] = None) -> list:
+        """Lease due queued (or lease-expired sending) messages and return them as send jobs."""
+        now = _utcnow()
+        due = or_(
+            and_(Message.status == "queued", or_(Message.next_attempt_at.is_(None), Message.next_attempt_at <= now)),
+            and_(Message.status == "sending", Message.next_attempt_at <= now)
+        )
+        query = select(Message.id, Message.next_attempt_at).filter(due)
+        if message_ids is not None:
+            query = query.filter(Message.id.in_(message_ids))
+        query = query.order_by(Message.next_attempt_at).limit(limit)
+        result = await db.execute(query.with_for_update(skip_locked=True))
+        claimed = result.all()
+        if not claimed:
+            await db.rollback()
+            return []
+
+        ids = [row.id for row in claimed]
+        await db.execute(
+            update(Message)
+            .where(Message.id.in_(ids))
+            .values(status="sending", next_attempt_at=now + datetime.timedelta(seconds=OUTBOUND_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(
+            select(Message.id, Message.content, Message.media_url, Message.media_type, Message.send_attempts,
+                   Message.conversation_id, Message.tenant_id, Conversation.channel, Client.phone_number)
+            .join(Conversation, Conversation.id == Message.conversation_id)
+            .join(Client, Client.id == Conversation.client_id)
+            .filter(Message.id.in_(ids))
+        )
+        jobs = [dict(row._mapping) for row in result]
+        await db.commit()
+
+        due_at = {row.id: row.next_attempt_at for row in claimed}
+        for job in jobs:
+            job["channel"] = job["channel"] or "whatsapp"
+            if due_at.get(job["id"]) is not None:
+                lag = (_naive(now) - _naive(due_at[job["id"]])).total_seconds()
+                OUTBOUND_QUEUE_LAG_SECONDS.labels(channel=job["channel"]).observe(max(0.0, lag))
+        return jobs
+
+    async def deliver(self, db: AsyncSession, job: dict, config: dict):
+        """Send one claimed message and record the outcome (sent, retry or failed)."""
+        channel = job["channel"]
+        sender = config.get("whatsapp_phone_id") if channel == "whatsapp" else None
+        await self._bucket(f"{channel}:{sender or 'default'}").acquire()
+
+        error = None
+        retryable = True
+        try:
+            adapter = MessagingHubService.get_adapter(channel, config)
+            result = await adapter.send_message(to=job["phone_number"], text=job["content"],
+                                                media_url=job["media_url"], media_type=job["media_type"])
+            if not result:
+                error = "Channel rejected the message"
+        except SendError as e:
+            # Timeouts, 429 and 5xx are retried; other rejections (bad recipient, auth) never succeed
+            result = False
+            error = str(e)
+            retryable = e.retryable
+        except Exception as e:
+            result = False
+            error = str(e) or type(e).__name__
+
+        attempts = (job["send_attempts"] or 0) + 1
+        values = {"send_attempts": attempts}
+        if not error:
+            status = "sent"
+            values.update(status="sent", next_attempt_at=None, last_error=None)
+            if isinstance(result, str):
+                values["external_id"] = result
+        elif not retryable or attempts >= OUTBOUND_MAX_ATTEMPTS:
+            status = "failed"
+            values.update(status="failed", next_attempt_at=None, last_error=error)
+            logger.error(f"Message {job['id']} FAILED after {attempts} attempts: {error}")
+        else:
+            status = "retry"
+            delay = backoff_seconds(attempts)
+            values.update(status="queued", last_error=error,
+                          next_attempt_at=_utcnow() + datetime.timedelta(seconds=delay))
+            logger.warning(f"Message {job['id']} send attempt {attempts} failed ({error}); retrying in {delay:.1f}s")
+
+        await db.execute(update(Message).where(Message.id == job["id"]).values(**values)
+                         .execution_options(synchronize_session=False))
+        await db.commit()
+        OUTBOUND_SENDS_TOTAL.labels(channel=channel, outcome=status).inc()
+
+        if status != "retry":
+            await manager.broadcast(status_event(job["id"], status, job["conversation_id"], error),
+                                    event_type="message_update", conversation_id=job["conversation_id"],
+                                    tenant_id=job["tenant_id"])
+
+    async def _feed(self):
+        while True:
+            timeout = self.poll_seconds
+            try:
+                backlog = sum(queue.qsize() for queue in self._queues.values())
+                free = max(0, self.batch_size - backlog)
+                if free:
+                    async with self.session_factory() as db:
+                        jobs = await self.claim(db, limit=free)
+                        config = await load_channel_config(db) if jobs else {}
+                    for job in jobs:
+                        queue = self._queue(job["channel"])
+                        queue.put_nowait((job, config))
+                        OUTBOUND_QUEUE_DEPTH.labels(channel=job["channel"]).set(queue.qsize())
+                    if len(jobs) == free:
+                        timeout = 0  # More may be due right away
+            except Exception as e:
+                logger.error(f"Outbound feeder iteration failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _work(self, channel: str, queue: asyncio.Queue):
+        while True:
+            job, config = await queue.get()
+            OUTBOUND_QUEUE_DEPTH.labels(channel=channel).set(queue.qsize())
+            try:
+                async with self.session_factory() as db:
+                    await self.deliver(db, job, config)
+            except Exception as e:
+                # The lease expires and the feeder claims the message again
+                logger.error(f"Outbound worker failed on Message {job['id']}: {e}")
+            finally:
+                queue.task_done()
+
+
+outbound_dispatcher = OutboundDispatcher()
@@ -0,0 +1,168 @@
+from logger import setup_logger
+from services.metrics import PROMPT_SECTION_CHARS, PROMPT_SECTION_REBUILDS_TOTAL
+
+logger = setup_logger("prompt_builder")
+
+
+def render_intent_mapping(intent_rules) -> str:
+    """
+    Dynamically build intent mapping instructions from UI-configured intent_rules.
+
+    Example intent_rules format:
+    [
+        {"intent": "Consulta de Precio", "keywords": ["precio", "costo", "cuánto cuesta"]},
+        {"intent": "Pedido", "keywords": ["pedir", "ordenar", "comprar"]},
+        {"intent": "Horario", "keywords": ["horario", "abierto", "cerrado"]}
+    ]
+    """
+    if not intent_rules:
+        return ""
+
+    lines = ["\n### DYNAMIC INTENT MAPPING (UI-Configured):\n"]
+    for rule in intent_rules:
+        intent_name = rule.get("intent", "General")
+        keywords = rule.get("keywords", [])
+        if keywords:
+            keywords_str = ", ".join(keywords)
+            lines.append(f"- Intent '{intent_name}': Triggered by keywords [{keywords_str}]\n")
+    return "".join(lines)
+
+
+def _render_identity(config) -> str:
+    rules_list = config.get("rules", [])
+    rules_str = "\n".join([f"- {r}" for r in rules_list]) if rules_list else "No specific rules configured."
+    identity_prompt = config.get("identity_prompt") or f"You are the virtual assistant for {config['business_name']}."
+    return (
+        f"{identity_prompt}\n"
+        f"Business Description: {config['business_description']}\n\n"
+        f"### OPERATIONAL RULES:\n{rules_str}\n\n"
+    )
+
+
+def _render_knowledge(sources) -> str:
+    if not sources:
+        return ""
+    knowledge_texts = [f"### Source: {name}\n{content}" for name, content in sources]
+    return (
+        "\n### KNOWLEDGE BASE (MASTER SOURCE OF TRUTH):\n" +
+        "\n---\n".join(knowledge_texts) +
+        "\n### END KNOWLEDGE BASE\n"
+    )
+
+
+def _render_products(products) -> str:
+    if not products:
+        return ""
+    lines = ["\n### PRODUCT CATALOG:\n"]
+    for p in products:
+        lines.append(f"- ID: {p['id']} | Name: {p['name']} | Price: {p['price']} {p['currency']} | Stock: {p['stock']} | Desc: {p['description']}\n")
+    lines.append("### END PRODUCT CATALOG\n")
+    return "".join(lines)
+
+
+def _render_scope(forbidden_topics) -> str:
+    if not forbidden_topics:
+        return ""
+    forbidden_list_str = ", ".join(forbidden_topics)
+    return (
+        f"\n### BUSINESS SCOPE BOUNDARIES:\n"
+        f"We DO NOT offer the following products/services: [{forbidden_list_str}]\n"
+        f"If a customer asks about these topics, politely inform them we don't offer that service "
+        f"and redirect to our available products from the Catalog.\n"
+        f"IMPORTANT: These are BUSINESS boundaries, NOT security violations. Be friendly.\n"
+    )
+
+
+def _render_framework(lang_code: str) -> str:
+    return (
+        f"### CATEGORIZATION FRAMEWORK:\n"
+        f"You must classify every user message into ONE of these categories:\n\n"
+        f"1. **Commercial/Logistics** (AUTHORIZED):\n"
+        f"   - Questions about products, prices, orders, delivery, payment, hours, location.\n"
+        f"   - Use Knowledge Base AND Product Catalog to answer. If info not in KB/Catalog, set `is_out_of_knowledge: true`.\n"
+        f"   - **E-COMMERCE RULE**: If a user expresses intent to BUY or ORDER, verify if the products exist in the CATALOG.\n"
+        f"   - If they state specific products and quantities: set `requires_order_creation: true` and populate `order_details` list.\n"
+        f"   - **CX RULE**: If sentiment is NEGATIVE (Complaint, Delay, Issue) -> **DO NOT** ask to buy/order. Focus 100% on resolution.\n"
+        f"   - **CX RULE**: If Intent is 'Missing Order' -> Ask for Order Number immediately.\n\n"
+        f"2. **Out of Scope - Business Boundary** (FRIENDLY REDIRECT):\n"
+        f"   - Customer asks about products/services we don't offer.\n"
+        f"   - Set `is_out_of_knowledge: true` and `classification: 'out_of_scope'`.\n"
+        f"   - Response: Friendly, apologetic, redirect to what we DO offer.\n\n"
+        f"3. **Security Violation** (BLOCK IMMEDIATELY):\n"
+        f"   - Politics, protests, religion, hate speech, insults, abuse, medical/legal advice.\n"
+        f"   - Set `classification: 'security_violation'`.\n"
+        f"   - Response: Cold, bureaucratic.\n\n"
+        f"### CLOSING PROTOCOL:\n"
+        f"- **Neutral**: 'How else can I help?' (Use for support/complaints)\n"
+        f"- **Sales**: 'Would you like to order?' (ONLY for positive buying signals)\n"
+        f"- **NEVER** use aggressive closing on negative sentiment.\n\n"
+        f"### RESPONSE FORMAT (JSON):\n"
+        f"{{\n"
+        f'  "reply": "Your response in {lang_code}",\n'
+        f'  "domain": "Commercial/Logistics | Security_Violation",\n'
+        f'  "classification": "in_scope | out_of_scope | security_violation | legal_violation | medical_violation",\n'
+        f'  "primary_intent": "Detected intent",\n'
+        f'  "is_out_of_knowledge": true/false,\n'
+        f'  "requires_order_creation": true/false,\n'
+        f'  "order_details": [ {{ "product_id": int, "quantity": int, "price": float }} ],\n'
+        f'  "tone_applied": "Friendly | Corporate_Neutral",\n'
+        f'  "confidence_self_assessment": 0-100\n'
+        f"}}\n\n"
+    )
+
+
+class PromptBuilder:
+    """
+    Assembles the system prompt from pre-rendered sections.
+
+    Each section is cached together with the key of the inputs it was rendered
+    from and only re-rendered when that key changes (config sections are keyed
+    on the config cache version, knowledge on its source fingerprint). Only the
+    per-message parts (order history, timestamp) are spliced in on every call.
+    """
+
+    def __init__(self):
+        self._sections = {}
+        self.last_sizes = {}
+
+    def _section(self, name: str, key, render) -> str:
+        cached = self._sections.get(name)
+        if cached is not None and key is not None and cached[0] == key:
+            return cached[1]
+
+        text = render()
+        self._sections[name] = (key, text)
+        PROMPT_SECTION_REBUILDS_TOTAL.labels(section=name).inc()
+        PROMPT_SECTION_CHARS.labels(section=name).set(len(text))
+        return text
+
+    def invalidate(self):
+        self._sections.clear()
+
+    def build(self, config: dict, knowledge_sources=None, knowledge_key=None,
+              order_history_context: str = "", local_time: str = "") -> str:
+        config_version = config.get("config_version")
+        lang_code = config.get("language_code", "es-CR")
+        tone = config.get("tone", "friendly, concise, and professional")
+        timezone = config.get("timezone", "UTC")
+
+        parts = [
+            ("identity", self._section("identity", config_version, lambda: _render_identity(config))),
+            ("knowledge", self._section("knowledge", knowledge_key, lambda: _render_knowledge(knowledge_sources))),
+            ("products", self._section("products", config_version, lambda: _render_products(config.get("products", [])))),
+            ("order_history", order_history_context),
+            ("scope", self._section("scope", config_version, lambda: _render_scope(config.get("forbidden_topics", [])))),
+            ("intents", self._section("intents", config_version, lambda: render_intent_mapping(config.get("intent_rules", [])))),
+            ("framework", self._section("framework", lang_code, lambda: _render_framework(lang_code))),
+            ("language", f"Respond in {lang_code}. Tone: {tone}. Current Time: {local_time} ({timezone})."),
+        ]
+
+        self.last_sizes = {name: len(text) for name, text in parts}
+        PROMPT_SECTION_CHARS.labels(section="order_history").set(self.last_sizes["order_history"])
+
+        # Sections that are separated by a blank line in the assembled prompt
+        separated = {"knowledge", "products", "order_history", "scope", "intents"}
+        return "".join(
+            f"{text}\n" if name in separated else text
+            for name, text in parts
+        )
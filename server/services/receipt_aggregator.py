@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+from typing import Optional
+from sqlalchemy import select, update, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from logger import setup_logger
+from models import Message, Conversation, Client
+from routers.websocket import manager
+from services.metrics import RECEIPT_BATCH_SIZE, RECEIPTS_TOTAL
+
+logger = setup_logger("receipt_aggregator")
+
+RECEIPT_WINDOW_MS = float(os.getenv("RECEIPT_WINDOW_MS", "200"))
+RECEIPT_MAX_BATCH = int(os.getenv("RECEIPT_MAX_BATCH", "500"))
+
+# Statuses only move forward: sent -> delivered -> read. "failed" can only
+# replace a message that was not delivered yet.
+STATUS_RANK = {"pending": 0, "sent": 1, "failed": 2, "delivered": 2, "read": 3}
+
+
+class ReceiptAggregator:
+    """
+    Buffers Meta status callbacks (sent/delivered/read/failed) for a short
+    window and applies them with one UPDATE per batch, guarded in SQL so a
+    late "delivered" never overwrites "read". The dashboard gets a single
+    `message_status_batch` event per tenant and batch instead of one frame
+    per receipt.
+
+    Until `start()` is called (tests, scripts) `add()` is not available and
+    callers apply receipts inline with `apply()`.
+    """
+
+    def __init__(self, window_ms: float = RECEIPT_WINDOW_MS, max_batch: int = RECEIPT_MAX_BATCH,
+                 session_factory=AsyncSessionLocal):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.session_factory = session_factory
+        self._pending = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    def add(self, statuses):
+        """Buffer (wamid, status) pairs; keeps the most advanced status per wamid."""
+        for wamid, status in statuses:
+            current = self._pending.get(wamid)
+            if current is None or STATUS_RANK.get(status, -1) > STATUS_RANK.get(current, -1):
+                self._pending[wamid] = status
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Collect the rest of the burst, unless the batch is already full
+            if len(self._pending) < self.max_batch:
+                await asyncio.sleep(self.window)
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Receipt batch failed: {e}")
+
+    async def flush(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        async with self.session_factory() as db:
+            await self.apply(db, batch.items())
+
+    async def apply(self, db: AsyncSession, statuses):
+        """Apply a batch of receipts with one forward-only UPDATE, commit and notify the dashboard."""
+        latest = {}
+        for wamid, status in statuses:
+            if STATUS_RANK.get(status, -1) > STATUS_RANK.get(latest.get(wamid), -1):
+                latest[wamid] = status
+        if not latest:
+            return []
+        RECEIPT_BATCH_SIZE.observe(len(latest))
+
+        new_rank = case({w: STATUS_RANK.get(s, -1) for w, s in latest.items()}, value=Message.external_id, else_=-1)
+        current_rank = case(STATUS_RANK, value=Message.status, else_=0)
+        result = await db.execute(
+            update(Message)
+            .where(Message.external_id.in_(latest), current_rank < new_rank)
+            .values(status=case(latest, value=Message.external_id))
+            .returning(Message.id)
+            .execution_options(synchronize_session=False)
+        )
+        updated_ids = result.scalars().all()
+        RECEIPTS_TOTAL.labels(outcome="applied").inc(len(updated_ids))
+        RECEIPTS_TOTAL.labels(outcome="stale").inc(len(latest) - len(updated_ids))
+
+        rows = []
+        if updated_ids:
+            result = await db.execute(
+                select(Message.id, Message.status, Message.conversation_id, Message.tenant_id, Client.phone_number)
+                .join(Conversation, Conversation.id == Message.conversation_id)
+                .join(Client, Client.id == Conversation.client_id)
+                .filter(Message.id.in_(updated_ids))
+            )
+            rows = result.all()
+        await db.commit()
+
+        by_tenant = {}
+        for row in rows:
+            by_tenant.setdefault(row.tenant_id or "default", []).append({
+                "id": row.id,
+                "status": row.status,
+                "phone": row.phone_number,
+                "conversation_id": row.conversation_id
+            })
+        for tenant_id, updates in by_tenant.items():
+            await manager.broadcast(json.dumps({
+                "type": "message_status_batch",
+                "updates": updates
+            }), event_type="message_status_batch", tenant_id=tenant_id)
+        return updated_ids
+
+
+receipt_aggregator = ReceiptAggregator()
@@ -0,0 +1,162 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from logger import setup_logger
+from services.knowledge_service import KnowledgeService
+from services.metrics import RESPONSE_CACHE_LOOKUPS_TOTAL, RESPONSE_CACHE_SAVED_TOKENS_TOTAL, RESPONSE_CACHE_ENTRIES
+
+logger = setup_logger("response_cache")
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "900"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+# "exact" (normalized text) or "jaccard" (token-set similarity >= RESPONSE_CACHE_MIN_SIMILARITY)
+RESPONSE_CACHE_SIMILARITY = os.getenv("RESPONSE_CACHE_SIMILARITY", "exact")
+RESPONSE_CACHE_MIN_SIMILARITY = float(os.getenv("RESPONSE_CACHE_MIN_SIMILARITY", "0.8"))
+
+
+def normalize(message: str) -> str:
+    """Casefolded, accent-free index terms of the message (see KnowledgeService.tokenize)."""
+    return " ".join(KnowledgeService.tokenize(message))
+
+
+def estimate_tokens(messages, completion: str) -> int:
+    """Rough token count (~4 characters per token) for completions without a usage block."""
+    chars = sum(len(m["content"]) for m in messages) + len(completion or "")
+    return chars // 4
+
+
+class ExactSimilarity:
+    """Only identical normalized messages match."""
+
+    def score(self, query: str, candidate: str) -> float:
+        return 1.0 if query == candidate else 0.0
+
+    def best(self, query: str, candidates):
+        return (query, 1.0) if query in candidates else (None, 0.0)
+
+
+class JaccardSimilarity:
+    """Token-set overlap, so reordered or slightly reworded questions still match."""
+
+    def __init__(self, threshold: float = RESPONSE_CACHE_MIN_SIMILARITY):
+        self.threshold = threshold
+
+    def score(self, query: str, candidate: str) -> float:
+        a, b = set(query.split()), set(candidate.split())
+        return len(a & b) / len(a | b) if a or b else 0.0
+
+    def best(self, query: str, candidates):
+        if query in candidates:
+            return query, 1.0
+        best_key, best_score = None, 0.0
+        for candidate in candidates:
+            score = self.score(query, candidate)
+            if score > best_score:
+                best_key, best_score = candidate, score
+        if best_score < self.threshold:
+            return None, best_score
+        return best_key, best_score
+
+
+# Further strategies (e.g. local embeddings) implement score() and best()
+SIMILARITIES = {
+    "exact": ExactSimilarity,
+    "jaccard": JaccardSimilarity,
+}
+
+
+class CacheEntry:
+    def __init__(self, result: dict, tokens: int):
+        self.result = result
+        self.tokens = tokens
+        self.created_at = time.monotonic()
+
+
+class CacheHit:
+    def __init__(self, entry: CacheEntry, similarity: float):
+        self.result = dict(entry.result)
+        self.similarity = similarity
+        self.age_seconds = time.monotonic() - entry.created_at
+        self.tokens_saved = entry.tokens
+
+
+class ResponseCache:
+    """
+    In-process TTL + LRU cache of parsed LLM envelopes, keyed on the
+    normalized customer message. Entries are only valid for the config
+    version and knowledge index version they were generated with; when
+    either changes the cache is emptied.
+
+    Only the raw envelope is cached: the caller re-applies the guardrail and
+    confidence rules on every hit, so a rule change or a flagged message is
+    never answered from a stale decision.
+    """
+
+    def __init__(self, size: int = RESPONSE_CACHE_SIZE, ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+                 similarity: str = RESPONSE_CACHE_SIMILARITY, enabled: bool = RESPONSE_CACHE_ENABLED):
+        self.size = size
+        self.ttl_seconds = ttl_seconds
+        self.similarity = SIMILARITIES[similarity]()
+        self.enabled = enabled
+        self._entries = OrderedDict()
+        self._scope = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        RESPONSE_CACHE_ENTRIES.set(0)
+
+    def _use_scope(self, scope):
+        if scope != self._scope:
+            if self._entries:
+                logger.info(f"Response cache emptied: config/knowledge changed ({self._scope} -> {scope})")
+            self.clear()
+            self._scope = scope
+
+    def _fresh(self, entry: CacheEntry) -> bool:
+        return time.monotonic() - entry.created_at < self.ttl_seconds
+
+    def lookup(self, message: str, scope) -> Optional[CacheHit]:
+        """Return the cached envelope for `message` under `scope` (config, KB versions), if any."""
+        key = normalize(message)
+        if not self.enabled or not key:
+            RESPONSE_CACHE_LOOKUPS_TOTAL.labels(result="bypass").inc()
+            return None
+
+        self._use_scope(scope)
+        match, similarity = self.similarity.best(key, self._entries)
+        entry = self._entries.get(match) if match is not None else None
+        if entry is not None and not self._fresh(entry):
+            del self._entries[match]
+            RESPONSE_CACHE_ENTRIES.set(len(self._entries))
+            entry = None
+        if entry is None:
+            RESPONSE_CACHE_LOOKUPS_TOTAL.labels(result="miss").inc()
+            return None
+
+        self._entries.move_to_end(match)
+        RESPONSE_CACHE_LOOKUPS_TOTAL.labels(result="hit").inc()
+        RESPONSE_CACHE_SAVED_TOKENS_TOTAL.inc(entry.tokens)
+        return CacheHit(entry, similarity)
+
+    def skip(self) -> None:
+        """Record a generation that could not use the cache (client-specific prompt)."""
+        RESPONSE_CACHE_LOOKUPS_TOTAL.labels(result="bypass").inc()
+
+    def store(self, message: str, scope, result: dict, tokens: int):
+        key = normalize(message)
+        if not self.enabled or not key:
+            return
+        self._use_scope(scope)
+        self._entries[key] = CacheEntry(dict(result), tokens)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)  # Least recently used
+        RESPONSE_CACHE_ENTRIES.set(len(self._entries))
+
+
+response_cache = ResponseCache()
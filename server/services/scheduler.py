@@ -0,0 +1,178 @@
+import asyncio
+import datetime
+import json
+import os
+from typing import Iterable, Optional
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import AsyncSessionLocal
+from logger import setup_logger
+from models import Message
+from routers.websocket import manager
+from services import conversation_summary
+from services.outbound_dispatcher import outbound_dispatcher
+from services.metrics import SCHEDULED_SENDS_TOTAL, SCHEDULER_LAG_SECONDS
+
+logger = setup_logger("scheduler")
+
+# "local": timer loop in the API process (started in the lifespan)
+# "celery": one tasks.delayed_auto_send_task per draft, with a countdown
+SCHEDULER_BACKEND = os.getenv("SCHEDULER_BACKEND", "local")
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "100"))
+# Upper bound on the sleep between scans, so drafts scheduled by other processes are picked up
+SCHEDULER_POLL_SECONDS = float(os.getenv("SCHEDULER_POLL_SECONDS", "30"))
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _naive(value: datetime.datetime) -> datetime.datetime:
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
+
+def schedule_auto_send(message: Message, delay_seconds: int):
+    """
+    Mark a pending draft for auto-send in `delay_seconds`. The due time is
+    stored on the row, so the caller commits it together with the message.
+    """
+    message.send_after = _utcnow() + datetime.timedelta(seconds=delay_seconds)
+
+
+def dispatch_scheduled(message: Message):
+    """Hand a committed, scheduled draft to the configured backend."""
+    if SCHEDULER_BACKEND == "celery":
+        from tasks import delayed_auto_send_task
+        countdown = max(0.0, (_naive(message.send_after) - _naive(_utcnow())).total_seconds())
+        try:
+            delayed_auto_send_task.apply_async(args=[message.id], countdown=countdown)
+        except Exception as e:
+            logger.error(f"Could not enqueue auto-send of Message {message.id}: {e}")
+    else:
+        auto_send_scheduler.notify()
+
+
+async def send_due_messages(db: AsyncSession, limit: int = SCHEDULER_BATCH_SIZE,
+                            message_ids: Optional[Iterable[int]] = None, backend: str = "local"):
+    """
+    Claim pending drafts whose send_after has passed (or the given ids,
+    whose timing the caller already enforced), hand them to the outbound
+    queue and commit. Rows locked by another scheduler are skipped (FOR
+    UPDATE SKIP LOCKED on Postgres; SQLite serializes writers). Returns the
+    rows that were queued.
+    """
+    now = _utcnow()
+    query = select(Message.id, Message.send_after).filter(Message.status == "pending", Message.send_after.is_not(None))
+    if message_ids is None:
+        query = query.filter(Message.send_after <= now).order_by(Message.send_after).limit(limit)
+    else:
+        query = query.filter(Message.id.in_(list(message_ids)))
+    result = await db.execute(query.with_for_update(skip_locked=True))
+    claimed = result.all()
+    if not claimed:
+        await db.rollback()
+        return []
+    ids = [row.id for row in claimed]
+
+    result = await db.execute(
+        update(Message)
+        .where(Message.id.in_(ids), Message.status == "pending")
+        .values(status="queued", send_after=None, next_attempt_at=now, last_error=None)
+        .returning(Message.id, Message.conversation_id, Message.tenant_id)
+        .execution_options(synchronize_session=False)
+    )
+    rows = result.all()
+    await conversation_summary.refresh_summaries(db, {row.conversation_id for row in rows})
+    await db.commit()
+    # The dispatcher of the API process picks them up (by notification or on its next poll)
+    outbound_dispatcher.notify()
+
+    SCHEDULED_SENDS_TOTAL.labels(backend=backend).inc(len(rows))
+    for row in claimed:
+        SCHEDULER_LAG_SECONDS.observe(max(0.0, (_naive(now) - _naive(row.send_after)).total_seconds()))
+    logger.info(f"Queued {len(rows)} scheduled messages for auto-send")
+    return rows
+
+
+def status_update_event(row) -> str:
+    return json.dumps({
+        "type": "message_update",
+        "id": row.id,
+        "status": "queued"
+    })
+
+
+class AutoSendScheduler:
+    """
+    Single timer loop that sends delayed AI drafts when they are due.
+
+    Drafts are persisted with their due time (Message.send_after), so nothing
+    is held in memory per message and scheduled sends survive restarts. The
+    loop sleeps until the earliest due time (at most SCHEDULER_POLL_SECONDS)
+    and is woken early by `notify()` when a new draft is scheduled.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, poll_seconds: float = SCHEDULER_POLL_SECONDS,
+                 batch_size: int = SCHEDULER_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info("Auto-send scheduler started")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    async def run_once(self) -> Optional[datetime.datetime]:
+        """Send everything that is due; returns the next due time, if any."""
+        async with self.session_factory() as db:
+            while True:
+                rows = await send_due_messages(db, limit=self.batch_size)
+                for row in rows:
+                    await manager.broadcast(status_update_event(row), event_type="message_update",
+                                            conversation_id=row.conversation_id, tenant_id=row.tenant_id)
+                if len(rows) < self.batch_size:
+                    break
+
+            result = await db.execute(
+                select(func.min(Message.send_after))
+                .filter(Message.status == "pending", Message.send_after.is_not(None))
+            )
+            return result.scalar()
+
+    async def _run(self):
+        while True:
+            timeout = self.poll_seconds
+            try:
+                next_due = await self.run_once()
+                if next_due is not None:
+                    remaining = (_naive(next_due) - _naive(_utcnow())).total_seconds()
+                    timeout = min(self.poll_seconds, max(0.0, remaining))
+            except Exception as e:
+                logger.error(f"Auto-send scheduler iteration failed: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+
+auto_send_scheduler = AutoSendScheduler()
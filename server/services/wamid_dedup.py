@@ -0,0 +1,103 @@
+import os
+from collections import OrderedDict
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import dialect_insert
+from logger import setup_logger
+from models import Message
+from services.metrics import WEBHOOK_DEDUPED_TOTAL
+
+logger = setup_logger("wamid_dedup")
+
+WAMID_CACHE_SIZE = int(os.getenv("WAMID_CACHE_SIZE", "10000"))
+
+
+class WamidDeduplicator:
+    """
+    Drops redelivered inbound messages, keyed on the WhatsApp message id (wamid).
+
+    A bounded LRU of recently stored wamids answers most redeliveries without
+    touching the database; misses fall back to an indexed lookup on
+    Message.external_id. Concurrent deliveries that both pass the check are
+    resolved by `insert_message`, which inserts with ON CONFLICT DO NOTHING.
+    """
+
+    def __init__(self, capacity: int = WAMID_CACHE_SIZE):
+        self.capacity = capacity
+        self._seen = OrderedDict()
+
+    def remember(self, wamid: Optional[str]):
+        if not wamid:
+            return
+        self._seen[wamid] = True
+        self._seen.move_to_end(wamid)
+        while len(self._seen) > self.capacity:
+            self._seen.popitem(last=False)
+
+    def clear(self):
+        self._seen.clear()
+
+    async def duplicates(self, db: AsyncSession, wamids) -> set:
+        """Return the subset of `wamids` already stored (one query for the LRU misses)."""
+        wamids = {w for w in wamids if w}
+        found = set()
+        for wamid in wamids:
+            if wamid in self._seen:
+                self._seen.move_to_end(wamid)
+                found.add(wamid)
+        if found:
+            WEBHOOK_DEDUPED_TOTAL.labels(layer="memory").inc(len(found))
+
+        missing = wamids - found
+        if missing:
+            result = await db.execute(select(Message.external_id).filter(Message.external_id.in_(missing)))
+            stored = set(result.scalars().all())
+            for wamid in stored:
+                self.remember(wamid)
+            if stored:
+                WEBHOOK_DEDUPED_TOTAL.labels(layer="database").inc(len(stored))
+            found |= stored
+        return found
+
+    async def is_duplicate(self, db: AsyncSession, wamid: Optional[str]) -> bool:
+        return bool(wamid) and wamid in await self.duplicates(db, [wamid])
+
+    async def insert_message(self, db: AsyncSession, **values) -> Optional[Message]:
+        """
+        Insert an inbound message unless its external_id already exists.
+        Returns the stored Message, or None when another delivery won the race.
+        Call `remember` once the insert is committed.
+        """
+        wamid = values.get("external_id")
+        if not wamid:
+            message = Message(**values)
+            db.add(message)
+            await db.flush()
+            return message
+
+        insert = dialect_insert(db)
+        if insert is not None:
+            # ORM-enabled upsert: RETURNING yields the Message entity (no extra SELECT)
+            message = await db.scalar(
+                insert(Message).values(**values)
+                .on_conflict_do_nothing(index_elements=[Message.external_id])
+                .returning(Message)
+            )
+        else:
+            message = Message(**values)
+            try:
+                async with db.begin_nested():
+                    db.add(message)
+            except IntegrityError:
+                message = None
+
+        if message is None:
+            WEBHOOK_DEDUPED_TOTAL.labels(layer="conflict").inc()
+            logger.info(f"Duplicate delivery of {wamid} ignored (concurrent insert)")
+            return None
+        return message
+
+
+wamid_dedup = WamidDeduplicator()
@@ -1,10 +1,41 @@
 import abc
 import httpx
 import json
+import os
+import time
+from typing import Optional
 from logger import setup_logger
+from services.driver_registry import DriverRegistry, driver_registry, fingerprint
+from services.metrics import OUTBOUND_SEND_LATENCY_MS
 
 logger = setup_logger("whatsapp_service")
 
+# Overridable for staging and for the local stub server (scripts/stub_graph_api.py)
+META_GRAPH_API_BASE = os.getenv("META_GRAPH_API_BASE", "https://graph.facebook.com/v23.0").rstrip("/")
+
+class SendError(Exception):
+    """
+    A message the channel did not accept. `status_code` is the HTTP status
+    (None for timeouts and connection errors); `retryable` tells the outbound
+    queue whether another attempt can succeed (timeouts, 429, 5xx) or the
+    message should fail right away (other 4xx, missing credentials).
+    """
+    def __init__(self, message: str, status_code: Optional[int] = None, retryable: bool = True):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+
+    @classmethod
+    def from_response(cls, response: httpx.Response) -> "SendError":
+        try:
+            error = response.json().get("error") or {}
+            detail = error.get("message") or response.text
+        except (ValueError, AttributeError):
+            detail = response.text
+        status = response.status_code
+        return cls(f"HTTP {status}: {detail[:500]}", status_code=status, retryable=status == 429 or status >= 500)
+
+
 class BaseWhatsApp(abc.ABC):
     @abc.abstractmethod
     async def send_message(self, to: str, text: str, media_url: str = None, media_type: str = None) -> bool:
@@ -22,16 +53,20 @@ class MockWhatsAppDriver(BaseWhatsApp):
 class MetaWhatsAppDriver(BaseWhatsApp):
     """
     Real Meta Graph API driver for production delivery.
+    Sends through a pooled client leased from `registry` (the driver
+    registry) when given, otherwise through a one-off client per message.
     """
-    def __init__(self, token: str, phone_id: str):
+    def __init__(self, token: str, phone_id: str, registry: Optional[DriverRegistry] = None):
         self.token = token
         self.phone_id = phone_id
-        self.base_url = f"https://graph.facebook.com/v23.0/{phone_id}/messages"
+        self.base_url = f"{META_GRAPH_API_BASE}/{phone_id}/messages"
+        self.registry = registry
 
-    async def send_message(self, to: str, text: str, media_url: str = None, media_type: str = None) -> bool:
+    async def send_message(self, to: str, text: str, media_url: str = None, media_type: str = None) -> str | bool:
+        """Send a text message and return its wamid; raises SendError when Meta does not accept it."""
         if not self.token or not self.phone_id:
             logger.error("Meta Driver initialized without Token or Phone ID")
-            return False
+            raise SendError("WhatsApp driver is missing its API token or phone number id", retryable=False)
 
         headers = {
             "Authorization": f"Bearer {self.token}",
@@ -49,29 +84,48 @@ class MetaWhatsAppDriver(BaseWhatsApp):
             "text": {"preview_url": False, "body": text}
         }
 
+        start = time.perf_counter()
+        status = "error"
+        try:
+            if self.registry is not None:
+                async with self.registry.lease("whatsapp", self.token, self.phone_id) as client:
+                    response = await client.post(self.base_url, headers=headers, json=payload)
+            else:
+                async with httpx.AsyncClient() as client:
+                    response = await client.post(self.base_url, headers=headers, json=payload)
+            status = str(response.status_code)
+        except httpx.TimeoutException as e:
+            status = "timeout"
+            logger.error(f"[META SEND ERROR] Timeout: {e!r}")
+            raise SendError(f"Timeout talking to the WhatsApp API ({type(e).__name__})") from e
+        except httpx.HTTPError as e:
+            logger.error(f"[META SEND ERROR] {e!r}")
+            raise SendError(f"Could not reach the WhatsApp API: {e}") from e
+        finally:
+            OUTBOUND_SEND_LATENCY_MS.labels(channel="whatsapp", status=status).observe((time.perf_counter() - start) * 1000)
+
+        if response.status_code != 200:
+            logger.error(f"[META SEND FAIL] {response.status_code}: {response.text}")
+            raise SendError.from_response(response)
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(self.base_url, headers=headers, json=payload)
-                if response.status_code == 200:
-                    resp_data = response.json()
-                    wamid = resp_data.get("messages", [{}])[0].get("id")
-                    logger.info(f"[META SEND SUCCESS] To: {to} | ID: {wamid}")
-                    return wamid if wamid else True
-                else:
-                    logger.error(f"[META SEND FAIL] {response.status_code}: {response.text}")
-                    return False
-        except Exception as e:
-            logger.error(f"[META SEND ERROR] {e}")
-            return False
+            wamid = response.json().get("messages", [{}])[0].get("id")
+        except (ValueError, AttributeError, IndexError):
+            wamid = None # Accepted all the same; retrying would send it twice
+        logger.info(f"[META SEND SUCCESS] To: {to} | ID: {wamid}")
+        return wamid if wamid else True
 
 class WhatsAppService:
     @staticmethod
-    def get_driver(config_dict: dict) -> BaseWhatsApp:
+    def get_driver(config_dict: dict, registry=driver_registry) -> BaseWhatsApp:
+        """Driver for the configured credentials, reused across sends (see services/driver_registry.py)."""
         driver_type = config_dict.get("whatsapp_driver", "mock")
         
         if driver_type == "meta":
             token = config_dict.get("whatsapp_api_token")
             phone_id = config_dict.get("whatsapp_phone_id") # Note: need to add this to models
-            return MetaWhatsAppDriver(token, phone_id)
+            return registry.get(
+                ("whatsapp", fingerprint(driver_type, token, phone_id, META_GRAPH_API_BASE)),
+                lambda: MetaWhatsAppDriver(token, phone_id, registry=registry)
+            )
         
-        return MockWhatsAppDriver()
+        return registry.get(("whatsapp", "mock"), MockWhatsAppDriver)
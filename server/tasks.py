@@ -2,16 +2,18 @@ from celery_app import celery_app
 import asyncio
 from logger import setup_logger
 from database import AsyncSessionLocal
-from models import Message
-from sqlalchemy import select
-import json
+from services.broadcast_bus import get_broadcast_bus
+from services.scheduler import send_due_messages, status_update_event
 
 logger = setup_logger("tasks")
 
 @celery_app.task(name="tasks.delayed_auto_send_task")
 def delayed_auto_send_task(msg_id: int):
     """
-    Celery task to handle delayed message sending.
+    Celery backend of the delayed auto-send scheduler (SCHEDULER_BACKEND=celery).
+    Enqueued with a countdown by services.scheduler.dispatch_scheduled; the
+    claim is the same as the in-process timer loop, so a draft that was
+    approved, edited or already sent in the meantime is left alone.
     Note: Celery tasks are usually synchronous wrappers around async code 
     if the rest of the app is async.
     """
@@ -20,18 +22,27 @@ def delayed_auto_send_task(msg_id: int):
     # Run async logic in a sync wrapper for Celery
     return asyncio.run(_send_message_async_task(msg_id))
 
+async def _publish(messages):
+    bus = get_broadcast_bus()
+    try:
+        for message, route in messages:
+            await bus.publish(message, route)
+    except Exception as e:
+        logger.error(f"CELERY: Could not publish broadcast: {e}")
+    finally:
+        await bus.stop()
+
 async def _send_message_async_task(msg_id: int):
     async with AsyncSessionLocal() as db:
-        result = await db.execute(select(Message).filter(Message.id == msg_id))
-        msg = result.scalars().first()
-        
-        if msg and msg.status == "pending":
-            logger.info(f"CELERY: Auto-sending Message {msg_id}")
-            msg.status = "sent"
-            await db.commit()
-            
-            # Note: Broadcasters (WebSockets) might not work directly from a separate 
-            # Celery worker process unless using a Redis Pub/Sub for the manager.
-            # This is a modernization step that would require Redis integration for WebSockets too.
-            return True
+        rows = await send_due_messages(db, message_ids=[msg_id], backend="celery")
+
+    if rows:
+        logger.info(f"CELERY: Queued Message {msg_id} for auto-send")
+        # Reach the dashboards connected to the API workers through the broadcast bus
+        await _publish([
+            (status_update_event(row),
+             {"event_type": "message_update", "conversation_id": row.conversation_id, "tenant_id": row.tenant_id})
+            for row in rows
+        ])
+        return True
     return False
@@ -0,0 +1,298 @@
+import asyncio
+import datetime
+import json
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+os.environ["TESTING"] = "true"
+
+from main import app
+from sqlalchemy import select, update
+from database import Base, get_async_db
+from models import Client, Conversation, Message, AuditLog, Order, Product, User
+from routers.auth import get_current_user
+from services import conversation_summary
+from services import outbound_dispatcher as outbound_dispatcher_module
+
+# Setup In-Memory Async DB for Testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with TestingSessionLocal() as session:
+        yield session
+
+@pytest.fixture
+def client():
+    # Scoped override so other test modules keep their own databases
+    previous = app.dependency_overrides.get(get_async_db)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    yield TestClient(app)
+    if previous:
+        app.dependency_overrides[get_async_db] = previous
+    else:
+        app.dependency_overrides.pop(get_async_db, None)
+
+async def seed_conversations():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    base = datetime.datetime(2026, 1, 1, 12, 0, 0)
+    async with TestingSessionLocal() as session:
+        for i in range(5):
+            c = Client(phone_number=f"50600000{i}", name=f"Client {i}")
+            session.add(c)
+            await session.flush()
+            # An older, inactive conversation that must not be listed
+            session.add(Conversation(client_id=c.id, is_active=False, started_at=base - datetime.timedelta(days=1)))
+            conv = Conversation(client_id=c.id, started_at=base, is_pinned=(i == 0), channel="email" if i == 4 else "whatsapp")
+            session.add(conv)
+            await session.flush()
+            session.add(Message(conversation_id=conv.id, sender="user", content=f"hola {i}", timestamp=base + datetime.timedelta(minutes=i)))
+            if i == 2:
+                session.add(Message(conversation_id=conv.id, sender="agent", content="borrador", status="pending",
+                                    timestamp=base + datetime.timedelta(minutes=10)))
+        await conversation_summary.rebuild_all(session)
+        await session.commit()
+
+def test_sidebar_listing_shape_and_order(client):
+    asyncio.run(seed_conversations())
+
+    response = client.get("/conversations/")
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data) == 5
+    # Pinned first, then most recent activity
+    assert data[0]["client_name"] == "Client 0"
+    assert data[1]["client_name"] == "Client 2"
+    assert data[1]["last_message"] == "borrador"
+    assert data[1]["has_pending"] is True
+    assert all(not row["has_pending"] for row in data if row["client_name"] != "Client 2")
+
+def test_sidebar_cursor_pagination_and_filters(client):
+    asyncio.run(seed_conversations())
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/conversations/", params=params)
+        assert response.status_code == 200
+        seen.extend(row["id"] for row in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    full = [row["id"] for row in client.get("/conversations/").json()]
+    assert seen == full
+
+    pending = client.get("/conversations/", params={"has_pending": True}).json()
+    assert [row["client_name"] for row in pending] == ["Client 2"]
+
+    email = client.get("/conversations/", params={"channel": "email"}).json()
+    assert [row["client_name"] for row in email] == ["Client 4"]
+
+    pinned = client.get("/conversations/", params={"pinned": False}).json()
+    assert len(pinned) == 4
+
+async def _add_user_message(conversation_id, content):
+    async with TestingSessionLocal() as session:
+        msg = Message(conversation_id=conversation_id, sender="user", content=content,
+                      timestamp=datetime.datetime(2026, 1, 2, 9, 0, 0))
+        session.add(msg)
+        await session.flush()
+        await conversation_summary.record_message(session, msg)
+        await session.commit()
+
+def test_summary_projection_is_maintained_on_write(client):
+    asyncio.run(seed_conversations())
+    rows = {row["client_name"]: row for row in client.get("/conversations/").json()}
+    target = rows["Client 3"]["id"]
+
+    # A new customer message moves the conversation up and bumps unread
+    asyncio.run(_add_user_message(target, "sigue ahi?"))
+    data = client.get("/conversations/").json()
+    assert data[1]["id"] == target
+    assert data[1]["last_message"] == "sigue ahi?"
+    assert data[1]["unread_count"] == 2
+
+    assert client.post(f"/conversations/{target}/read").status_code == 200
+    data = client.get("/conversations/").json()
+    assert data[1]["unread_count"] == 0
+
+    # Archiving goes through the router and is reflected immediately
+    assert client.post(f"/conversations/{target}/archive").status_code == 200
+    assert target not in [row["id"] for row in client.get("/conversations/", params={"archived": False}).json()]
+
+    # Deleting the latest conversation promotes the client's older one
+    assert client.delete(f"/conversations/{target}").status_code == 200
+    data = client.get("/conversations/").json()
+    assert len(data) == 5
+    assert target not in [row["id"] for row in data]
+
+async def seed_history(count):
+    await seed_conversations()
+    base = datetime.datetime(2026, 2, 1, 8, 0, 0)
+    async with TestingSessionLocal() as session:
+        conv = Conversation(client_id=1, started_at=base)
+        session.add(conv)
+        await session.flush()
+        session.add_all([
+            Message(conversation_id=conv.id, sender="user", content=f"m{i}",
+                    metadata_json='{"intent": "x"}', timestamp=base + datetime.timedelta(seconds=i // 2))
+            for i in range(count)
+        ])
+        await session.commit()
+        return conv.id
+
+def test_message_history_windows(client):
+    conv_id = asyncio.run(seed_history(25))
+    url = f"/conversations/{conv_id}/messages"
+
+    latest = client.get(url, params={"limit": 10})
+    assert [m["content"] for m in latest.json()] == [f"m{i}" for i in range(15, 25)]
+    cursor = latest.headers["X-Next-Cursor"]
+
+    # Scroll back until the beginning; equal timestamps are split by id
+    seen = [m["content"] for m in latest.json()]
+    while cursor:
+        page = client.get(url, params={"limit": 10, "before_id": cursor})
+        assert page.status_code == 200
+        seen = [m["content"] for m in page.json()] + seen
+        cursor = page.headers.get("X-Next-Cursor")
+    assert seen == [f"m{i}" for i in range(25)]
+
+    first_id = client.get(url, params={"limit": 1000}).json()[0]["id"]
+    newer = client.get(url, params={"limit": 5, "after_id": first_id, "include_metadata": False})
+    assert [m["content"] for m in newer.json()] == [f"m{i}" for i in range(1, 6)]
+    assert all(m["metadata_json"] is None for m in newer.json())
+    assert "X-Next-Cursor" in newer.headers
+
+    # The dashboard runs on another origin and must be able to read the cursor
+    cross_origin = client.get(url, params={"limit": 10}, headers={"Origin": "http://localhost:5173"})
+    assert "x-next-cursor" in cross_origin.headers["access-control-expose-headers"].lower()
+
+    assert client.get(url, params={"before_id": 1, "after_id": 2}).status_code == 400
+    assert client.get(url, params={"before_id": 999999}).status_code == 404
+
+class FakeAdapter:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, to, text, media_url=None, media_type=None):
+        self.sent.append((to, text))
+        return f"wamid.bulk{len(self.sent)}"
+
+async def seed_drafts():
+    await seed_conversations()
+    async with TestingSessionLocal() as session:
+        session.add(Product(id=7, name="Widget", price=1500, stock_quantity=10))
+        order = {"requires_order_creation": True, "order_details": [{"product_id": 7, "quantity": 2, "price": 1}]}
+        drafts = [
+            Message(conversation_id=2, sender="agent", content="uno", status="pending", is_ai_generated=True,
+                    metadata_json=json.dumps(order)),
+            Message(conversation_id=4, sender="agent", content="dos", status="pending", is_ai_generated=True),
+            Message(conversation_id=4, sender="agent", content="ya enviado", status="sent", is_ai_generated=True),
+        ]
+        session.add_all(drafts)
+        await session.flush()
+        await conversation_summary.refresh_summaries(session, [2, 4])
+        await session.commit()
+        return [m.id for m in drafts]
+
+async def _approval_state(ids):
+    async with TestingSessionLocal() as session:
+        statuses = dict((await session.execute(select(Message.id, Message.status).filter(Message.id.in_(ids)))).all())
+        audits = (await session.execute(select(AuditLog.resource).filter(AuditLog.action == "APPROVE_MESSAGE"))).scalars().all()
+        orders = (await session.execute(select(Order.total_amount))).scalars().all()
+        return statuses, sorted(audits), orders
+
+def test_bulk_approve_sends_pending_drafts(client, monkeypatch):
+    first, second, already_sent = asyncio.run(seed_drafts())
+    adapter = FakeAdapter()
+    monkeypatch.setattr(outbound_dispatcher_module.MessagingHubService, "get_adapter",
+                        staticmethod(lambda channel, config: adapter))
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, username="operator")
+    try:
+        response = client.post("/conversations/messages/bulk-action",
+                               json={"message_ids": [first, second, already_sent, 999], "action": "approve"})
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert response.status_code == 200
+    assert response.json() == {"status": "success", "action": "approve", "count": 2, "skipped": [already_sent, 999]}
+    statuses, audits, orders = asyncio.run(_approval_state([first, second, already_sent]))
+    assert statuses == {first: "sent", second: "sent", already_sent: "sent"}
+    assert audits == [f"Message {first}", f"Message {second}"]
+    # Catalog price, not the one in the draft
+    assert orders == [3000]
+    assert sorted(text for _, text in adapter.sent) == ["dos", "uno"]
+
+    # Only the seeded draft that was not part of the batch is still waiting for review
+    pending = client.get("/conversations/", params={"has_pending": True}).json()
+    assert [row["client_name"] for row in pending] == ["Client 2"]
+
+def test_approve_is_rejected_once_the_draft_left_pending(client, monkeypatch):
+    first, second, already_sent = asyncio.run(seed_drafts())
+    adapter = FakeAdapter()
+    monkeypatch.setattr(outbound_dispatcher_module.MessagingHubService, "get_adapter",
+                        staticmethod(lambda channel, config: adapter))
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, username="operator")
+    try:
+        assert client.post(f"/conversations/messages/{first}/approve").status_code == 200
+        # A repeated click must neither re-send the message nor create its order again
+        repeated = client.post(f"/conversations/messages/{first}/approve")
+        sent = client.post(f"/conversations/messages/{already_sent}/approve")
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert (repeated.status_code, sent.status_code) == (409, 409)
+    statuses, audits, orders = asyncio.run(_approval_state([first, second, already_sent]))
+    assert statuses == {first: "sent", second: "pending", already_sent: "sent"}
+    assert audits == [f"Message {first}"]
+    assert orders == [3000]
+    assert [text for _, text in adapter.sent] == ["uno"]
+
+def test_repeated_bulk_approval_creates_one_order_and_one_send(client, monkeypatch):
+    first, second, already_sent = asyncio.run(seed_drafts())
+    adapter = FakeAdapter()
+    monkeypatch.setattr(outbound_dispatcher_module.MessagingHubService, "get_adapter",
+                        staticmethod(lambda channel, config: adapter))
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, username="operator")
+    try:
+        body = {"message_ids": [first, second], "action": "approve"}
+        responses = [client.post("/conversations/messages/bulk-action", json=body) for _ in range(2)]
+        single = client.post(f"/conversations/messages/{first}/approve")
+    finally:
+        app.dependency_overrides.pop(get_current_user, None)
+
+    assert responses[0].json()["count"] == 2
+    assert responses[1].json() == {"status": "no_op", "action": "approve", "count": 0, "skipped": [first, second]}
+    assert single.status_code == 409
+    statuses, audits, orders = asyncio.run(_approval_state([first, second, already_sent]))
+    assert audits == [f"Message {first}", f"Message {second}"]
+    assert orders == [3000]
+    assert sorted(text for _, text in adapter.sent) == ["dos", "uno"]
+
+@pytest.mark.asyncio
+async def test_approval_claim_is_conditional():
+    from services.outbound_dispatcher import enqueue_pending
+    first, second, already_sent = await seed_drafts()
+    async with TestingSessionLocal() as session:
+        # A scheduler or another operator queued the first draft after this request read it as pending
+        await session.execute(update(Message).where(Message.id == first).values(status="queued"))
+        assert await enqueue_pending(session, [first, second, already_sent]) == [second]
+        await session.rollback()
@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+os.environ["TESTING"] = "true"
+
+from main import app
+from sqlalchemy import select, func
+from database import Base, get_async_db
+from models import AIDataset, KnowledgeChunk, User
+from routers.auth import get_admin_user
+from services import knowledge_service
+
+# Setup In-Memory Async DB for Testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with TestingSessionLocal() as session:
+        yield session
+
+async def reset_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+async def count_rows():
+    async with TestingSessionLocal() as session:
+        datasets = (await session.execute(select(func.count(AIDataset.id)))).scalar()
+        chunks = (await session.execute(select(func.count(KnowledgeChunk.id)))).scalar()
+        return datasets, chunks
+
+@pytest.fixture
+def client():
+    # Scoped overrides so other test modules keep their own databases
+    previous = {dep: app.dependency_overrides.get(dep) for dep in (get_async_db, get_admin_user)}
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_admin_user] = lambda: User(id=1, username="admin", role="admin")
+    yield TestClient(app)
+    for dep, override in previous.items():
+        if override:
+            app.dependency_overrides[dep] = override
+        else:
+            app.dependency_overrides.pop(dep, None)
+
+def test_upload_dataset_ingests_csv(client):
+    asyncio.run(reset_db())
+    csv_data = "sku,name\n" + "\n".join(f"{i},Producto {i}" for i in range(50))
+    response = client.post("/admin/datasets/upload", params={"name": "Catalog", "data_type": "csv"},
+                           files={"file": ("catalog.csv", csv_data.encode("utf-8"), "text/csv")})
+    assert response.status_code == 200
+    assert response.json()["rows"] == 50
+    datasets, chunks = asyncio.run(count_rows())
+    assert datasets == 1
+    assert chunks == response.json()["chunks"]
+
+@pytest.mark.parametrize("batch_chunks", [knowledge_service.INGEST_BATCH_CHUNKS, 5])
+def test_failed_upload_leaves_no_partial_dataset(client, monkeypatch, batch_chunks):
+    asyncio.run(reset_db())
+    # With small batches several chunk batches are committed before the broken record is found
+    monkeypatch.setattr(knowledge_service, "INGEST_BATCH_CHUNKS", batch_chunks)
+    csv_data = "sku,name\n" + "\n".join(f"{i},Producto {i}" for i in range(3000)) + '\n3000,"Sin cerrar'
+    response = client.post("/admin/datasets/upload", params={"name": "Catalog", "data_type": "csv"},
+                           files={"file": ("catalog.csv", csv_data.encode("utf-8"), "text/csv")})
+    assert response.status_code == 400
+    assert "unterminated quoted field" in response.json()["detail"]
+    assert asyncio.run(count_rows()) == (0, 0)
+
+def test_streamed_dataset_preview_cannot_replace_its_content(client):
+    asyncio.run(reset_db())
+    csv_data = "sku,name\n" + "\n".join(f"{i},Producto {i}" for i in range(500))
+    upload = client.post("/admin/datasets/upload", params={"name": "Catalog", "data_type": "csv"},
+                         files={"file": ("catalog.csv", csv_data.encode("utf-8"), "text/csv")}).json()
+    dataset = next(ds for ds in client.get("/admin/datasets").json() if ds["id"] == upload["dataset_id"])
+    assert knowledge_service.KnowledgeService.is_truncated_preview(dataset["content"])
+
+    edited = client.put(f"/admin/datasets/{dataset['id']}",
+                        json={"name": "Catalog", "data_type": "csv", "content": dataset["content"] + "\nsku: 999"})
+    assert edited.status_code == 409
+    # Renaming keeps the stored preview and does not touch the index
+    renamed = client.put(f"/admin/datasets/{dataset['id']}",
+                         json={"name": "Catálogo 2026", "data_type": "csv", "content": dataset["content"]})
+    assert renamed.status_code == 200
+    assert asyncio.run(count_rows()) == (1, upload["chunks"])
@@ -0,0 +1,173 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select, func, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '../'))
+os.environ["TESTING"] = "true"
+
+from main import app
+from database import Base, get_async_db
+from models import Client, Message
+from routers import whatsapp
+from services.wamid_dedup import wamid_dedup
+
+# Setup In-Memory Async DB for Testing
+TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+
+engine = create_async_engine(
+    TEST_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool,
+)
+TestingSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
+
+async def override_get_async_db():
+    async with TestingSessionLocal() as session:
+        yield session
+
+async def reset_db():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+@pytest.fixture
+def client(monkeypatch):
+    asyncio.run(reset_db())
+    wamid_dedup.clear()
+    calls = []
+
+    async def fake_generate_response(client_id, user_message, db=None, context=None, commit=True):
+        calls.append(user_message)
+        return {"content": "Con gusto", "confidence": 50, "metadata": {"intent": "General"}}
+
+    monkeypatch.setattr(whatsapp.ai_agent, "generate_response", fake_generate_response)
+    previous = app.dependency_overrides.get(get_async_db)
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    test_client = TestClient(app)
+    test_client.llm_calls = calls
+    yield test_client
+    if previous:
+        app.dependency_overrides[get_async_db] = previous
+    else:
+        app.dependency_overrides.pop(get_async_db, None)
+
+def meta_payload(wamid, text="Hola, tienen envios?"):
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {
+            "contacts": [{"profile": {"name": "Ana"}}],
+            "messages": [{"id": wamid, "from": "50688887777", "type": "text", "text": {"body": text}}]
+        }}]}]
+    }
+
+async def count(model):
+    async with TestingSessionLocal() as session:
+        return (await session.execute(select(func.count(model.id)))).scalar()
+
+def test_redelivered_wamid_is_processed_once(client):
+    first = client.post("/whatsapp/webhook", json=meta_payload("wamid.A1"))
+    assert first.json() == {"reply": "Con gusto"}
+
+    # Meta retry: answered from the in-memory LRU
+    again = client.post("/whatsapp/webhook", json=meta_payload("wamid.A1"))
+    assert again.json() == {"status": "ok", "detail": "duplicate"}
+
+    # After a restart (empty LRU) the database lookup catches it
+    wamid_dedup.clear()
+    again = client.post("/whatsapp/webhook", json=meta_payload("wamid.A1"))
+    assert again.json()["detail"] == "duplicate"
+
+    assert client.llm_calls == ["Hola, tienen envios?"]
+    assert asyncio.run(count(Client)) == 1
+    # One user message and one AI reply
+    assert asyncio.run(count(Message)) == 2
+
+    # Simulator payloads without an id are never deduplicated
+    client.post("/whatsapp/webhook", json={"message": "hola", "sender": "5061"})
+    client.post("/whatsapp/webhook", json={"message": "hola", "sender": "5061"})
+    assert len(client.llm_calls) == 3
+
+async def _insert_twice():
+    async with TestingSessionLocal() as session:
+        first = await wamid_dedup.insert_message(session, conversation_id=None, sender="user",
+                                                 content="a", external_id="wamid.race")
+        second = await wamid_dedup.insert_message(session, conversation_id=None, sender="user",
+                                                  content="b", external_id="wamid.race")
+        await session.commit()
+        return first, second
+
+def test_concurrent_insert_of_same_wamid_is_ignored(client):
+    first, second = asyncio.run(_insert_twice())
+    assert first is not None and first.content == "a"
+    assert second is None
+    assert asyncio.run(count(Message)) == 1
+
+def test_batched_meta_payload_processes_every_message_and_status(client):
+    client.post("/whatsapp/webhook", json=meta_payload("wamid.B0", text="primero"))
+
+    payload = {
+        "object": "whatsapp_business_account",
+        "entry": [
+            {"changes": [{"value": {
+                "contacts": [{"wa_id": "50611110000", "profile": {"name": "Luis"}},
+                             {"wa_id": "50622220000", "profile": {"name": "Marta"}}],
+                "messages": [
+                    {"id": "wamid.B1", "from": "50611110000", "type": "text", "text": {"body": "uno"}},
+                    {"id": "wamid.B2", "from": "50622220000", "type": "text", "text": {"body": "dos"}},
+                    {"id": "wamid.B1", "from": "50611110000", "type": "text", "text": {"body": "uno"}}
+                ]
+            }}]},
+            {"changes": [
+                {"value": {"messages": [
+                    {"id": "wamid.B3", "from": "50688887777", "type": "text", "text": {"body": "tres"}}
+                ]}},
+                {"value": {"statuses": [
+                    {"id": "wamid.B0", "status": "delivered"},
+                    {"id": "wamid.B0", "status": "read"},
+                    {"id": "wamid.unknown", "status": "read"}
+                ]}}
+            ]}
+        ]
+    }
+    response = client.post("/whatsapp/webhook", json=payload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ok"
+    assert [r["reply"] for r in data["results"]] == ["Con gusto"] * 3
+    assert client.llm_calls == ["primero", "uno", "dos", "tres"]
+
+    async def check():
+        async with TestingSessionLocal() as session:
+            names = (await session.execute(select(Client.name).order_by(Client.id))).scalars().all()
+            status = (await session.execute(select(Message.status).filter(Message.external_id == "wamid.B0"))).scalar()
+            return names, status
+    names, status = asyncio.run(check())
+    assert names == ["Ana", "Luis", "Marta"]
+    assert status == "read"
+
+    statuses_only = {"object": "whatsapp_business_account", "entry": [{"changes": [{"value": {"statuses": [
+        {"id": "wamid.B1", "status": "delivered"}
+    ]}}]}]}
+    assert client.post("/whatsapp/webhook", json=statuses_only).json() == {"status": "ok"}
+    assert len(client.llm_calls) == 4
+
+def test_one_inbound_message_commits_twice(client):
+    commits = []
+    listener = lambda conn: commits.append(conn)
+    event.listen(engine.sync_engine, "commit", listener)
+    try:
+        # New client + new conversation + user message, then AI reply + audit
+        assert client.post("/whatsapp/webhook", json=meta_payload("wamid.C1")).json() == {"reply": "Con gusto"}
+        assert len(commits) == 2
+        commits.clear()
+        # Blocked message: ingest, then the violation flag
+        response = client.post("/whatsapp/webhook", json=meta_payload("wamid.C2", text="maldito gobierno"))
+        assert response.json()["status"] == "blocked"
+        assert len(commits) == 2
+    finally:
+        event.remove(engine.sync_engine, "commit", listener)
@@ -6,6 +6,7 @@ import unittest
 sys.path.append(os.path.join(os.path.dirname(__file__), '../server'))
 
 from guardrail.engine import GuardrailEngine
+from guardrail.matcher import AhoCorasickMatcher, get_matcher
 
 class TestGuardrailEngine(unittest.TestCase):
     
@@ -38,5 +39,48 @@ class TestGuardrailEngine(unittest.TestCase):
         self.assertEqual(result.classification, "out_of_scope")
         self.assertIn("pizza", result.triggered_keywords)
 
+    def test_word_boundaries_avoid_false_positives(self):
+        # "ley" inside "leyenda", "marcha" inside "marchante"
+        result = GuardrailEngine.prescan_message("Me encanta la leyenda del marchante de café")
+        self.assertEqual(result.classification, "in_scope")
+
+    def test_accents_and_case_are_ignored(self):
+        result = GuardrailEngine.prescan_message("Necesito un MEDICO ya")
+        self.assertEqual(result.classification, "security_violation")
+        self.assertEqual(result.triggered_keywords, ["médico"])
+
+        result = GuardrailEngine.prescan_message("¿Cuál es su posición en las elecciones?")
+        self.assertIn("elección", result.triggered_keywords)
+
+    def test_stems_and_phrases(self):
+        result = GuardrailEngine.prescan_message("No me hablen de Política ni de gases lacrimógenos")
+        self.assertEqual(result.triggered_keywords, ["politic"])
+        result = GuardrailEngine.prescan_message("Usaron gas lacrimógeno")
+        self.assertEqual(result.triggered_keywords, ["gas lacrim"])
+
+    def test_business_topics_match_plurals(self):
+        result = GuardrailEngine.prescan_message("¿Hacen pizzas o hamburguesas?", forbidden_topics=["pizza", "Hamburguesa"])
+        self.assertEqual(result.classification, "out_of_scope")
+        self.assertEqual(result.triggered_keywords, ["pizza", "Hamburguesa"])
+
+class TestAhoCorasickMatcher(unittest.TestCase):
+
+    def test_matches_like_substring_scans(self):
+        keywords = {"a": ["he", "she", "hers", "His"], "b": ["is", "ers", "x"]}
+        matcher = AhoCorasickMatcher(keywords)
+        for text in ["ushers", "this is HIS", "", "hhhe", "xx"]:
+            expected = {cat: [kw for kw in kws if kw.lower() in text.lower()] for cat, kws in keywords.items()}
+            self.assertEqual(matcher.match(text), expected)
+
+    def test_keyword_order_is_preserved(self):
+        matcher = AhoCorasickMatcher({"topics": ["pizza", "sushi", "café"]})
+        self.assertEqual(matcher.match("Café, sushi y PIZZA")["topics"], ["pizza", "sushi", "café"])
+
+    def test_compiled_once_per_keyword_set(self):
+        static = {"security": ["huelga"]}
+        first = get_matcher(static, ["pizza"])
+        self.assertIs(get_matcher(static, ["pizza"]), first)
+        self.assertIsNot(get_matcher(static, ["pizza", "sushi"]), first)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,11 +1,15 @@
+import json
 import pytest
 import os
 import sys
+from types import SimpleNamespace
 
 # Add server directory to path
 sys.path.append(os.path.join(os.getcwd(), "server"))
 
+from services import ai_agent as ai_agent_module
 from services.ai_agent import AIAgent
+from services.response_cache import ResponseCache
 
 @pytest.mark.asyncio
 async def test_ai_unconfigured_response():
@@ -21,3 +25,155 @@ def test_intent_mapping_logic():
     context = agent._build_intent_mapping_context(rules)
     assert "Intent 'Price'" in context
     assert "cost, price" in context
+
+@pytest.mark.asyncio
+async def test_generate_response_reuses_message_context(monkeypatch):
+    from guardrail.engine import GuardrailEngine, GuardrailResult
+    from services.message_context import MessageContext
+
+    agent = AIAgent()
+
+    async def no_config_reads(db):
+        raise AssertionError("config must come from the context")
+
+    def no_rescan(*args, **kwargs):
+        raise AssertionError("guardrail must come from the context")
+
+    monkeypatch.setattr(agent, "get_active_config", no_config_reads)
+    monkeypatch.setattr(GuardrailEngine, "prescan_message", no_rescan)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+
+    config = dict(agent._default_config(), is_configured=True, openai_api_base="http://llm.invalid/v1")
+    context = MessageContext("50688887777", "Hola", config,
+                             GuardrailResult(classification="in_scope", triggered_keywords=[], is_safe=True))
+    res = await agent.generate_response("50688887777", "Hola", context=context)
+    assert res["metadata"]["intent"] == "system_error"
+
+def test_reply_extractor_handles_any_chunking():
+    from services.draft_stream import ReplyExtractor
+
+    reply = 'Hola "Ana"\nTenemos café ☕ y té 🍵 \\ listo'
+    envelope = '```json\n' + json.dumps({"domain": "Commercial/Logistics", "reply": reply, "confidence_self_assessment": 92}) + '\n```'
+    for size in (1, 2, 3, 7, len(envelope)):
+        extractor = ReplyExtractor()
+        out = "".join(extractor.feed(envelope[i:i + size]) for i in range(0, len(envelope), size))
+        assert out == reply
+        assert extractor.done
+
+    # Non-JSON completions are shown as they come (the parser uses them as the reply too)
+    extractor = ReplyExtractor()
+    assert "".join(extractor.feed(c) for c in ["Claro", ", con gusto"]) == "Claro, con gusto"
+
+@pytest.mark.asyncio
+async def test_streamed_generation_pushes_draft_deltas(monkeypatch):
+    import openai
+    from guardrail.engine import GuardrailResult
+    from services import draft_stream
+    from services.message_context import MessageContext
+
+    events = []
+
+    class FakeManager:
+        async def broadcast(self, message, *, event_type=None, conversation_id=None, tenant_id=None):
+            events.append(json.loads(message))
+
+    envelope = json.dumps({"reply": "Sí, tenemos envío gratis.", "primary_intent": "Envio",
+                           "classification": "in_scope", "confidence_self_assessment": 88})
+
+    async def fake_acreate(**kwargs):
+        assert kwargs["stream"] is True
+
+        async def chunks():
+            for i in range(0, len(envelope), 5):
+                yield {"choices": [{"delta": {"content": envelope[i:i + 5]}}]}
+        return chunks()
+
+    monkeypatch.setattr(draft_stream, "manager", FakeManager())
+    monkeypatch.setattr(ai_agent_module, "response_cache", ResponseCache())
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", fake_acreate)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    agent = AIAgent()
+    config = dict(agent._default_config(), is_configured=True, stream_responses=True, auto_respond_threshold=85)
+    context = MessageContext("50688887777", "Hacen envíos?", config,
+                             GuardrailResult(classification="in_scope", triggered_keywords=[], is_safe=True),
+                             conversation=SimpleNamespace(id=42, tenant_id="default"))
+    res = await agent.generate_response("50688887777", "Hacen envíos?", context=context)
+
+    # The final envelope is still parsed for confidence and intent
+    assert res["content"] == "Sí, tenemos envío gratis."
+    assert res["metadata"]["intent"] == "Envio"
+    assert res["confidence"] == 88
+    assert all(e["type"] == "draft_delta" and e["conversation_id"] == 42 for e in events)
+    assert "".join(e["delta"] for e in events) == "Sí, tenemos envío gratis."
+    assert events[-1]["done"] is True
+
+def in_scope_context(agent, message, **config):
+    from guardrail.engine import GuardrailEngine
+    from services.message_context import MessageContext
+
+    config = dict(agent._default_config(), is_configured=True, auto_respond_threshold=85, **config)
+    return MessageContext("50688887777", message, config, GuardrailEngine.prescan_message(message, []))
+
+@pytest.mark.asyncio
+async def test_repeated_question_is_served_from_response_cache(monkeypatch):
+    import openai
+    calls = []
+
+    async def fake_acreate(**kwargs):
+        calls.append(kwargs)
+        envelope = {"reply": "Abrimos de 8am a 6pm.", "primary_intent": "Horario",
+                    "classification": "in_scope", "confidence_self_assessment": 93}
+        return SimpleNamespace(choices=[SimpleNamespace(message={"content": json.dumps(envelope)})],
+                               usage={"total_tokens": 321})
+
+    monkeypatch.setattr(ai_agent_module, "response_cache", ResponseCache())
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", fake_acreate)
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+    first = await AIAgent().generate_response("50611111111", "¿Cuál es el horario?",
+                                              context=in_scope_context(AIAgent(), "¿Cuál es el horario?"))
+    # Another customer, different casing/accents/punctuation
+    agent = AIAgent()
+    second = await agent.generate_response("50622222222", "cual es el HORARIO",
+                                           context=in_scope_context(agent, "cual es el HORARIO"))
+
+    assert len(calls) == 1
+    assert first["metadata"]["cache_hit"] is False
+    assert second["metadata"]["cache_hit"] is True
+    assert second["content"] == "Abrimos de 8am a 6pm."
+    # Confidence rules run again on the hit
+    assert second["confidence"] == 93
+    assert "Cache:" in second["metadata"]["reasoning"]
+    assert second["metadata"]["tokens_used"] == 0
+
+    # A new config version invalidates the entry
+    agent = AIAgent()
+    await agent.generate_response("50633333333", "cual es el horario",
+                                  context=in_scope_context(agent, "cual es el horario", config_version=2))
+    assert len(calls) == 2
+
+def test_response_cache_ttl_lru_and_similarity(monkeypatch):
+    from services import response_cache as cache_module
+
+    clock = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: clock[0])
+
+    cache = ResponseCache(size=2, ttl_seconds=60)
+    cache.store("Tienen envío a Cartago?", (1, 1), {"reply": "Sí"}, 100)
+    cache.store("horario", (1, 1), {"reply": "8 a 6"}, 50)
+    assert cache.lookup("tienen envio a cartago", (1, 1)).result == {"reply": "Sí"}
+    # "horario" is now the least recently used entry
+    cache.store("precio del cafe", (1, 1), {"reply": "₡2000"}, 80)
+    assert cache.lookup("horario", (1, 1)) is None
+    assert len(cache) == 2
+
+    clock[0] += 61
+    assert cache.lookup("precio del café", (1, 1)) is None
+
+    fuzzy = ResponseCache(similarity="jaccard")
+    fuzzy.store("tienen envio gratis a cartago", (1, 1), {"reply": "Sí"}, 100)
+    hit = fuzzy.lookup("envio gratis a cartago tienen?", (1, 1))
+    assert hit is not None and hit.similarity == 1.0
+    assert fuzzy.lookup("tienen envio gratis a limon", (1, 1)) is None
+    assert fuzzy.lookup("tienen envio gratis a cartago", (1, 2)) is None
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from routers.websocket import ConnectionManager
+from services.broadcast_bus import InMemoryBroadcastBus, get_broadcast_bus
+
+class FakeSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        # Unwrap batched frames into the events they carry
+        data = json.loads(message)
+        if isinstance(data, dict) and data.get("type") == "batch":
+            self.sent.extend(data["events"])
+        else:
+            self.sent.append(data)
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_clients_of_every_worker_once():
+    peers = []
+    workers = [ConnectionManager() for _ in range(3)]
+    sockets = []
+    for worker in workers:
+        await worker.attach_bus(InMemoryBroadcastBus(peers))
+        sock = FakeSocket()
+        await worker.connect(sock)
+        sockets.append(sock)
+
+    await workers[0].broadcast(json.dumps("hello"), event_type="new_message")
+    await workers[2].broadcast(json.dumps("bye"), event_type="new_message")
+    await asyncio.sleep(0.1)
+
+    for sock in sockets:
+        assert sock.sent == ["hello", "bye"]
+
+    for worker, sock in zip(workers, sockets):
+        worker.disconnect(sock)
+        await worker.detach_bus()
+    assert peers == []
+
+@pytest.mark.asyncio
+async def test_publish_only_bus_reaches_subscribed_workers():
+    peers = []
+    worker = ConnectionManager()
+    await worker.attach_bus(InMemoryBroadcastBus(peers))
+    sock = FakeSocket()
+    await worker.connect(sock)
+
+    # e.g. a Celery task: publishes without subscribing
+    await InMemoryBroadcastBus(peers).publish(json.dumps("from-task"))
+    await asyncio.sleep(0.1)
+    assert sock.sent == ["from-task"]
+
+    worker.disconnect(sock)
+    await worker.detach_bus()
+
+@pytest.mark.asyncio
+async def test_routing_keys_cross_the_bus():
+    peers = []
+    publisher, receiver = ConnectionManager(), ConnectionManager()
+    await publisher.attach_bus(InMemoryBroadcastBus(peers))
+    await receiver.attach_bus(InMemoryBroadcastBus(peers))
+    sock = FakeSocket()
+    await receiver.connect(sock)
+    receiver.connections[sock].subscribe(conversation_id=7)
+
+    await publisher.broadcast(json.dumps("other"), event_type="new_message", conversation_id=8)
+    await publisher.broadcast(json.dumps("mine"), event_type="new_message", conversation_id=7)
+    await asyncio.sleep(0.1)
+    assert sock.sent == ["mine"]
+
+    receiver.disconnect(sock)
+    await publisher.detach_bus()
+    await receiver.detach_bus()
+
+def test_default_backend_is_in_memory():
+    assert isinstance(get_broadcast_bus("memory"), InMemoryBroadcastBus)
@@ -0,0 +1,70 @@
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import AIConfig, Product
+from services.config_cache import ConfigCache
+
+async def _make_session():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return async_sessionmaker(bind=engine, expire_on_commit=False)()
+
+@pytest.mark.asyncio
+async def test_cache_hits_until_invalidated():
+    db = await _make_session()
+    db.add(AIConfig(business_name="Shop", is_active=True))
+    await db.commit()
+
+    cache = ConfigCache(ttl_seconds=60)
+    loads = []
+
+    async def loader(session):
+        loads.append(1)
+        return {"business_name": "Shop"}
+
+    first = await cache.get(db, loader)
+    second = await cache.get(db, loader)
+    assert first is second
+    assert len(loads) == 1
+
+    cache.invalidate("test")
+    third = await cache.get(db, loader)
+    assert len(loads) == 2
+    assert third["config_version"] == 2
+    await db.close()
+
+@pytest.mark.asyncio
+async def test_cache_revalidates_on_product_change():
+    db = await _make_session()
+    db.add(AIConfig(business_name="Shop", is_active=True))
+    await db.commit()
+
+    # TTL of zero forces a version-stamp check on every read
+    cache = ConfigCache(ttl_seconds=0)
+    loads = []
+
+    async def loader(session):
+        loads.append(1)
+        return {}
+
+    await cache.get(db, loader)
+    await cache.get(db, loader)
+    assert len(loads) == 1
+
+    db.add(Product(name="Widget", price=1000))
+    await db.commit()
+    await cache.get(db, loader)
+    assert len(loads) == 2
+    await db.close()
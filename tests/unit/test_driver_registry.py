@@ -0,0 +1,109 @@
+import asyncio
+import httpx
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from services.driver_registry import DriverRegistry
+from services.messaging_hub import MessagingHubService, EmailAdapter
+from services.whatsapp_service import WhatsAppService, MetaWhatsAppDriver, MockWhatsAppDriver, SendError
+
+META = {"whatsapp_driver": "meta", "whatsapp_api_token": "token-a", "whatsapp_phone_id": "111"}
+
+@pytest.mark.asyncio
+async def test_drivers_and_pools_are_reused_per_credentials():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"messages": [{"id": f"wamid.{len(requests)}"}]})
+
+    registry = DriverRegistry(transport=httpx.MockTransport(handler))
+    driver = WhatsAppService.get_driver(META, registry)
+    assert isinstance(driver, MetaWhatsAppDriver)
+    assert WhatsAppService.get_driver(dict(META), registry) is driver
+
+    assert await driver.send_message("50611112222", "hola") == "wamid.1"
+    assert await driver.send_message("50611112222", "otra") == "wamid.2"
+    assert requests[0].headers["Authorization"] == "Bearer token-a"
+    assert requests[0].url.path.endswith("/111/messages")
+
+    # Rotated credentials get their own driver and pool
+    rotated = WhatsAppService.get_driver(dict(META, whatsapp_api_token="token-b"), registry)
+    assert rotated is not driver
+    assert await rotated.send_message("50611112222", "hola") == "wamid.3"
+    pools = [registry.client("whatsapp", "token-a", "111"), registry.client("whatsapp", "token-b", "111")]
+    assert pools[0] is not pools[1]
+    assert isinstance(WhatsAppService.get_driver({"whatsapp_driver": "mock"}, registry), MockWhatsAppDriver)
+
+    await registry.aclose()
+    assert all(pool.is_closed for pool in pools)
+
+@pytest.mark.asyncio
+async def test_registry_is_bounded_and_closes_evicted_pools_once_idle():
+    registry = DriverRegistry(size=2, transport=httpx.MockTransport(lambda r: httpx.Response(200, json={})))
+    clients = [registry.client("whatsapp", f"token-{i}", "111") for i in range(2)]
+    assert registry.client("whatsapp", "token-1", "111") is clients[1]
+
+    async with registry.lease("whatsapp", "token-0", "111") as leased:
+        assert leased is clients[0]
+        # Evicting the pool while a send holds it must not close it under that send
+        registry.client("whatsapp", "token-2", "111")
+        registry.client("whatsapp", "token-3", "111")
+        await asyncio.sleep(0)
+        assert not leased.is_closed
+        assert clients[1].is_closed
+        await leased.post("https://graph.example/messages")
+    # ...but it is closed as soon as the send finishes
+    assert leased.is_closed
+    assert registry.client("whatsapp", "token-0", "111") is not leased
+
+    await registry.aclose()
+
+@pytest.mark.asyncio
+async def test_meta_driver_reports_why_a_send_failed():
+    responses = {
+        "400": httpx.Response(400, json={"error": {"message": "Invalid parameter", "code": 100}}),
+        "401": httpx.Response(401, json={"error": {"message": "Error validating access token"}}),
+        "429": httpx.Response(429, json={"error": {"message": "Rate limit hit"}}),
+        "503": httpx.Response(503, text="Service Unavailable"),
+    }
+
+    def handler(request):
+        if request.url.path.startswith("/timeout"):
+            raise httpx.ReadTimeout("read timed out", request=request)
+        return responses[request.headers["Authorization"].split("-")[-1]]
+
+    registry = DriverRegistry(transport=httpx.MockTransport(handler))
+    outcomes = {}
+    for code in responses:
+        driver = WhatsAppService.get_driver(dict(META, whatsapp_api_token=f"token-{code}"), registry)
+        with pytest.raises(SendError) as exc:
+            await driver.send_message("50611112222", "hola")
+        outcomes[code] = (exc.value.status_code, exc.value.retryable, str(exc.value))
+    assert outcomes == {
+        "400": (400, False, "HTTP 400: Invalid parameter"),
+        "401": (401, False, "HTTP 401: Error validating access token"),
+        "429": (429, True, "HTTP 429: Rate limit hit"),
+        "503": (503, True, "HTTP 503: Service Unavailable"),
+    }
+
+    driver = MetaWhatsAppDriver("token-a", "111", registry=registry)
+    driver.base_url = "https://graph.example/timeout"
+    with pytest.raises(SendError) as exc:
+        await driver.send_message("50611112222", "hola")
+    assert (exc.value.status_code, exc.value.retryable) == (None, True)
+
+    with pytest.raises(SendError) as exc:
+        await MetaWhatsAppDriver("", "111").send_message("50611112222", "hola")
+    assert not exc.value.retryable
+    await registry.aclose()
+
+def test_hub_adapters_are_cached_per_channel_settings():
+    email = MessagingHubService.get_adapter("email", {"email_driver": "mock"})
+    assert isinstance(email, EmailAdapter)
+    assert MessagingHubService.get_adapter("email", {"email_driver": "mock"}) is email
+    assert MessagingHubService.get_adapter("email", {"email_driver": "smtp"}) is not email
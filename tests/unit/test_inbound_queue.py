@@ -0,0 +1,136 @@
+import asyncio
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from services.inbound_queue import InboundQueue
+
+@pytest.mark.asyncio
+async def test_messages_of_a_conversation_are_processed_in_order():
+    processed = []
+    active = set()
+    overlap = []
+
+    async def handler(conversation_id, message_id):
+        # Two jobs of the same conversation must never run at the same time
+        if conversation_id in active:
+            overlap.append(conversation_id)
+        active.add(conversation_id)
+        await asyncio.sleep(0.001 * (message_id % 3))
+        processed.append((conversation_id, message_id))
+        active.discard(conversation_id)
+
+    queue = InboundQueue(workers=3, maxsize=100, recovery_seconds=0)
+    assert await queue.submit(1, 1) is False  # not running: caller processes inline
+    queue.start(handler)
+    for message_id in range(30):
+        assert await queue.submit(message_id % 5, message_id)
+    await queue.stop()
+
+    assert not queue.running
+    assert not overlap
+    assert len(processed) == 30
+    for conversation_id in range(5):
+        ids = [m for c, m in processed if c == conversation_id]
+        assert ids == sorted(ids)
+
+@pytest.mark.asyncio
+async def test_slow_conversation_does_not_block_others_and_failures_are_isolated():
+    release = asyncio.Event()
+    done = []
+
+    async def handler(conversation_id, message_id):
+        if conversation_id == 0:
+            await release.wait()
+        if message_id == 2:
+            raise RuntimeError("LLM timeout")
+        done.append(message_id)
+
+    queue = InboundQueue(workers=2, maxsize=1, recovery_seconds=0, submit_timeout=0.01)
+    queue.start(handler)
+    assert await queue.submit(0, 1)
+    await asyncio.sleep(0)
+    # Conversation 2 shares the stalled shard: one job waits, the next is left to the recovery sweep
+    assert await queue.submit(2, 5)
+    assert await queue.submit(2, 6) is False
+    assert await queue.submit(1, 2)
+    await asyncio.sleep(0.01)
+    assert await queue.submit(1, 4)
+    await asyncio.sleep(0.01)
+    assert done == [4]
+
+    release.set()
+    await queue.stop()
+    assert sorted(done) == [1, 4, 5]
+
+@pytest.mark.asyncio
+async def test_full_shard_waits_for_room_before_giving_up():
+    release = asyncio.Event()
+    done = []
+
+    async def handler(conversation_id, message_id):
+        await release.wait()
+        done.append(message_id)
+
+    queue = InboundQueue(workers=1, maxsize=1, recovery_seconds=0, submit_timeout=1)
+    queue.start(handler)
+    assert await queue.submit(0, 1)
+    await asyncio.sleep(0)
+    assert await queue.submit(0, 2)
+    asyncio.get_running_loop().call_later(0.02, release.set)
+    # Blocks until the worker takes a job instead of answering out of order
+    assert await queue.submit(0, 3)
+    await queue.stop()
+    assert done == [1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_recovery_resubmits_unanswered_messages():
+    import datetime
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from database import Base
+    from models import Client, Conversation, Message
+
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    old = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(minutes=10)
+    async with session_factory() as db:
+        convs = []
+        for i, manual in enumerate([False, False, True]):
+            client = Client(phone_number=f"5060000000{i}", name=f"Client {i}")
+            db.add(client)
+            await db.flush()
+            conv = Conversation(client_id=client.id, auto_ai_enabled=not manual)
+            db.add(conv)
+            await db.flush()
+            convs.append(conv.id)
+        rows = [
+            Message(conversation_id=convs[0], sender="user", content="hola", timestamp=old),
+            Message(conversation_id=convs[0], sender="agent", content="¡Hola!", timestamp=old),
+            Message(conversation_id=convs[0], sender="user", content="precio?", timestamp=old),  # lost
+            Message(conversation_id=convs[0], sender="user", content="y envío?", timestamp=old),  # lost
+            Message(conversation_id=convs[1], sender="user", content="insulto", timestamp=old, is_violation=True),
+            Message(conversation_id=convs[1], sender="user", content="recién llegado"),  # still in flight
+            Message(conversation_id=convs[2], sender="user", content="manual", timestamp=old),
+        ]
+        db.add_all(rows)
+        await db.commit()
+        lost = [(convs[0], rows[2].id), (convs[0], rows[3].id)]
+
+    processed = []
+
+    async def handler(conversation_id, message_id):
+        processed.append((conversation_id, message_id))
+
+    queue = InboundQueue(workers=2, session_factory=session_factory, recovery_seconds=0)
+    queue.start(handler)
+    assert await queue.recover() == 2
+    await queue.stop()
+    assert processed == lost
+    await engine.dispose()
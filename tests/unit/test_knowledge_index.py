@@ -0,0 +1,54 @@
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import AIDataset, KnowledgeChunk
+from services.knowledge_service import KnowledgeService
+from services.knowledge_index import KnowledgeIndex
+
+@pytest.mark.asyncio
+async def test_retrieves_relevant_chunks_only():
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    db = async_sessionmaker(bind=engine, expire_on_commit=False)()
+
+    faq = "\n".join([
+        "Horario: abrimos de lunes a viernes de 8am a 6pm",
+        "Envíos: hacemos envío a Alajuela, Heredia y Cartago",
+        "Pagos: aceptamos SINPE Móvil y tarjeta",
+    ])
+    ds = AIDataset(name="FAQ", data_type="text", content=faq)
+    db.add(ds)
+    await db.flush()
+    # One chunk per line so ranking is observable
+    db.add_all([
+        KnowledgeChunk(**KnowledgeService.make_chunk(ds.id, i, line))
+        for i, line in enumerate(faq.splitlines())
+    ])
+    await db.commit()
+
+    index = KnowledgeIndex(ttl_seconds=60)
+    hits = await index.search(db, "¿Tienen envio a Heredia?", top_k=1)
+    assert len(hits) == 1
+    assert "Heredia" in hits[0]["content"]
+    assert hits[0]["source"] == "FAQ"
+
+    assert await index.search(db, "zzz", top_k=3) == []
+
+    # Deactivating the dataset empties the index after invalidation
+    ds.is_active = False
+    await db.commit()
+    index.invalidate("test")
+    assert await index.search(db, "Heredia") == []
+    await db.close()
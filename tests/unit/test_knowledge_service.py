@@ -1,6 +1,8 @@
 import pytest
 import os
 import sys
+import io
+import json
 
 # Add server directory to path
 sys.path.append(os.path.join(os.getcwd(), "server"))
@@ -18,3 +20,92 @@ def test_json_ingestion():
     processed = KnowledgeService.ground_knowledge("json", json_data.encode('utf-8'))
     assert "Hi" in processed
     assert "Hello" in processed
+
+def test_chunking_keeps_rows_whole():
+    text = "\n".join(f"sku: {i} | name: Producto {i}" for i in range(100))
+    chunks = KnowledgeService.chunk_text(text, max_chars=200)
+    assert len(chunks) > 1
+    assert all(len(c) <= 200 for c in chunks)
+    assert sum(len(c.splitlines()) for c in chunks) == 100
+
+def test_tokenize_strips_accents_and_stopwords():
+    assert KnowledgeService.tokenize("¿Cuál es el envío a Alajuela?") == ["cual", "envio", "alajuela"]
+
+class _FakeUpload:
+    """Minimal async stand-in for fastapi.UploadFile."""
+    def __init__(self, data: bytes, max_read: int = None):
+        self._buf = io.BytesIO(data)
+        self.size = len(data)
+        self.max_read = max_read
+
+    async def read(self, size: int = -1) -> bytes:
+        if self.max_read:
+            size = self.max_read
+        return self._buf.read(size)
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+@pytest.mark.asyncio
+async def test_streaming_csv_handles_multiline_quoted_fields():
+    data = 'sku,desc\n1,"Taza\ngrande"\n2,Plato\n'.encode("utf-8")
+    progress = {"bytes_read": 0}
+    rows = await _collect(KnowledgeService.iter_csv_rows(_FakeUpload(data), progress))
+    assert rows == ["sku: 1 | desc: Taza\ngrande", "sku: 2 | desc: Plato"]
+    assert progress["bytes_read"] == len(data)
+
+@pytest.mark.asyncio
+async def test_streaming_json_array_in_small_blocks():
+    data = json.dumps([{"q": "Información", "n": i} for i in range(50)], ensure_ascii=False).encode("utf-8")
+    # 7-byte reads split items, numbers and multi-byte characters across blocks
+    upload = _FakeUpload(data, max_read=7)
+    progress = {"bytes_read": 0}
+    items = await _collect(KnowledgeService.iter_json_items(upload, progress))
+    assert len(items) == 50
+    assert json.loads(items[-1]) == {"q": "Información", "n": 49}
+
+@pytest.mark.asyncio
+async def test_ingest_upload_writes_chunks_in_batches():
+    from sqlalchemy import select, func
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+    from sqlalchemy.pool import StaticPool
+    from database import Base
+    from models import AIDataset, KnowledgeChunk
+
+    engine = create_async_engine(
+        "sqlite+aiosqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    db = async_sessionmaker(bind=engine, expire_on_commit=False)()
+
+    ds = AIDataset(name="Catalog", data_type="csv", content="", is_active=False)
+    db.add(ds)
+    await db.commit()
+
+    csv_data = "sku,name\n" + "\n".join(f"{i},Producto {i}" for i in range(2000))
+    stats = await KnowledgeService.ingest_upload(db, ds, "csv", _FakeUpload(csv_data.encode("utf-8")))
+    assert stats["status"] == "completed"
+    assert stats["rows"] == 2000
+
+    count = (await db.execute(select(func.count(KnowledgeChunk.id)))).scalar()
+    assert count == stats["chunks"]
+    assert ds.is_active
+    assert "preview truncated" in ds.content
+    await db.close()
+
+@pytest.mark.asyncio
+async def test_streaming_rejects_oversized_lines(monkeypatch):
+    from services import knowledge_service
+    monkeypatch.setattr(knowledge_service, "INGEST_MAX_ITEM_CHARS", 64)
+    # No newline at all: the buffered line must not grow past the cap
+    upload = _FakeUpload(b"x" * 1000, max_read=16)
+    with pytest.raises(ValueError, match="exceeds 64"):
+        await _collect(KnowledgeService.iter_upload_lines(upload, {"bytes_read": 0}))
+
+    # A quoted field that never closes must not accumulate the rest of the file
+    data = ('sku,desc\n1,"Sin cerrar\n' + "\n".join(f"{i},Plato" for i in range(100))).encode("utf-8")
+    with pytest.raises(ValueError, match="unterminated quoted field"):
+        await _collect(KnowledgeService.iter_csv_rows(_FakeUpload(data), {"bytes_read": 0}))
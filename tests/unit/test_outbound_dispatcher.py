@@ -0,0 +1,221 @@
+import asyncio
+import datetime
+import json
+import time
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import AIConfig, Client, Conversation, Message
+from services import outbound_dispatcher as dispatcher_module
+from services.outbound_dispatcher import OutboundDispatcher, TokenBucket, enqueue
+from services.config_cache import config_cache
+from services.encryption import encrypt_string
+from services.whatsapp_service import SendError
+
+class FakeManager:
+    def __init__(self):
+        self.events = []
+
+    async def broadcast(self, message, *, event_type=None, conversation_id=None, tenant_id=None):
+        self.events.append(json.loads(message))
+
+class FakeAdapter:
+    def __init__(self, results):
+        self.results = list(results)
+        self.sent = []
+
+    async def send_message(self, to, text, media_url=None, media_type=None):
+        self.sent.append((to, text))
+        result = self.results.pop(0) if self.results else f"wamid.{len(self.sent)}"
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+async def make_db():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return async_sessionmaker(bind=engine, expire_on_commit=False)
+
+async def add_queued(session_factory, count=1):
+    async with session_factory() as db:
+        client = Client(phone_number="50612345678", name="Ana")
+        db.add(client)
+        await db.flush()
+        conv = Conversation(client_id=client.id)
+        db.add(conv)
+        await db.flush()
+        msgs = [Message(conversation_id=conv.id, sender="agent", content=f"hola {i}") for i in range(count)]
+        for msg in msgs:
+            enqueue(msg)
+        db.add_all(msgs)
+        await db.commit()
+        return [m.id for m in msgs]
+
+def use_adapter(monkeypatch, adapter):
+    monkeypatch.setattr(dispatcher_module.MessagingHubService, "get_adapter", staticmethod(lambda channel, config: adapter))
+
+@pytest.mark.asyncio
+async def test_token_bucket_shapes_bursts():
+    bucket = TokenBucket(rate=50, capacity=5)
+    start = time.monotonic()
+    for _ in range(10):
+        await bucket.acquire()
+    # 5 from the burst, 5 more at 50/s
+    assert time.monotonic() - start >= 0.09
+
+@pytest.mark.asyncio
+async def test_successful_send_records_external_id(monkeypatch):
+    fake = FakeManager()
+    monkeypatch.setattr(dispatcher_module, "manager", fake)
+    adapter = FakeAdapter(["wamid.abc"])
+    use_adapter(monkeypatch, adapter)
+    session_factory = await make_db()
+    (msg_id,) = await add_queued(session_factory)
+
+    dispatcher = OutboundDispatcher(session_factory=session_factory)
+    async with session_factory() as db:
+        await dispatcher.dispatch(db, [msg_id])
+        msg = await db.get(Message, msg_id)
+        assert (msg.status, msg.external_id, msg.send_attempts, msg.next_attempt_at) == ("sent", "wamid.abc", 1, None)
+
+    assert adapter.sent == [("50612345678", "hola 0")]
+    assert [(e["id"], e["status"]) for e in fake.events] == [(msg_id, "sent")]
+
+@pytest.mark.asyncio
+async def test_retries_with_backoff_then_fails(monkeypatch):
+    fake = FakeManager()
+    monkeypatch.setattr(dispatcher_module, "manager", fake)
+    monkeypatch.setattr(dispatcher_module, "OUTBOUND_MAX_ATTEMPTS", 2)
+    use_adapter(monkeypatch, FakeAdapter([RuntimeError("HTTP 503"), False]))
+    session_factory = await make_db()
+    (msg_id,) = await add_queued(session_factory)
+    dispatcher = OutboundDispatcher(session_factory=session_factory)
+
+    async with session_factory() as db:
+        await dispatcher.dispatch(db, [msg_id])
+        msg = (await db.execute(select(Message).filter(Message.id == msg_id))).scalar_one()
+        assert (msg.status, msg.send_attempts, msg.last_error) == ("queued", 1, "HTTP 503")
+        assert msg.next_attempt_at > datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        assert fake.events == []
+
+        # Not due yet: nothing is claimed
+        await dispatcher.dispatch(db, [msg_id])
+        db.expire_all()
+        assert (await db.get(Message, msg_id)).send_attempts == 1
+
+        msg.next_attempt_at = datetime.datetime.now(datetime.timezone.utc)
+        await db.commit()
+        await dispatcher.dispatch(db, [msg_id])
+        db.expire_all()
+        msg = await db.get(Message, msg_id)
+        assert (msg.status, msg.send_attempts) == ("failed", 2)
+
+    assert [(e["id"], e["status"]) for e in fake.events] == [(msg_id, "failed")]
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed(monkeypatch):
+    monkeypatch.setattr(dispatcher_module, "manager", FakeManager())
+    use_adapter(monkeypatch, FakeAdapter([]))
+    session_factory = await make_db()
+    first, second = await add_queued(session_factory, 2)
+    dispatcher = OutboundDispatcher(session_factory=session_factory)
+
+    async with session_factory() as db:
+        jobs = await dispatcher.claim(db)
+        assert sorted(job["id"] for job in jobs) == [first, second]
+        # A worker that holds the lease is not raced...
+        assert await dispatcher.claim(db) == []
+
+        # ...until the lease expires (e.g. the process died mid-send)
+        msg = await db.get(Message, first)
+        msg.next_attempt_at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)
+        await db.commit()
+        assert [job["id"] for job in await dispatcher.claim(db)] == [first]
+
+@pytest.mark.asyncio
+async def test_running_dispatcher_delivers_queued_messages(monkeypatch):
+    monkeypatch.setattr(dispatcher_module, "manager", FakeManager())
+    adapter = FakeAdapter([])
+    use_adapter(monkeypatch, adapter)
+    session_factory = await make_db()
+    dispatcher = OutboundDispatcher(session_factory=session_factory, workers=2, poll_seconds=5)
+    dispatcher.start()
+    await asyncio.sleep(0.05)
+
+    ids = await add_queued(session_factory, 3)
+    dispatcher.notify()
+    await asyncio.sleep(0.3)
+    await dispatcher.stop()
+
+    async with session_factory() as db:
+        result = await db.execute(select(Message.status).filter(Message.id.in_(ids)))
+        assert result.scalars().all() == ["sent"] * 3
+    assert len(adapter.sent) == 3
+
+@pytest.mark.asyncio
+async def test_channel_config_is_read_through_config_cache(monkeypatch):
+    monkeypatch.setattr(dispatcher_module, "manager", FakeManager())
+    configs = []
+    adapter = FakeAdapter([])
+    monkeypatch.setattr(dispatcher_module.MessagingHubService, "get_adapter",
+                        staticmethod(lambda channel, config: configs.append(config) or adapter))
+    loads = []
+    load_active_config = dispatcher_module.ai_agent._load_active_config
+    async def counting_load(db):
+        loads.append(db)
+        return await load_active_config(db)
+    monkeypatch.setattr(dispatcher_module.ai_agent, "_load_active_config", counting_load)
+
+    session_factory = await make_db()
+    async with session_factory() as db:
+        db.add(AIConfig(business_name="Tienda", whatsapp_driver="meta", whatsapp_phone_id="111",
+                        whatsapp_api_token=encrypt_string("token-a")))
+        await db.commit()
+    config_cache.invalidate("test")
+    dispatcher = OutboundDispatcher(session_factory=session_factory)
+
+    for msg_id in await add_queued(session_factory, 3):
+        async with session_factory() as db:
+            await dispatcher.dispatch(db, [msg_id])
+
+    # One load for three batches; adapters only see the channel settings, decrypted
+    assert len(loads) == 1
+    assert len(configs) == 3
+    assert configs[0]["whatsapp_api_token"] == "token-a"
+    assert configs[0]["whatsapp_phone_id"] == "111"
+    assert "products" not in configs[0]
+
+@pytest.mark.asyncio
+async def test_permanent_rejections_fail_without_retries(monkeypatch):
+    fake = FakeManager()
+    monkeypatch.setattr(dispatcher_module, "manager", fake)
+    use_adapter(monkeypatch, FakeAdapter([
+        SendError("HTTP 429: Too many messages", status_code=429),
+        SendError("HTTP 400: Recipient phone number not in allowed list", status_code=400, retryable=False),
+    ]))
+    session_factory = await make_db()
+    first, second = await add_queued(session_factory, 2)
+    dispatcher = OutboundDispatcher(session_factory=session_factory)
+
+    async with session_factory() as db:
+        await dispatcher.dispatch(db, [first, second])
+        rows = {m.id: m for m in (await db.execute(select(Message))).scalars()}
+        # Throttled: retried later
+        assert (rows[first].status, rows[first].send_attempts) == ("queued", 1)
+        assert rows[first].last_error == "HTTP 429: Too many messages"
+        # Rejected: failed on the first attempt with the channel's reason
+        assert (rows[second].status, rows[second].send_attempts, rows[second].next_attempt_at) == ("failed", 1, None)
+        assert rows[second].last_error == "HTTP 400: Recipient phone number not in allowed list"
+
+    assert [(e["id"], e["status"], e["error"]) for e in fake.events] == [
+        (second, "failed", "HTTP 400: Recipient phone number not in allowed list")
+    ]
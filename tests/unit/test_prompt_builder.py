@@ -0,0 +1,45 @@
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from services.prompt_builder import PromptBuilder
+
+def _config(version, rules):
+    return {
+        "business_name": "Cafe",
+        "business_description": "Coffee shop",
+        "rules": rules,
+        "products": [],
+        "forbidden_topics": ["pizza"],
+        "intent_rules": [],
+        "language_code": "es-CR",
+        "config_version": version
+    }
+
+def test_sections_reused_until_config_version_changes():
+    builder = PromptBuilder()
+    first = builder.build(_config(1, ["Be brief"]), local_time="T1")
+    assert "- Be brief" in first
+    assert "pizza" in first
+
+    # Same version: cached identity section is reused even if the dict differs
+    second = builder.build(_config(1, ["Changed"]), local_time="T2")
+    assert "- Be brief" in second
+    assert "T2" in second
+
+    third = builder.build(_config(2, ["Changed"]), local_time="T3")
+    assert "- Changed" in third
+
+def test_per_message_parts_are_spliced():
+    builder = PromptBuilder()
+    prompt = builder.build(
+        _config(1, []),
+        knowledge_sources=[("FAQ", "Abrimos a las 8")],
+        knowledge_key=("FAQ",),
+        order_history_context="\n### CLIENT RECENT ORDER HISTORY:\n- Order #7\n"
+    )
+    assert "Abrimos a las 8" in prompt
+    assert "Order #7" in prompt
+    assert builder.last_sizes["order_history"] > 0
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import Client, Conversation, Message
+from services import receipt_aggregator as receipt_module
+from services.receipt_aggregator import ReceiptAggregator
+
+class FakeManager:
+    def __init__(self):
+        self.events = []
+
+    async def broadcast(self, message, *, event_type=None, conversation_id=None, tenant_id=None):
+        self.events.append(json.loads(message))
+
+async def make_db():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with session_factory() as db:
+        client = Client(phone_number="50612345678", name="Ana")
+        db.add(client)
+        await db.flush()
+        conv = Conversation(client_id=client.id)
+        db.add(conv)
+        await db.flush()
+        db.add_all([
+            Message(conversation_id=conv.id, sender="agent", content=f"m{i}", status="sent", external_id=f"wamid.{i}")
+            for i in range(3)
+        ])
+        await db.commit()
+    return session_factory
+
+async def statuses(session_factory):
+    async with session_factory() as db:
+        result = await db.execute(select(Message.external_id, Message.status).order_by(Message.id))
+        return dict(result.all())
+
+@pytest.mark.asyncio
+async def test_status_only_moves_forward(monkeypatch):
+    fake = FakeManager()
+    monkeypatch.setattr(receipt_module, "manager", fake)
+    session_factory = await make_db()
+    aggregator = ReceiptAggregator(session_factory=session_factory)
+
+    async with session_factory() as db:
+        await aggregator.apply(db, [("wamid.0", "read"), ("wamid.1", "delivered"), ("wamid.2", "failed")])
+    # Late and out-of-order callbacks never move a status backwards
+    async with session_factory() as db:
+        updated = await aggregator.apply(db, [("wamid.0", "delivered"), ("wamid.1", "sent"),
+                                              ("wamid.2", "delivered"), ("wamid.404", "read")])
+
+    assert updated == []
+    assert await statuses(session_factory) == {"wamid.0": "read", "wamid.1": "delivered", "wamid.2": "failed"}
+    assert len(fake.events) == 1
+    assert fake.events[0]["type"] == "message_status_batch"
+    assert sorted(u["status"] for u in fake.events[0]["updates"]) == ["delivered", "failed", "read"]
+    assert {u["phone"] for u in fake.events[0]["updates"]} == {"50612345678"}
+
+@pytest.mark.asyncio
+async def test_receipts_of_a_window_are_applied_as_one_batch(monkeypatch):
+    fake = FakeManager()
+    monkeypatch.setattr(receipt_module, "manager", fake)
+    session_factory = await make_db()
+    aggregator = ReceiptAggregator(window_ms=20, session_factory=session_factory)
+    aggregator.start()
+
+    # Separate webhook deliveries arriving within the window
+    aggregator.add([("wamid.0", "delivered")])
+    aggregator.add([("wamid.1", "delivered"), ("wamid.0", "read")])
+    aggregator.add([("wamid.0", "delivered")])
+    await asyncio.sleep(0.1)
+
+    assert await statuses(session_factory) == {"wamid.0": "read", "wamid.1": "delivered", "wamid.2": "sent"}
+    assert len(fake.events) == 1
+    assert len(fake.events[0]["updates"]) == 2
+
+    # Receipts still buffered at shutdown are flushed
+    aggregator.add([("wamid.2", "delivered")])
+    await aggregator.stop()
+    assert (await statuses(session_factory))["wamid.2"] == "delivered"
+    assert len(fake.events) == 2
@@ -0,0 +1,101 @@
+import asyncio
+import datetime
+import json
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import StaticPool
+from database import Base
+from models import Client, Conversation, Message
+from services import scheduler as scheduler_module
+from services.scheduler import AutoSendScheduler, schedule_auto_send, send_due_messages
+
+class FakeManager:
+    def __init__(self):
+        self.events = []
+
+    async def broadcast(self, message, *, event_type=None, conversation_id=None, tenant_id=None):
+        self.events.append(json.loads(message))
+
+async def make_db():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return async_sessionmaker(bind=engine, expire_on_commit=False)
+
+async def add_drafts(session_factory, delays):
+    async with session_factory() as db:
+        client = Client(phone_number="50612345678", name="Ana")
+        db.add(client)
+        await db.flush()
+        conv = Conversation(client_id=client.id)
+        db.add(conv)
+        await db.flush()
+        drafts = []
+        for delay in delays:
+            msg = Message(conversation_id=conv.id, sender="agent", content=f"draft {delay}", status="pending")
+            schedule_auto_send(msg, delay)
+            drafts.append(msg)
+        db.add_all(drafts)
+        await db.commit()
+        return [m.id for m in drafts]
+
+async def statuses(session_factory):
+    async with session_factory() as db:
+        result = await db.execute(select(Message.id, Message.status).order_by(Message.id))
+        return dict(result.all())
+
+def test_delay_is_in_seconds():
+    msg = Message(status="pending")
+    before = datetime.datetime.now(datetime.timezone.utc)
+    schedule_auto_send(msg, 30)
+    assert datetime.timedelta(seconds=29) < msg.send_after - before < datetime.timedelta(seconds=31)
+
+@pytest.mark.asyncio
+async def test_only_due_pending_drafts_are_sent(monkeypatch):
+    fake = FakeManager()
+    monkeypatch.setattr(scheduler_module, "manager", fake)
+    session_factory = await make_db()
+    due, later, approved = await add_drafts(session_factory, [-5, 3600, -5])
+    async with session_factory() as db:
+        msg = await db.get(Message, approved)
+        msg.status = "sent"  # An operator approved it before the timer fired
+        await db.commit()
+
+    # A fresh scheduler (e.g. after a restart) finds the persisted due time
+    scheduler = AutoSendScheduler(session_factory=session_factory, batch_size=1)
+    next_due = await scheduler.run_once()
+
+    assert await statuses(session_factory) == {due: "queued", later: "pending", approved: "sent"}
+    assert [e["id"] for e in fake.events] == [due]
+    assert next_due is not None
+    async with session_factory() as db:
+        assert (await db.get(Message, due)).send_after is None
+
+    # Explicit ids (Celery backend) are sent regardless of the due time, once
+    async with session_factory() as db:
+        rows = await send_due_messages(db, message_ids=[later, due], backend="celery")
+    assert [row.id for row in rows] == [later]
+
+@pytest.mark.asyncio
+async def test_loop_wakes_up_when_a_draft_becomes_due(monkeypatch):
+    fake = FakeManager()
+    monkeypatch.setattr(scheduler_module, "manager", fake)
+    session_factory = await make_db()
+    scheduler = AutoSendScheduler(session_factory=session_factory, poll_seconds=5)
+    scheduler.start()
+    await asyncio.sleep(0.05)
+
+    (draft,) = await add_drafts(session_factory, [0.2])
+    scheduler.notify()
+    await asyncio.sleep(0.5)
+    await scheduler.stop()
+
+    assert (await statuses(session_factory))[draft] == "queued"
+    assert [e["id"] for e in fake.events] == [draft]
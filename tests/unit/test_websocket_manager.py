@@ -0,0 +1,167 @@
+import asyncio
+import json
+import pytest
+import os
+import sys
+
+# Add server directory to path
+sys.path.append(os.path.join(os.getcwd(), "server"))
+
+from routers import websocket as ws_module
+from routers.websocket import ConnectionManager
+
+class FakeSocket:
+    def __init__(self, delay: float = 0.0, block: bool = False):
+        self.delay = delay
+        self.block = block
+        self.sent = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message: str):
+        if self.block:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.delay)
+        # Unwrap batched frames into the events they carry
+        data = json.loads(message)
+        if isinstance(data, dict) and data.get("type") == "batch":
+            self.sent.extend(data["events"])
+        else:
+            self.sent.append(data)
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+@pytest.fixture(autouse=True)
+def fast_tick(monkeypatch):
+    monkeypatch.setattr(ws_module, "WS_BATCH_TICK_SECONDS", 0.01)
+
+@pytest.mark.asyncio
+async def test_broadcast_does_not_wait_for_slow_clients():
+    manager = ConnectionManager()
+    fast, slow = FakeSocket(), FakeSocket(delay=0.5)
+    await manager.connect(fast)
+    await manager.connect(slow)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i in range(5):
+        await manager.broadcast(json.dumps(f"m{i}"))
+    assert loop.time() - start < 0.1
+
+    await asyncio.sleep(0.1)
+    assert fast.sent == [f"m{i}" for i in range(5)]
+    assert len(slow.sent) == 0
+
+    manager.disconnect(fast)
+    manager.disconnect(slow)
+
+@pytest.mark.asyncio
+async def test_stalled_client_is_evicted(monkeypatch):
+    monkeypatch.setattr(ws_module, "WS_EVICT_AFTER_DROPS", 3)
+    manager = ConnectionManager()
+    stalled, healthy = FakeSocket(block=True), FakeSocket()
+    await manager.connect(healthy)
+    await manager.connect(stalled)
+    manager.connections[stalled].queue_size = 2
+
+    # The first tick leaves the writer stuck in send; later events pile up
+    await manager.broadcast(json.dumps("m0"))
+    await asyncio.sleep(0.05)
+    for i in range(1, 10):
+        await manager.broadcast(json.dumps(f"m{i}"))
+    await asyncio.sleep(0.1)
+
+    assert stalled not in manager.active_connections
+    assert stalled.closed
+    assert healthy in manager.active_connections
+    assert healthy.sent == [f"m{i}" for i in range(10)]
+
+    manager.disconnect(healthy)
+
+@pytest.mark.asyncio
+async def test_drop_bursts_separated_by_flushes_do_not_evict(monkeypatch):
+    monkeypatch.setattr(ws_module, "WS_EVICT_AFTER_DROPS", 3)
+    manager = ConnectionManager()
+    sock = FakeSocket()
+    await manager.connect(sock)
+    manager.connections[sock].queue_size = 2
+
+    # Each burst drops 2 events, then the writer catches up
+    for burst in range(4):
+        for i in range(4):
+            await manager.broadcast(json.dumps(f"b{burst}-{i}"))
+        await asyncio.sleep(0.05)
+
+    assert sock in manager.active_connections
+    assert not sock.closed
+    assert sock.sent == [f"b{burst}-{i}" for burst in range(4) for i in range(2)]
+
+    manager.disconnect(sock)
+
+@pytest.mark.asyncio
+async def test_disconnect_is_idempotent():
+    manager = ConnectionManager()
+    sock = FakeSocket()
+    await manager.connect(sock)
+    manager.disconnect(sock)
+    manager.disconnect(sock)
+    assert manager.active_connections == []
+
+@pytest.mark.asyncio
+async def test_subscriptions_route_only_matching_events():
+    manager = ConnectionManager()
+    legacy, chat, tenant = FakeSocket(), FakeSocket(), FakeSocket()
+    for sock in (legacy, chat, tenant):
+        await manager.connect(sock)
+
+    await manager.handle_client_frame(chat, json.dumps({"action": "subscribe", "id": "c", "conversation_id": 5}))
+    await manager.handle_client_frame(tenant, json.dumps({"action": "subscribe", "tenant_id": "acme", "types": ["notification"]}))
+    await manager.handle_client_frame(tenant, "not json")
+    await asyncio.sleep(0.05)
+    assert chat.sent.pop()["type"] == "subscribed"
+    tenant.sent.clear()
+
+    await manager.broadcast(json.dumps("conv5"), event_type="new_message", conversation_id=5, tenant_id="acme")
+    await manager.broadcast(json.dumps("conv6"), event_type="new_message", conversation_id=6, tenant_id="acme")
+    await manager.broadcast(json.dumps("notice"), event_type="notification", tenant_id="acme")
+    await manager.broadcast(json.dumps("default-notice"), event_type="notification")
+    await asyncio.sleep(0.05)
+
+    assert legacy.sent == ["conv5", "conv6", "notice", "default-notice"]
+    assert chat.sent == ["conv5"]
+    assert tenant.sent == ["notice"]
+
+    # Dropping every subscription restores the receive-everything default
+    await manager.handle_client_frame(chat, json.dumps({"action": "unsubscribe"}))
+    await manager.broadcast(json.dumps("again"), event_type="new_message", conversation_id=6)
+    await asyncio.sleep(0.05)
+    assert "again" in chat.sent
+
+    for sock in (legacy, chat, tenant):
+        manager.disconnect(sock)
+
+@pytest.mark.asyncio
+async def test_bursts_are_coalesced_and_batched_without_losing_critical_events(monkeypatch):
+    monkeypatch.setattr(ws_module, "WS_BATCH_TICK_SECONDS", 0.05)
+    manager = ConnectionManager()
+    sock = FakeSocket()
+    await manager.connect(sock)
+    manager.connections[sock].queue_size = 5
+
+    for i in range(50):
+        await manager.broadcast(json.dumps({"type": "new_message", "id": i}), event_type="new_message")
+    for status in ("sent", "delivered", "read"):
+        await manager.broadcast(json.dumps({"type": "message_status_update", "id": 1, "status": status}),
+                                event_type="message_status_update")
+    await asyncio.sleep(0.15)
+
+    assert [e["id"] for e in sock.sent if e["type"] == "new_message"] == list(range(50))
+    statuses = [e for e in sock.sent if e["type"] == "message_status_update"]
+    assert statuses == [{"type": "message_status_update", "id": 1, "status": "read"}]
+    # Status updates follow the messages they refer to
+    assert sock.sent[-1]["type"] == "message_status_update"
+
+    manager.disconnect(sock)